@@ -0,0 +1,133 @@
+"""ASGI-режим: HTTP, Telegram Application и доставка в канал в одном цикле событий.
+
+Запуск:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+Flask-маршруты синхронные и выполняются в пуле из ASGI_THREADS потоков
+(WsgiToAsgi из asgiref сам по себе выполняет их в одном потоке, по
+очереди), а Telegram Application и доставка outbox в канал работают прямо
+в цикле сервера: отдельный поток с собственным циклом не создается.
+POST /webhook обрабатывается здесь же, без перехода в поток Flask.
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from qr_warehouse import bot, config, create_app, ensure_initialized
+from qr_warehouse.background import start_telegram_runtime
+
+flask_app = create_app()
+
+_flask_executor = ThreadPoolExecutor(config.ASGI_THREADS, thread_name_prefix='flask')
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    """Запрос к Flask в пуле _flask_executor, а не в общем потоке asgiref"""
+
+    # Исходный синхронный метод asgiref, без его обертки sync_to_async(thread_sensitive=True)
+    _run_wsgi_app_sync = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app_sync, thread_sensitive=False, executor=_flask_executor)(body)
+
+
+class _PooledWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+_wsgi = _PooledWsgiToAsgi(flask_app)
+
+
+async def _startup():
+    """Привязка Telegram к циклу сервера и запуск Application"""
+    ensure_initialized(flask_app)
+    start_telegram_runtime(asyncio.get_running_loop())
+    await bot.start_telegram_application()
+
+
+async def _shutdown():
+    """Остановка Application; неотправленные сообщения в канал остаются в outbox"""
+    telegram_app = bot.get_telegram_app()
+    if telegram_app.running:
+        await telegram_app.stop()
+    await telegram_app.shutdown()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await _startup()
+            except Exception as e:
+                flask_app.logger.error(f"Error starting telegram application: {e}")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                await _shutdown()
+            except Exception as e:
+                flask_app.logger.error(f"Error stopping telegram application: {e}")
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _json_response(send, status: int, payload: dict, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()), *headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _webhook(scope, receive, send):
+    """POST /webhook прямо в цикле событий (та же логика, что и во Flask-маршруте)"""
+    headers = dict(scope['headers'])
+    secret = headers.get(b'x-telegram-bot-api-secret-token', b'').decode('latin-1')
+    if not bot.check_webhook_secret(secret):
+        await _json_response(send, 403, {'error': 'Forbidden'})
+        return
+
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > flask_app.config['MAX_CONTENT_LENGTH']:
+            await _json_response(send, 413, {'error': 'Payload Too Large'})
+            return
+        if not message.get('more_body'):
+            break
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        bot.webhook_stats['invalid'] += 1
+        await _json_response(send, 400, {'error': 'Invalid JSON'})
+        return
+
+    if not await bot.enqueue_update(payload):
+        await _json_response(send, 429, {'error': 'Too Many Requests'}, [(b'retry-after', b'1')])
+        return
+    await _json_response(send, 200, {'status': 'ok'})
+
+
+async def app(scope, receive, send):
+    """ASGI-приложение"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == '/webhook':
+        await _webhook(scope, receive, send)
+        return
+    await _wsgi(scope, receive, send)
@@ -0,0 +1,29 @@
+"""Сжатие загружаемых фото"""
+import io
+
+import pytest
+
+from conftest import make_image
+
+RESOLUTIONS = {
+    'vga': (640, 480),
+    'fullhd': (1920, 1080),
+    '12mp': (4000, 3000),
+}
+# Формат исходника, в котором такой режим реально приходит от клиента
+MODES = {
+    'RGB': 'JPEG',
+    'RGBA': 'PNG',
+    'P': 'PNG',
+    'CMYK': 'JPEG',
+}
+
+
+@pytest.mark.parametrize('mode', list(MODES))
+@pytest.mark.parametrize('resolution', list(RESOLUTIONS))
+def bench_compress_image(benchmark, app_context, mode, resolution):
+    from qr_warehouse.uploads import compress_image, new_upload_key
+
+    data = make_image(RESOLUTIONS[resolution], mode, MODES[mode])
+    key = new_upload_key()
+    assert benchmark(lambda: compress_image(io.BytesIO(data), key))
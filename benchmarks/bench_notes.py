@@ -0,0 +1,65 @@
+"""Создание и открытие заметок, список заметок в боте"""
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import ensure_notes, make_image
+
+
+@pytest.fixture(scope='module')
+def photo():
+    return make_image((1920, 1080))
+
+
+@pytest.mark.parametrize('photos', [0, 1, 3, 5])
+def bench_create_note(benchmark, client, photo, photos):
+    def create():
+        data = {'text': 'Паллета 12\nСтеллаж B, полка 3'}
+        data['photos'] = [(io.BytesIO(photo), f'{i}.jpg') for i in range(photos)]
+        return client.post('/create_note', data=data, content_type='multipart/form-data')
+
+    response = benchmark(create)
+    assert response.status_code == 200
+
+
+@pytest.fixture(scope='module')
+def note_id(client):
+    response = client.post('/create_note', data={'text': 'Заметка для открытия'})
+    return response.get_json()['note_id']
+
+
+@pytest.mark.parametrize('cache', ['warm', 'cold'])
+def bench_open_qr(benchmark, client, note_id, cache):
+    from qr_warehouse.extensions import note_cache
+
+    payload = {'data': f'qrapp:note:{note_id}'}
+    setup = note_cache.clear if cache == 'cold' else None
+    response = benchmark.pedantic(client.post, args=('/open_qr',), kwargs={'json': payload},
+                                  setup=setup, rounds=200, warmup_rounds=5)
+    assert response.status_code == 200
+
+
+async def _reply_text(*args, **kwargs):
+    pass
+
+
+@pytest.mark.parametrize('rows', [
+    10_000,
+    pytest.param(1_000_000, marks=pytest.mark.full),
+])
+def bench_note_command(benchmark, app, rows):
+    from qr_warehouse.bot import note_command
+    from qr_warehouse.config import ALLOWED_USER_ID
+
+    ensure_notes(app, rows)
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=ALLOWED_USER_ID),
+        message=SimpleNamespace(reply_text=_reply_text),
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark(lambda: loop.run_until_complete(note_command(update, None)))
+    finally:
+        loop.close()
@@ -0,0 +1,11 @@
+"""Генерация QR-кодов (печать этикеток)"""
+import pytest
+
+
+@pytest.mark.parametrize('length', [16, 64, 256, 1024])
+def bench_generate_qr_code(benchmark, app, length):
+    from qr_warehouse.notes import generate_qr_code
+
+    payload = 'qrapp:note:' + 'x' * (length - len('qrapp:note:'))
+    result = benchmark(generate_qr_code, payload)
+    assert result.getbuffer().nbytes > 0
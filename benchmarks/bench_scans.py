@@ -0,0 +1,39 @@
+"""Журнал сканирований: добавление в буфер и пакетная запись в БД"""
+import pytest
+
+
+@pytest.fixture
+def scan_buffer(monkeypatch):
+    from qr_warehouse.extensions import scan_buffer
+
+    # Без пробуждения фоновой записи: буфер опустошают только сами бенчмарки
+    monkeypatch.setattr(scan_buffer, 'on_full', None)
+    scan_buffer.drain(len(scan_buffer))
+    yield scan_buffer
+    scan_buffer.drain(len(scan_buffer))
+
+
+def bench_record_scan(benchmark, app, scan_buffer):
+    from qr_warehouse.scans import record_scan
+
+    def record():
+        for i in range(1000):
+            record_scan('7f9c2a4e-0000-4000-8000-000000000000', 'tsd-1', f'A-{i % 50}')
+
+    def setup():
+        scan_buffer.drain(len(scan_buffer))
+
+    benchmark.pedantic(record, setup=setup, rounds=50)
+    assert scan_buffer.dropped == 0
+
+
+@pytest.mark.parametrize('batch', [100, 1000, 5000])
+def bench_flush_scan_events(benchmark, app_context, scan_buffer, batch):
+    from qr_warehouse.scans import flush_scan_events, record_scan
+
+    def fill():
+        for i in range(batch):
+            record_scan(f'note-{i % 1000}', 'tsd-1', f'A-{i % 50}')
+
+    written = benchmark.pedantic(flush_scan_events, args=(batch,), setup=fill, rounds=20)
+    assert written == batch
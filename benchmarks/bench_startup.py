@@ -0,0 +1,23 @@
+"""Запуск: импорт app в чистом процессе (платит каждый новый воркер)"""
+import os
+import subprocess
+import sys
+
+from qr_warehouse import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_import_app(benchmark, app):
+    benchmark.pedantic(subprocess.run, args=([sys.executable, '-c', 'import app'],),
+                       kwargs={'cwd': ROOT, 'check': True}, rounds=5, iterations=1)
+
+
+def bench_import_budget(app):
+    """Импорт укладывается в IMPORT_TIME_BUDGET_MS; тяжелые пакеты не импортируются заранее"""
+    from qr_warehouse.config import IMPORT_TIME_BUDGET_MS
+
+    profile = startup.import_profile('app', top=1000)
+    assert profile['total_ms'] <= IMPORT_TIME_BUDGET_MS, profile
+    lazy = {'telegram', 'PIL', 'qrcode', 'boto3', 'httpx'}
+    assert not lazy & {name for name, _ in profile['packages']}, profile
@@ -0,0 +1,54 @@
+"""Запросы по местам хранения: «что лежит в ячейке» и «где лежит товар»"""
+import pytest
+
+from conftest import ensure_notes
+
+
+def ensure_locations(app, count: int):
+    """Размещает первые count заметок по ячейкам (по одной ячейке на заметку)"""
+    from sqlalchemy import insert, select
+
+    from qr_warehouse.extensions import db
+    from qr_warehouse.models import Note, NoteLocation
+
+    ensure_notes(app, count)
+    with app.app_context():
+        existing = NoteLocation.query.count()
+        if existing >= count:
+            return
+        placed = select(NoteLocation.note_id)
+        note_ids = db.session.execute(
+            select(Note.id).where(Note.id.not_in(placed)).limit(count - existing)
+        ).scalars().all()
+        for start in range(0, len(note_ids), 5000):
+            db.session.execute(insert(NoteLocation), [
+                {'note_id': note_id, 'zone': 'ABCDEFGHIJ'[i % 10], 'aisle': f'{i // 10 % 40:02d}',
+                 'shelf': str(i // 400 % 6), 'bin': str(i // 2400 % 20), 'quantity': i % 50 + 1}
+                for i, note_id in enumerate(note_ids[start:start + 5000], start=existing + start)
+            ])
+        db.session.commit()
+
+
+@pytest.fixture(params=[
+    10_000,
+    pytest.param(1_000_000, marks=pytest.mark.full),
+])
+def stocked(request, app):
+    ensure_locations(app, request.param)
+    return request.param
+
+
+def bench_bin_contents(benchmark, client, stocked):
+    response = benchmark(client.get, '/bin/C-07-1-0')
+    assert response.status_code == 200
+    assert response.get_json()['items']
+
+
+def bench_note_locations(benchmark, app, client, stocked):
+    from qr_warehouse.models import NoteLocation
+
+    with app.app_context():
+        note_id = NoteLocation.query.filter_by(zone='C', aisle='07').first().note_id
+    response = benchmark(client.get, f'/note/{note_id}/locations')
+    assert response.status_code == 200
+    assert response.get_json()['locations']
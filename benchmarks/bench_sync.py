@@ -0,0 +1,32 @@
+"""Выгрузка изменений каталога для клиентов (GET /sync)"""
+import pytest
+
+from conftest import ensure_notes
+
+
+@pytest.fixture(params=[
+    10_000,
+    pytest.param(1_000_000, marks=pytest.mark.full),
+])
+def catalogue(request, app):
+    ensure_notes(app, request.param)
+    return request.param
+
+
+def bench_sync_first_page(benchmark, client, catalogue):
+    response = benchmark(client.get, '/sync?limit=1000')
+    assert response.status_code == 200
+    assert len(response.get_json()['notes']) == 1000
+
+
+def bench_sync_delta(benchmark, app, client, catalogue):
+    """Клиент с почти актуальной копией: после курсора изменились 10 заметок"""
+    from qr_warehouse.models import Note
+    from qr_warehouse.sync import encode_cursor
+
+    with app.app_context():
+        note = Note.query.order_by(Note.updated_at.desc(), Note.id.desc()).offset(10).first()
+        cursor = encode_cursor({'notes': [note.updated_at.isoformat(), note.id]})
+    response = benchmark(client.get, f'/sync?since={cursor}')
+    assert response.status_code == 200
+    assert len(response.get_json()['notes']) == 10
@@ -0,0 +1,96 @@
+"""Общее окружение бенчмарков: временные БД и каталог загрузок.
+
+Переменные окружения задаются до импорта qr_warehouse (настройки читаются
+при импорте), поэтому приложение создается только внутри фикстур.
+"""
+import io
+import os
+import tempfile
+
+import pytest
+from PIL import Image
+
+_WORKDIR = tempfile.mkdtemp(prefix='qr-bench-')
+
+os.environ.update({
+    'TOKEN': '123456:BENCHMARK',
+    'USER_ID': '1',
+    'CHANNEL_ID': '-1001',
+    'DATABASE_URL': f"sqlite:///{os.path.join(_WORKDIR, 'bench.db')}",
+    'UPLOAD_FOLDER': os.path.join(_WORKDIR, 'uploads'),
+    'STORAGE_BACKEND': 'local',
+    'USER_STATE_BACKEND': 'memory',
+    'LEADER_LOCK_FILE': os.path.join(_WORKDIR, 'leader.lock'),
+    'UPLOAD_GC_INTERVAL': '0',
+    # Журнал сканирований пишут сами бенчмарки, фоновая запись им не мешает
+    'SCAN_FLUSH_INTERVAL': '3600',
+    # Заметки, созданные фикстурами, сразу видны в выгрузке изменений
+    'SYNC_CURSOR_LAG': '0',
+})
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+from qr_warehouse.leader import FileLease  # noqa: E402
+
+# Блокировку лидера держит сам процесс бенчмарков, поэтому приложение не
+# пытается доставлять сообщения в канал и не добавляет фонового шума
+_lease = FileLease(os.environ['LEADER_LOCK_FILE'])
+_lease.try_acquire()
+
+
+def pytest_addoption(parser):
+    parser.addoption('--bench-full', action='store_true',
+                     help='Включить долгие случаи (таблица на 1M заметок)')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--bench-full'):
+        return
+    skip = pytest.mark.skip(reason='долгий случай, запускается с --bench-full')
+    for item in items:
+        if 'full' in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'full: долгий случай, только с --bench-full')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from qr_warehouse import create_app, ensure_initialized
+    app = create_app()
+    ensure_initialized(app)
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
+
+
+def make_image(size: tuple, mode: str = 'RGB', fmt: str = 'JPEG') -> bytes:
+    """Изображение с шумом (плохо сжимается, как реальные фото)"""
+    img = Image.effect_noise(size, 64).convert(mode)
+    buffer = io.BytesIO()
+    img.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def ensure_notes(app, count: int):
+    """Догоняет число заметок в таблице до count"""
+    from qr_warehouse.config import ALLOWED_USER_ID
+    from qr_warehouse.models import Note
+    from qr_warehouse.notes import bulk_insert_notes
+
+    with app.app_context():
+        existing = Note.query.count()
+        if existing < count:
+            rows = ({'title': f'Заметка {i}', 'text': f'Ячейка A-{i % 100}, полка {i % 7}'}
+                    for i in range(existing, count))
+            bulk_insert_notes(rows, ALLOWED_USER_ID, batch_size=5000)
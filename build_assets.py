@@ -0,0 +1,131 @@
+"""Сборка статики: минификация, хэш в имени файла и предсжатые варианты.
+
+Для каждого файла из ASSETS в static/dist/ создаются:
+    <name>.<hash>.<ext>       - минифицированный файл
+    <name>.<hash>.<ext>.gz    - gzip-вариант
+    <name>.<hash>.<ext>.br    - brotli-вариант
+и manifest.json с соответствием исходного имени собранному.
+
+Запуск: python build_assets.py [--strict]  (или flask --app app build-assets)
+
+brotli, rcssmin и rjsmin - в requirements.txt. Модуль импортируется и
+приложением (манифест), поэтому без них он работает, но сборка получается
+неполной (без .br или без минификации) - об этом выводится предупреждение,
+а с --strict сборка завершается ошибкой.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+
+BASE_DIR = Path(__file__).resolve().parent
+STATIC_DIR = BASE_DIR / 'static'
+DIST_DIR = STATIC_DIR / 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+logger = logging.getLogger(__name__)
+
+ASSETS = [
+    'css/style.css',
+    'js/main.js',
+    'js/offline.js',
+]
+
+
+def minify_css(source: str) -> str:
+    """Минификация CSS через rcssmin; без него файл копируется как есть
+
+    Самодельная замена на регулярных выражениях портила бы строки и
+    комментарии внутри строк, а экономия после gzip/brotli невелика.
+    """
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+
+def minify_js(source: str) -> str:
+    """Минификация JS через rjsmin; без него файл копируется как есть
+
+    Построчная обработка без разбора JS ломала шаблонные строки и строки
+    с ``//`` (например, URL), поэтому запасного варианта нет.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    return source
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def missing_packages() -> list:
+    """Не установленные пакеты, без которых сборка неполная"""
+    packages = {'brotli': brotli, 'rcssmin': rcssmin, 'rjsmin': rjsmin}
+    return [name for name, module in packages.items() if module is None]
+
+
+def build(dist_dir: Path = DIST_DIR) -> dict:
+    """Сборка всех ASSETS в dist_dir, возвращает манифест"""
+    missing = missing_packages()
+    if missing:
+        logger.warning(f"Static build is incomplete, not installed: {', '.join(missing)} "
+                       f"(pip install -r requirements.txt)")
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+    manifest = {}
+    for name in ASSETS:
+        source_path = STATIC_DIR / name
+        source = source_path.read_text(encoding='utf-8')
+        minify = MINIFIERS.get(source_path.suffix)
+        data = (minify(source) if minify else source).encode('utf-8')
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed_name = str(Path(name).with_name(f'{source_path.stem}.{digest}{source_path.suffix}'))
+        target = dist_dir / hashed_name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        # mtime=0 - одинаковый результат при повторных сборках
+        target.with_name(target.name + '.gz').write_bytes(gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            target.with_name(target.name + '.br').write_bytes(brotli.compress(data, quality=11))
+
+        manifest[name] = hashed_name
+
+    (dist_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    return manifest
+
+
+def load_manifest(dist_dir: Path = DIST_DIR) -> dict:
+    """Манифест собранной статики, пустой словарь если сборки не было"""
+    try:
+        return json.loads((dist_dir / MANIFEST_NAME).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+if __name__ == '__main__':
+    if '--strict' in sys.argv[1:] and missing_packages():
+        sys.exit(f"Not installed: {', '.join(missing_packages())} (pip install -r requirements.txt)")
+    for source_name, built_name in build().items():
+        print(f'{source_name} -> dist/{built_name}')
@@ -0,0 +1,58 @@
+"""Конфигурация gunicorn: gunicorn -c gunicorn.conf.py app:app
+
+Нагрузка смешанная: ожидание Telegram и диска (I/O) плюс PIL и генерация
+QR (CPU). Поэтому воркеры - gthread: несколько процессов для CPU и
+несколько потоков в каждом для I/O. Приложение загружается в мастере
+(preload_app) и разделяется воркерами через copy-on-write; все потоки и
+соединения создаются уже после fork в post_fork (qr_warehouse.init_worker).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Периодический перезапуск воркеров ограничивает рост памяти (PIL, кэши)
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+
+# Метрики Prometheus собираются со всех воркеров через общий каталог; он
+# должен быть задан и очищен до импорта приложения (preload_app)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                      os.path.join(tempfile.gettempdir(), 'qr-warehouse-metrics'))
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def when_ready(server):
+    """Таблицы БД и импорт тяжелых модулей - один раз в мастере, до запуска воркеров"""
+    import qr_warehouse
+    from app import app
+
+    qr_warehouse.warm_up()
+    qr_warehouse.ensure_initialized(app)
+
+
+def post_fork(server, worker):
+    """Инициализация воркера: свои соединения с БД, цикл Telegram и доставка в канал"""
+    import qr_warehouse
+    from app import app
+
+    qr_warehouse.init_worker(app)
+
+
+def child_exit(server, worker):
+    """Значения gauge завершившегося воркера больше не учитываются"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,200 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Отвечает на /bot<token>/<метод> правдоподобными результатами, отдает файлы
+по /file/bot<token>/<путь> и записывает все вызовы. Задержка, доля ответов
+429 (retry_after) и доля ошибок задаются параметрами.
+
+    python loadtest/fake_telegram.py --port 8081 --latency 0.05 --rate-limit 0.01
+
+Приложение направляется на заглушку переменной окружения
+TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot. Статистика вызовов -
+GET /_stats, сброс - POST /_reset.
+"""
+import argparse
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+API_PATH = re.compile(r'^/bot(?P<token>[^/]+)/(?P<method>\w+)$')
+FILE_PATH = re.compile(r'^/file/bot(?P<token>[^/]+)/(?P<path>.+)$')
+CHAT_ID = re.compile(rb'chat_id"?\s*(?:=|:|\r\n\r\n)\s*"?(-?\d+)')
+
+MESSAGE_METHODS = {'sendMessage', 'sendPhoto', 'sendMediaGroup', 'sendDocument',
+                   'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'}
+
+
+def make_photo(size: tuple = (1280, 960)) -> bytes:
+    """JPEG, который отдается вместо файлов пользователя"""
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class FakeTelegram:
+    """Состояние заглушки: параметры поведения и счетчики вызовов"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit: float = 0.0,
+                 retry_after: int = 1, failure_rate: float = 0.0, photo_size: tuple = (1280, 960)):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.failure_rate = failure_rate
+        self.photo = make_photo(photo_size)
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = Counter()
+            self.rate_limited = Counter()
+            self.failed = Counter()
+            self.started = time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'uptime': round(time.time() - self.started, 3),
+                'calls': dict(self.calls),
+                'rate_limited': dict(self.rate_limited),
+                'failed': dict(self.failed),
+                'total': sum(self.calls.values()),
+            }
+
+    def delay(self):
+        pause = self.latency + random.uniform(-self.jitter, self.jitter)
+        if pause > 0:
+            time.sleep(pause)
+
+    def call(self, method: str, body: bytes) -> tuple:
+        """(HTTP-код, JSON-ответ) на вызов метода Bot API"""
+        with self._lock:
+            self.calls[method] += 1
+        self.delay()
+        roll = random.random()
+        if roll < self.rate_limit:
+            with self._lock:
+                self.rate_limited[method] += 1
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+        if roll < self.rate_limit + self.failure_rate:
+            with self._lock:
+                self.failed[method] += 1
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+        return 200, {'ok': True, 'result': self.result(method, body)}
+
+    def result(self, method: str, body: bytes):
+        if method == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot',
+                    'can_join_groups': True, 'can_read_all_group_messages': False,
+                    'supports_inline_queries': False}
+        if method == 'getFile':
+            file_id = f'file{next(self._message_ids)}'
+            return {'file_id': file_id, 'file_unique_id': file_id,
+                    'file_size': len(self.photo), 'file_path': f'photos/{file_id}.jpg'}
+        if method in MESSAGE_METHODS:
+            match = CHAT_ID.search(body)
+            chat_id = int(match.group(1)) if match else 1
+            message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                       'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'channel'}}
+            if method == 'sendPhoto':
+                message['photo'] = [{'file_id': 'photo', 'file_unique_id': 'photo',
+                                     'width': 1280, 'height': 960}]
+            return [message] if method == 'sendMediaGroup' else message
+        # answerCallbackQuery, setWebhook, deleteWebhook и прочие
+        return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'FakeTelegram/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def fake(self) -> FakeTelegram:
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        if self.path == '/_stats':
+            return self.send_json(200, self.fake.stats())
+        if FILE_PATH.match(self.path):
+            self.fake.delay()
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(self.fake.photo)))
+            self.end_headers()
+            self.wfile.write(self.fake.photo)
+            return
+        self.handle_api(b'')
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.path == '/_reset':
+            self.fake.reset()
+            return self.send_json(200, {'ok': True})
+        self.handle_api(body)
+
+    def handle_api(self, body: bytes):
+        match = API_PATH.match(self.path.split('?', 1)[0])
+        if not match:
+            return self.send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+        status, payload = self.fake.call(match.group('method'), body)
+        self.send_json(status, payload)
+
+
+def serve(host: str, port: int, fake: FakeTelegram) -> ThreadingHTTPServer:
+    """Сервер заглушки; serve_forever() вызывается снаружи (или в потоке)"""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.fake = fake
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05, help='Задержка ответа, с')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Разброс задержки, ±с')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Доля ответов 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429, с')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Доля ответов 500')
+    args = parser.parse_args()
+
+    fake = FakeTelegram(args.latency, args.jitter, args.rate_limit, args.retry_after, args.failure_rate)
+    server = serve(args.host, args.port, fake)
+    print(f'Fake Bot API: http://{args.host}:{args.port}/bot  (stats: /_stats)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Генератор нагрузки: /create_note, /open_qr, /qr и обновления бота через /webhook.
+
+Нагрузка открытая: запросы отправляются по расписанию с заданной частотой
+независимо от того, успел ли ответить сервер. Задержка считается от
+запланированного момента отправки, поэтому очередь на стороне клиента
+(все потоки заняты) тоже попадает в p95/p99.
+
+    python loadtest/loadgen.py --url http://127.0.0.1:5000 --duration 60 \\
+        --rate create_note=2 --rate open_qr=50 --rate qr=20 --rate bot=10
+
+Заметки для open_qr и bot создаются через /bulk_create_notes, поэтому нужен
+ADMIN_TOKEN приложения. Для сценария bot нужен WEBHOOK_SECRET (тот же, что у приложения); его
+задержка - время приема обновления в очередь, полное время обработки
+видно в /metrics (qr_stage_duration_seconds{stage="update_handler"}).
+"""
+import argparse
+import io
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+from PIL import Image
+
+SCENARIOS = ('create_note', 'open_qr', 'qr', 'bot')
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу (values отсортирован)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Recorder:
+    """Задержки и ошибки по сценариям"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, scenario: str, latency: float, status: Optional[int], ok: bool):
+        with self._lock:
+            self.latencies[scenario].append(latency)
+            self.statuses[scenario][status or 'error'] += 1
+            if not ok:
+                self.errors[scenario] += 1
+
+    def report(self, elapsed: float) -> dict:
+        result = {}
+        with self._lock:
+            for scenario, values in self.latencies.items():
+                values = sorted(values)
+                result[scenario] = {
+                    'count': len(values),
+                    'errors': self.errors[scenario],
+                    'rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+                    'p50': round(percentile(values, 50) * 1000, 1),
+                    'p95': round(percentile(values, 95) * 1000, 1),
+                    'p99': round(percentile(values, 99) * 1000, 1),
+                    'max': round(values[-1] * 1000, 1),
+                    'statuses': {str(k): v for k, v in self.statuses[scenario].items()},
+                }
+        return result
+
+
+class LoadGenerator:
+    """Сценарии нагрузки на приложение по адресу base_url"""
+
+    def __init__(self, base_url: str, webhook_secret: Optional[str] = None, user_id: int = 1,
+                 photo_size: tuple = (1600, 1200), photos_per_note: int = 1, timeout: float = 30,
+                 admin_token: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
+        self.webhook_secret = webhook_secret
+        self.admin_token = admin_token
+        self.user_id = user_id
+        self.photos_per_note = photos_per_note
+        self.timeout = timeout
+        self.note_ids: List[str] = []
+        self.photo = self._make_photo(photo_size) if photos_per_note else None
+        self._local = threading.local()
+        self._update_ids = itertools.count(int(time.time()))
+        self._counter = itertools.count(1)
+
+    @staticmethod
+    def _make_photo(size: tuple) -> bytes:
+        buffer = io.BytesIO()
+        Image.effect_noise(size, 64).convert('RGB').save(buffer, 'JPEG', quality=90)
+        return buffer.getvalue()
+
+    @property
+    def session(self) -> requests.Session:
+        # Свое соединение на поток: keep-alive без гонок в Session
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def seed(self, count: int):
+        """Заметки для /open_qr и /view, создаются одним запросом /bulk_create_notes"""
+        notes = [{'title': f'Нагрузка {i}', 'text': f'Ячейка L-{i % 100}, полка {i % 7}'}
+                 for i in range(count)]
+        response = self.session.post(f'{self.base_url}/bulk_create_notes', json=notes, timeout=300,
+                                     headers={'Authorization': f'Bearer {self.admin_token or ""}'})
+        response.raise_for_status()
+        self.note_ids = response.json()['note_ids']
+
+    def create_note(self) -> requests.Response:
+        n = next(self._counter)
+        files = [('photos', (f'photo{i}.jpg', self.photo, 'image/jpeg'))
+                 for i in range(self.photos_per_note)]
+        return self.session.post(f'{self.base_url}/create_note',
+                                 data={'text': f'Нагрузка {n}\nЯчейка N-{n % 100}'},
+                                 files=files or None, timeout=self.timeout)
+
+    def open_qr(self) -> requests.Response:
+        note_id = random.choice(self.note_ids) if self.note_ids else 'missing'
+        payload = {'data': f'qrapp:note:{note_id}', 'device': f'load-{os.getpid()}',
+                   'location': f'Зона {random.randint(1, 20)}'}
+        return self.session.post(f'{self.base_url}/open_qr', json=payload, timeout=self.timeout)
+
+    def qr(self) -> requests.Response:
+        return self.session.get(f'{self.base_url}/qr', params={'data': f'load-{next(self._counter)}'},
+                                timeout=self.timeout)
+
+    def bot(self) -> requests.Response:
+        """Обновление с командой /qr, /note или /view, как его прислал бы Telegram"""
+        choice = random.random()
+        if choice < 0.5:
+            text = f'/qr load-{next(self._counter)}'
+        elif choice < 0.8 or not self.note_ids:
+            text = '/note'
+        else:
+            text = f'/view {random.choice(self.note_ids)}'
+        command = text.split(' ', 1)[0]
+        update = {
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._counter),
+                'date': int(time.time()),
+                'chat': {'id': self.user_id, 'type': 'private'},
+                'from': {'id': self.user_id, 'is_bot': False, 'first_name': 'Load'},
+                'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+            },
+        }
+        return self.session.post(f'{self.base_url}/webhook', json=update, timeout=self.timeout,
+                                 headers={'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret or ''})
+
+
+def run(generator: LoadGenerator, rates: Dict[str, float], duration: float, workers: int,
+        poisson: bool = False) -> dict:
+    """Отправка запросов с частотами rates (запросов в секунду) в течение duration"""
+    recorder = Recorder()
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def execute(scenario: str, action: Callable, scheduled: float):
+        try:
+            response = action()
+            status, ok = response.status_code, response.status_code < 400
+        except requests.RequestException:
+            status, ok = None, False
+        recorder.record(scenario, time.perf_counter() - scheduled, status, ok)
+
+    def schedule(scenario: str, rate: float, start: float):
+        action = getattr(generator, scenario)
+        moment = start
+        while True:
+            moment += random.expovariate(rate) if poisson else 1 / rate
+            if moment - start >= duration:
+                return
+            pause = moment - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            pool.submit(execute, scenario, action, moment)
+
+    start = time.perf_counter()
+    schedulers = [threading.Thread(target=schedule, args=(scenario, rate, start), daemon=True)
+                  for scenario, rate in rates.items() if rate > 0]
+    for thread in schedulers:
+        thread.start()
+    for thread in schedulers:
+        thread.join()
+    pool.shutdown(wait=True)
+    return recorder.report(time.perf_counter() - start)
+
+
+def print_report(report: dict):
+    columns = ('count', 'errors', 'rps', 'p50', 'p95', 'p99', 'max')
+    print(f"{'scenario':<12}" + ''.join(f'{c:>10}' for c in columns) + '   (задержки в мс)')
+    for scenario in SCENARIOS:
+        if scenario in report:
+            row = report[scenario]
+            print(f'{scenario:<12}' + ''.join(f'{row[c]:>10}' for c in columns))
+
+
+def parse_rate(value: str) -> tuple:
+    scenario, _, rate = value.partition('=')
+    if scenario not in SCENARIOS or not rate:
+        raise argparse.ArgumentTypeError(f'ожидается <сценарий>=<запросов/с>, сценарии: {", ".join(SCENARIOS)}')
+    return scenario, float(rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест QR Warehouse')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Адрес приложения')
+    parser.add_argument('--rate', type=parse_rate, action='append', default=[],
+                        help='Частота сценария: create_note=2, open_qr=50, qr=20, bot=10')
+    parser.add_argument('--duration', type=float, default=30, help='Длительность, с')
+    parser.add_argument('--workers', type=int, default=64, help='Потоков отправки')
+    parser.add_argument('--poisson', action='store_true', help='Случайные интервалы вместо равномерных')
+    parser.add_argument('--seed-notes', type=int, default=1000, help='Заметок для open_qr и /view')
+    parser.add_argument('--photos', type=int, default=1, help='Фото в каждой create_note')
+    parser.add_argument('--photo-size', default='1600x1200', help='Размер фото, ШxВ')
+    parser.add_argument('--webhook-secret', default=os.environ.get('WEBHOOK_SECRET'))
+    parser.add_argument('--admin-token', default=os.environ.get('ADMIN_TOKEN'),
+                        help='ADMIN_TOKEN приложения для создания заметок /bulk_create_notes')
+    parser.add_argument('--user-id', type=int, default=int(os.environ.get('USER_ID') or 1))
+    parser.add_argument('--fake-url', help='Адрес заглушки Bot API для статистики вызовов')
+    parser.add_argument('--json', dest='json_path', help='Сохранить отчет в JSON')
+    args = parser.parse_args()
+
+    rates = dict(args.rate) or {'open_qr': 20, 'qr': 10}
+    if rates.get('bot') and not args.webhook_secret:
+        parser.error('для сценария bot нужен --webhook-secret (или WEBHOOK_SECRET)')
+    width, height = (int(x) for x in args.photo_size.lower().split('x'))
+
+    generator = LoadGenerator(args.url, args.webhook_secret, args.user_id, (width, height), args.photos,
+                              admin_token=args.admin_token)
+    if args.seed_notes and (rates.get('open_qr') or rates.get('bot')):
+        generator.seed(args.seed_notes)
+    if args.fake_url:
+        requests.post(f'{args.fake_url.rstrip("/")}/_reset', timeout=5)
+
+    print(f"Нагрузка {args.duration:g} с: " + ', '.join(f'{k}={v:g}/с' for k, v in rates.items()))
+    report = {'rates': rates, 'duration': args.duration,
+              'scenarios': run(generator, rates, args.duration, args.workers, args.poisson)}
+    print_report(report['scenarios'])
+
+    if args.fake_url:
+        report['telegram'] = requests.get(f'{args.fake_url.rstrip("/")}/_stats', timeout=5).json()
+        print('Bot API: ' + json.dumps(report['telegram']['calls'], ensure_ascii=False))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""QR Warehouse: заметки с QR-кодами, веб-интерфейс и Telegram-бот
+
+create_app() собирает Flask-приложение из blueprint'ов. Создание
+приложения не открывает соединений с БД и не запускает потоков: таблицы
+создаются в ensure_initialized(), а фоновые компоненты процесса (свой пул
+соединений, цикл Telegram, доставка в канал) - в init_worker() после fork.
+Поэтому gunicorn с preload_app импортирует модули один раз в мастере, а
+воркеры получают их через copy-on-write.
+"""
+# Первым: таймер запуска отсчитывает время импорта пакета и его зависимостей
+from . import startup
+
+import threading
+from pathlib import Path
+
+from flask import Flask
+from flask_cors import CORS
+from sqlalchemy import inspect
+
+from . import background, config, instrumentation
+from .extensions import channel_lease, db, sql_stats
+from .models import NotePhoto, add_note_updated_at, add_user_state_version, rebuild_photo_index
+
+
+def create_app() -> Flask:
+    """Flask-приложение; настройки берутся из переменных окружения (config.py)"""
+    with startup.timer.phase('create_app'):
+        app = Flask(__name__, static_folder=str(config.STATIC_DIR), template_folder=str(config.TEMPLATES_DIR),
+                    instance_path=str(config.INSTANCE_DIR))
+        app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URL
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
+        app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
+        app.config['SECRET_KEY'] = config.SECRET_KEY
+        app.config['USE_X_SENDFILE'] = config.UPLOAD_OFFLOAD == 'x-sendfile'
+        # Первое обращение к app.logger подключает обработчик Flask; через него
+        # выводятся и журналы модулей пакета (qr_warehouse.*)
+        app.logger.debug('Creating application')
+
+        CORS(app, origins=config.CORS_ORIGINS)
+        Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True, parents=True)
+
+        db.init_app(app)
+        app.extensions['qr_warehouse'] = {'initialized': False, 'lock': threading.Lock()}
+        background.init_app(app)
+
+        @app.before_request
+        def _initialize():
+            ensure_initialized(app)
+
+        instrumentation.init_app(app)
+
+        from . import admin, cli, web
+        app.register_blueprint(web.bp)
+        app.register_blueprint(admin.bp)
+        app.register_blueprint(cli.bp)
+    return app
+
+
+def warm_up():
+    """Заблаговременный импорт модулей, которые иначе импортируются при первом использовании
+
+    gunicorn вызывает его в мастере до fork: воркеры получают уже
+    загруженные модули через copy-on-write, а первый запрос к боту или
+    первое фото не ждут импорта под нагрузкой.
+    """
+    with startup.timer.phase('warm_up'):
+        import PIL.Image  # noqa: F401
+        import qrcode  # noqa: F401
+        import telegram.ext  # noqa: F401
+
+        from . import telegram_runtime  # noqa: F401
+
+
+def ensure_initialized(app: Flask):
+    """Отложенная инициализация БД: таблицы, новые столбцы и индекс фото (один раз на приложение)
+
+    Вызывается gunicorn в мастере до fork (when_ready), при первом запросе
+    и из CLI-команд, а не при создании приложения.
+    """
+    state = app.extensions['qr_warehouse']
+    if state['initialized']:
+        return
+    with state['lock']:
+        if state['initialized']:
+            return
+        with startup.timer.phase('database'), app.app_context():
+            sql_stats.install(db.engine)
+            photo_index_missing = not inspect(db.engine).has_table(NotePhoto.__tablename__)
+            db.create_all()
+            if add_note_updated_at():
+                app.logger.info('Added note.updated_at column')
+            if add_user_state_version():
+                app.logger.info('Added user_state.version column')
+            if photo_index_missing:
+                # Таблица только что создана - заполняем по уже существующим заметкам,
+                # иначе сборщик мусора примет их фото за сирот
+                rebuild_photo_index()
+        state['initialized'] = True
+    app.logger.info(startup.timer.summary())
+
+
+def init_worker(app: Flask):
+    """Запуск фоновых компонентов в процессе-воркере (gunicorn post_fork)
+
+    Соединения с БД, унаследованные от мастера, отбрасываются без закрытия
+    (закрытие из воркера сломало бы их у других процессов), блокировка
+    лидера сбрасывается, а Telegram Application и цикл доставки в канал
+    создаются уже в этом процессе.
+    """
+    from .bot import get_telegram_app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    channel_lease.reset_after_fork()
+    get_telegram_app()
+    background.start_telegram_runtime()
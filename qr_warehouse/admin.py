@@ -0,0 +1,61 @@
+"""Служебные маршруты (экспорт, профили); доступны с Authorization: Bearer <ADMIN_TOKEN>"""
+import hmac
+
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
+
+from . import config, profiling
+from .extensions import profiler
+from .notes import iter_export_ndjson, iter_export_zip
+
+bp = Blueprint('admin', __name__)
+
+
+def is_admin_request() -> bool:
+    """Проверка заголовка Authorization: Bearer <ADMIN_TOKEN>"""
+    if not config.ADMIN_TOKEN:
+        return False
+    header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(header, f'Bearer {config.ADMIN_TOKEN}')
+
+
+@bp.before_request
+def _require_admin():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+
+
+@bp.route('/export')
+def export_notes():
+    """Потоковый экспорт всех заметок (NDJSON или ZIP с фото)
+
+    Параметры: ``format`` - ``ndjson`` (по умолчанию) или ``zip``;
+    ``after`` - id последней полученной заметки для продолжения экспорта.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    after = request.args.get('after') or None
+    if fmt == 'ndjson':
+        return Response(stream_with_context(iter_export_ndjson(after)),
+                        mimetype='application/x-ndjson')
+    if fmt == 'zip':
+        return Response(stream_with_context(iter_export_zip(after)), mimetype='application/zip',
+                        headers={'Content-Disposition': 'attachment; filename=qr_warehouse_export.zip'})
+    return jsonify({'error': 'Parameter "format" must be ndjson or zip'}), 400
+
+
+@bp.route('/admin/profiles')
+def admin_profiles():
+    """Список сохраненных профилей медленных запросов (новые первыми)"""
+    # Некорректное значение - значение по умолчанию, а не 500
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify({'profiles': profiler.list(limit)})
+
+
+@bp.route('/admin/profiles/<profile_id>')
+def admin_profile(profile_id):
+    """Файл профиля: ``format`` - ``speedscope`` (по умолчанию) или ``collapsed``"""
+    fmt = request.args.get('format', 'speedscope')
+    path = profiler.path(profile_id, fmt)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    suffix, mimetype = profiling.FORMATS[fmt]
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=profile_id + suffix)
@@ -0,0 +1,327 @@
+"""Фоновая работа процесса: цикл событий Telegram, доставка в канал, обслуживание
+
+Цикл и его поток создаются не при импорте, а в init_worker() после fork
+(gunicorn post_fork) или лениво при первой отправке в канал. Цикл,
+унаследованный от родителя через fork, без своего потока не работает,
+поэтому в новом процессе он создается заново.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+
+from . import config, metrics
+from .drafts import purge_expired_user_states
+from .extensions import channel_lease, db, scan_buffer, storage
+from .housekeeping import collect_upload_garbage
+from .metrics import observe
+from .models import ChannelPost
+from .scans import flush_all_scan_events, flush_scan_events, purge_old_scan_events
+from .uploads import upload_key
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+_app: Optional[Flask] = None
+_telegram_loop: Optional[asyncio.AbstractEventLoop] = None
+_telegram_thread: Optional[threading.Thread] = None
+_telegram_pid: Optional[int] = None
+_outbox_event: Optional[asyncio.Event] = None
+_scan_event: Optional[asyncio.Event] = None
+_delivery_lock: Optional[asyncio.Lock] = None
+_telegram_lock = threading.Lock()
+_bot = None
+_bot_lock = threading.Lock()
+
+
+def init_app(app: Flask):
+    """Приложение, в контексте которого фоновые задачи работают с БД"""
+    global _app
+    _app = app
+    scan_buffer.on_full = _wake_scan_flusher
+    atexit.register(_flush_scans_at_exit)
+
+
+def start_telegram_runtime(loop: Optional[asyncio.AbstractEventLoop] = None) -> asyncio.AbstractEventLoop:
+    """Запуск цикла событий для операций Telegram (идемпотентно в пределах процесса)
+
+    Без аргумента создается фоновый поток со своим циклом (режим WSGI).
+    В ASGI-режиме передается цикл сервера, и доставка в канал работает
+    в нем же, без отдельного потока. Вызывается после fork (gunicorn
+    post_fork) или лениво при первой отправке в канал.
+    """
+    global _telegram_loop, _telegram_thread, _telegram_pid, _outbox_event, _scan_event, _delivery_lock
+    with _telegram_lock:
+        if _telegram_loop is not None and _telegram_pid == os.getpid():
+            return _telegram_loop
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            _telegram_thread = threading.Thread(target=loop.run_forever, name='telegram-loop', daemon=True)
+            _telegram_thread.start()
+        _outbox_event = asyncio.Event()
+        _scan_event = asyncio.Event()
+        _delivery_lock = asyncio.Lock()
+        asyncio.run_coroutine_threadsafe(_channel_worker(), loop)
+        asyncio.run_coroutine_threadsafe(_scan_flush_worker(), loop)
+        asyncio.run_coroutine_threadsafe(_maintenance_worker(), loop)
+        _telegram_loop, _telegram_pid = loop, os.getpid()
+    return loop
+
+
+def run_telegram_coroutine(coro) -> concurrent.futures.Future:
+    """Выполнение корутины в цикле Telegram из синхронного кода"""
+    return asyncio.run_coroutine_threadsafe(coro, start_telegram_runtime())
+
+
+async def run_blocking(func, *args):
+    """Выполнение блокирующей работы (БД, PIL, генерация QR) в пуле потоков
+
+    Функция выполняется в контексте приложения, поэтому может работать с БД.
+    Контекстные переменные (область учета SQL) передаются в поток.
+    """
+    context = contextvars.copy_context()
+
+    def call():
+        with _app.app_context():
+            return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, call)
+
+
+def get_bot():
+    """Bot для отправки в канал и служебных вызовов (создается при первом обращении)"""
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                from telegram import Bot
+
+                from . import telegram_runtime
+
+                _bot = Bot(token=config.BOT_TOKEN, base_url=config.TELEGRAM_API_BASE_URL,
+                           base_file_url=config.TELEGRAM_FILE_BASE_URL,
+                           request=telegram_runtime.InstrumentedRequest())
+    return _bot
+
+
+def _enqueue_channel_post(kind: str, payload: dict):
+    """Запись сообщения в outbox и пробуждение доставки"""
+    db.session.add(ChannelPost(kind=kind, payload_json=json.dumps(payload, ensure_ascii=False)))
+    db.session.commit()
+    loop = start_telegram_runtime()
+    loop.call_soon_threadsafe(_outbox_event.set)
+
+
+def send_to_channel_sync(text: str, photo_paths: list):
+    """Синхронная обертка для отправки в канал"""
+    try:
+        _enqueue_channel_post('note', {'text': text, 'photos': photo_paths})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error queueing send_to_channel: {e}")
+
+
+def send_to_channel_bulk_sync(texts: list):
+    """Постановка в очередь одной задачи на отправку пачки заметок в канал"""
+    if not texts:
+        return
+    try:
+        _enqueue_channel_post('digest', {'texts': texts})
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error queueing send_to_channel_bulk: {e}")
+
+
+def _due_channel_posts(limit: int) -> list:
+    """Сообщения outbox, которые пора отправить: список (id, kind, payload, attempts, created)"""
+    posts = (ChannelPost.query
+             .filter(ChannelPost.next_attempt <= datetime.utcnow())
+             .order_by(ChannelPost.id)
+             .limit(limit)
+             .all())
+    return [(post.id, post.kind, json.loads(post.payload_json), post.attempts, post.created)
+            for post in posts]
+
+
+def _finish_channel_post(post_id: int, delivered: bool, retry_after: Optional[float] = None):
+    """Удаление отправленного сообщения или перенос попытки с задержкой
+
+    retry_after - ответ 429 от Telegram: попытка не считается неудачной и
+    повторяется через указанное время.
+    """
+    post = db.session.get(ChannelPost, post_id)
+    if post is None:
+        return
+    if retry_after is not None:
+        post.next_attempt = datetime.utcnow() + timedelta(seconds=retry_after)
+        db.session.commit()
+        return
+    post.attempts += 1
+    if delivered or post.attempts >= config.CHANNEL_MAX_ATTEMPTS:
+        if not delivered:
+            logger.error(f"Dropping channel post {post_id} after {post.attempts} attempts")
+        db.session.delete(post)
+    else:
+        post.next_attempt = datetime.utcnow() + timedelta(seconds=5 * 2 ** post.attempts)
+    db.session.commit()
+
+
+async def deliver_channel_posts(limit: int = config.CHANNEL_OUTBOX_BATCH) -> int:
+    """Отправка пачки сообщений из outbox, возвращает число обработанных
+
+    Доставка в процессе однопоточная: _channel_worker и CLI (import-notes)
+    держат одну и ту же блокировку лидера, и без _delivery_lock оба взяли бы
+    одни и те же сообщения и отправили их в канал дважды.
+    """
+    async with _delivery_lock:
+        return await _deliver_channel_posts(limit)
+
+
+async def _deliver_channel_posts(limit: int) -> int:
+    from telegram.error import RetryAfter
+
+    posts = await run_blocking(_due_channel_posts, limit)
+    for post_id, kind, payload, attempts, created in posts:
+        if attempts == 0:
+            metrics.QUEUE_WAIT_SECONDS.labels('channel_outbox').observe(
+                (datetime.utcnow() - created).total_seconds())
+        try:
+            with observe('channel_delivery'):
+                if kind == 'digest':
+                    await send_to_channel_bulk(payload['texts'])
+                else:
+                    await send_to_channel(payload['text'], payload['photos'])
+            delivered = True
+        except RetryAfter as e:
+            # Лимит Telegram на канал: откладываем и прекращаем пачку
+            logger.warning(f"Channel rate limited, retry after {e.retry_after}s")
+            await run_blocking(_finish_channel_post, post_id, False, float(e.retry_after))
+            return len(posts)
+        except Exception as e:
+            logger.error(f"Error in telegram queue: {e}")
+            delivered = False
+        await run_blocking(_finish_channel_post, post_id, delivered)
+        await asyncio.sleep(0.1)  # Небольшая задержка
+    return len(posts)
+
+
+async def send_to_channel(text: str, photo_paths: list):
+    """Отправка сообщения с фото в Telegram канал"""
+    bot = get_bot()
+    try:
+        if photo_paths:
+            # Отправляем первое фото с текстом
+            with await run_blocking(storage.open, upload_key(photo_paths[0])) as photo_file:
+                await bot.send_photo(
+                    chat_id=config.CHANNEL_ID,
+                    photo=photo_file,
+                    caption=text[:1024] if text else None
+                )
+            # Отправляем остальные фото
+            for photo_path in photo_paths[1:]:
+                with await run_blocking(storage.open, upload_key(photo_path)) as photo_file:
+                    await bot.send_photo(chat_id=config.CHANNEL_ID, photo=photo_file)
+        else:
+            # Отправляем только текст
+            await bot.send_message(chat_id=config.CHANNEL_ID, text=text[:4096])
+    except Exception as e:
+        logger.error(f"Error sending to channel: {e}")
+        raise
+
+
+async def send_to_channel_bulk(texts: list):
+    """Отправка пачки заметок в канал сводными сообщениями до 4096 символов"""
+    bot = get_bot()
+    chunk = ''
+    for text in texts:
+        line = (text or '').strip().split('\n')[0][:500]
+        if chunk and len(chunk) + len(line) + 1 > 4096:
+            await bot.send_message(chat_id=config.CHANNEL_ID, text=chunk)
+            chunk = ''
+        chunk = f"{chunk}\n{line}" if chunk else line
+    if chunk:
+        await bot.send_message(chat_id=config.CHANNEL_ID, text=chunk)
+
+
+# Периодические задачи процесса-лидера: (интервал в секундах, функция)
+MAINTENANCE_JOBS = [
+    (config.USER_STATE_PURGE_INTERVAL, purge_expired_user_states),
+    (config.UPLOAD_GC_INTERVAL, collect_upload_garbage),
+    (config.SCAN_PURGE_INTERVAL, purge_old_scan_events),
+]
+
+
+async def _maintenance_worker():
+    """Периодическое обслуживание (очистка черновиков и т.п.) в процессе-лидере"""
+    last_run = {}
+    while True:
+        await asyncio.sleep(min([interval for interval, _ in MAINTENANCE_JOBS if interval > 0] or [60]))
+        if not channel_lease.try_acquire():
+            continue
+        now = time.monotonic()
+        for interval, job in MAINTENANCE_JOBS:
+            if interval <= 0 or now - last_run.get(job, 0) < interval:
+                continue
+            last_run[job] = now
+            try:
+                await run_blocking(job)
+            except Exception as e:
+                logger.error(f"Error in maintenance job {job.__name__}: {e}")
+
+
+async def _channel_worker():
+    """Фоновая доставка outbox в канал
+
+    Работает в каждом процессе, но отправляет только держатель channel_lease;
+    остальные раз в CHANNEL_OUTBOX_POLL секунд пытаются перехватить лидерство.
+    """
+    while True:
+        if channel_lease.try_acquire():
+            try:
+                if await deliver_channel_posts():
+                    continue
+            except Exception as e:
+                logger.error(f"Error delivering channel posts: {e}")
+        _outbox_event.clear()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_outbox_event.wait(), config.CHANNEL_OUTBOX_POLL)
+
+
+def _wake_scan_flusher():
+    """В буфере набралась полная пачка - пишем, не дожидаясь интервала"""
+    loop = start_telegram_runtime()
+    loop.call_soon_threadsafe(_scan_event.set)
+
+
+def _flush_scans_at_exit():
+    if len(scan_buffer):
+        with _app.app_context():
+            flush_all_scan_events()
+
+
+async def _scan_flush_worker():
+    """Пакетная запись журнала сканирований
+
+    У каждого процесса свой буфер, поэтому задача работает во всех
+    процессах, а не только в лидере.
+    """
+    while True:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_scan_event.wait(), config.SCAN_FLUSH_INTERVAL)
+        _scan_event.clear()
+        try:
+            while await run_blocking(flush_scan_events) == config.SCAN_FLUSH_BATCH:
+                pass
+        except Exception as e:
+            logger.error(f"Error writing scan events: {e}")
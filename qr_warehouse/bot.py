@@ -0,0 +1,641 @@
+"""Telegram-бот: обработчики команд, Application и прием обновлений через webhook
+
+python-telegram-bot импортируется при первом обращении к get_telegram_app().
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import io
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, BinaryIO, Optional
+
+from . import config, startup
+from .background import run_blocking, run_telegram_coroutine
+from .drafts import user_states
+from .extensions import profiler, sql_stats, storage
+from .notes import generate_qr_code, get_note_payload, parse_note_id, recent_notes, save_note_from_state
+from .stock import bin_contents, format_location, note_locations, parse_location, update_stock
+from .uploads import compress_image, new_upload_key, remove_uploads, save_upload, upload_key
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
+update_processor = None
+_telegram_app = None
+_telegram_build_lock = threading.Lock()
+_telegram_app_lock = threading.Lock()
+
+# Счетчики webhook для контроля перегрузки
+webhook_stats = {'received': 0, 'accepted': 0, 'rejected': 0, 'invalid': 0}
+
+
+def get_telegram_app():
+    """Telegram Application (создается при первом обращении)
+
+    Здесь же впервые импортируется python-telegram-bot.
+    """
+    global _telegram_app, update_processor
+    if _telegram_app is not None:
+        return _telegram_app
+    with _telegram_build_lock:
+        if _telegram_app is None:
+            with startup.timer.phase('telegram'):
+                from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
+
+                from . import telegram_runtime
+
+                processor = telegram_runtime.PerUserUpdateProcessor(config.WEBHOOK_MAX_CONCURRENT, profiler,
+                                                                    sql_stats)
+                application = (
+                    Application.builder()
+                    .token(config.BOT_TOKEN)
+                    .base_url(config.TELEGRAM_API_BASE_URL)
+                    .base_file_url(config.TELEGRAM_FILE_BASE_URL)
+                    .request(telegram_runtime.InstrumentedRequest(connection_pool_size=256))
+                    .update_queue(asyncio.Queue(maxsize=config.WEBHOOK_QUEUE_SIZE))
+                    .updater(None)
+                    .concurrent_updates(processor)
+                    .build()
+                )
+                application.add_handler(CommandHandler("start", start_command))
+                application.add_handler(CommandHandler("qr", qr_command))
+                application.add_handler(CommandHandler("note", note_command))
+                application.add_handler(CommandHandler("view", view_command))
+                application.add_handler(CommandHandler("where", where_command))
+                application.add_handler(CommandHandler("bin", bin_command))
+                application.add_handler(CommandHandler("stock", stock_command))
+                application.add_handler(CallbackQueryHandler(button_callback))
+                application.add_handler(MessageHandler(filters.TEXT | filters.PHOTO, handle_message))
+                update_processor = processor
+                _telegram_app = application
+    return _telegram_app
+
+
+async def start_telegram_application():
+    """Инициализация и запуск Application в цикле Telegram (идемпотентно)"""
+    telegram_app = get_telegram_app()
+    if telegram_app.running:
+        return
+    await telegram_app.initialize()
+    await telegram_app.start()
+
+
+def ensure_telegram_application():
+    """Запуск Application из синхронного кода (режим WSGI)"""
+    if get_telegram_app().running:
+        return
+    with _telegram_app_lock:
+        if not get_telegram_app().running:
+            run_telegram_coroutine(start_telegram_application()).result()
+
+
+def check_webhook_secret(token: Optional[str]) -> bool:
+    """Проверка секрета webhook; без WEBHOOK_SECRET webhook отключен"""
+    if not config.WEBHOOK_SECRET:
+        return False
+    return hmac.compare_digest(token or '', config.WEBHOOK_SECRET)
+
+
+async def enqueue_update(payload: dict) -> bool:
+    """Постановка обновления в ограниченную очередь Application
+
+    Возвращает False, если необработанных обновлений уже WEBHOOK_QUEUE_SIZE
+    (Telegram повторит доставку).
+    """
+    from telegram import Update
+
+    telegram_app = get_telegram_app()
+    webhook_stats['received'] += 1
+    if update_processor.pending >= config.WEBHOOK_QUEUE_SIZE:
+        webhook_stats['rejected'] += 1
+        return False
+    update = Update.de_json(payload, telegram_app.bot)
+    try:
+        telegram_app.update_queue.put_nowait(update)
+    except asyncio.QueueFull:
+        webhook_stats['rejected'] += 1
+        return False
+    update_processor.track(update)
+    webhook_stats['accepted'] += 1
+    return True
+
+
+def webhook_status() -> dict:
+    """Состояние очереди обновлений и счетчики webhook
+
+    Если бот в этом процессе еще не использовался, Application не создается.
+    """
+    telegram_app = _telegram_app
+    return {
+        **webhook_stats,
+        'queue_size': telegram_app.update_queue.qsize() if telegram_app else 0,
+        'pending': update_processor.pending if update_processor else 0,
+        'queue_max': config.WEBHOOK_QUEUE_SIZE,
+        'processing': update_processor.active if update_processor else 0,
+        'max_concurrent': config.WEBHOOK_MAX_CONCURRENT,
+        'running': telegram_app.running if telegram_app else False
+    }
+
+
+async def load_user_state(user_id: int) -> Optional[dict]:
+    """Черновик пользователя (из кэша без перехода в пул потоков)"""
+    found, state = user_states.cached(user_id)
+    if found:
+        return state
+    return await run_blocking(user_states.get, user_id, False)
+
+
+async def save_user_state(user_id: int, state: dict):
+    await run_blocking(user_states.set, user_id, state)
+
+
+async def update_user_state(user_id: int, mutate) -> Optional[dict]:
+    """Изменение черновика mutate(state) без потери одновременных изменений
+
+    Обновления одного пользователя могут обрабатываться разными воркерами;
+    см. UserStateStore.update. None - черновика нет.
+    """
+    return await run_blocking(user_states.update, user_id, mutate)
+
+
+def _add_draft_photo(state: dict, file_key: str):
+    if len(state['photos']) < 5:
+        state['photos'].append(file_key)
+
+
+def _draft_text_field(state: dict) -> str:
+    """Поле черновика, в которое попадет текст сообщения"""
+    waiting_for = state.get('waiting_for')
+    if waiting_for in ('title', 'text'):
+        return waiting_for
+    # Если заголовок еще не установлен - это заголовок, иначе текст
+    return 'text' if state.get('title') else 'title'
+
+
+async def drop_user_state(user_id: int):
+    await run_blocking(user_states.delete, user_id)
+
+
+async def open_upload(ref: str) -> Optional[BinaryIO]:
+    """Фото из хранилища для отправки в Telegram, None если файла нет"""
+    try:
+        return await run_blocking(storage.open, upload_key(ref))
+    except FileNotFoundError:
+        return None
+
+
+def is_authorized(user_id: int) -> bool:
+    """Проверка авторизации пользователя"""
+    return user_id == config.ALLOWED_USER_ID
+
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /start"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    welcome_text = "👋 Отправь ссылку Ozon/WB/Avito или заметку с фото"
+    await update.message.reply_text(welcome_text)
+
+
+async def qr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /qr <text/link> или QR-кода заметки"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    if not context.args:
+        await update.message.reply_text("❌ Использование: /qr <текст или ссылка>")
+        return
+
+    text_or_link = ' '.join(context.args)
+
+    if text_or_link.startswith('qrapp:note:'):
+        note_id = text_or_link.replace('qrapp:note:', '')
+        note = await run_blocking(get_note_payload, note_id)
+
+        if not note:
+            await update.message.reply_text("❌ Заметка не найдена")
+            return
+
+        note_text = f"📝 {note['title']}\n\n"
+        if note['text']:
+            note_text += note['text']
+
+        photos = note['photos']
+        if photos:
+            note_text += f"\n\n📷 Фото: {len(photos)} шт."
+
+        created = datetime.fromisoformat(note['created'])
+        note_text += f"\n\n🕐 Создано: {created.strftime('%Y-%m-%d %H:%M')}"
+
+        await update.message.reply_text(note_text, parse_mode='HTML')
+
+        if photos:
+            for ref in photos[:3]:  # Максимум 3 фото
+                try:
+                    photo_file = await run_blocking(storage.open, upload_key(ref))
+                    with photo_file:
+                        await update.message.reply_photo(photo=photo_file)
+                except Exception as e:
+                    await update.message.reply_text(f"❌ Ошибка отправки фото: {e}")
+
+        return
+
+    # Обычный QR-код
+    qr_image = await run_blocking(generate_qr_code, text_or_link)
+
+    await update.message.reply_photo(
+        photo=qr_image,
+        caption=f"📱 QR-код для: {text_or_link[:50]}..."
+    )
+
+
+async def note_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /note"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    # Получаем последние заметки пользователя
+    notes = await run_blocking(recent_notes, user_id)
+
+    keyboard = []
+    keyboard.append([InlineKeyboardButton("➕ Новая заметка", callback_data="note_new")])
+
+    if notes:
+        for note_id, title in notes:
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"📝 {title[:30]}...",
+                    callback_data=f"note_view_{note_id}"
+                )
+            ])
+
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    text = "📋 Заметки:\n\nВыберите действие:"
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+
+async def view_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /view <id>"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    if not context.args:
+        await update.message.reply_text("❌ Использование: /view <id>")
+        return
+
+    note_id = context.args[0]
+    note = await run_blocking(get_note_payload, note_id)
+
+    if not note or note['user_id'] != user_id:
+        await update.message.reply_text("❌ Заметка не найдена.")
+        return
+
+    await send_note_message(update, note)
+
+
+async def where_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /where <id> - в каких ячейках лежит товар"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    if not context.args:
+        await update.message.reply_text("❌ Использование: /where <id>")
+        return
+
+    note = await run_blocking(get_note_payload, parse_note_id(context.args[0]))
+    if not note:
+        await update.message.reply_text("❌ Заметка не найдена.")
+        return
+
+    locations = await run_blocking(note_locations, note['id'])
+    if not locations:
+        await update.message.reply_text(f"📦 {note['title']}\n\nНе размещен ни в одной ячейке.")
+        return
+
+    lines = [f"📍 {location['location']}: {location['quantity']} шт." for location in locations]
+    total = sum(location['quantity'] for location in locations)
+    await update.message.reply_text(f"📦 {note['title']}\n\n" + '\n'.join(lines) + f"\n\nВсего: {total} шт.")
+
+
+async def bin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /bin <адрес> - что лежит в ячейке (или в зоне, ряду, на полке)"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    if not context.args:
+        await update.message.reply_text("❌ Использование: /bin <адрес>, например /bin A-03-2-B или /bin A-03")
+        return
+
+    try:
+        parts = parse_location(' '.join(context.args), partial=True)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+
+    items = await run_blocking(bin_contents, parts)
+    if not items:
+        await update.message.reply_text(f"📭 {format_location(parts)}: пусто")
+        return
+
+    # Для одной ячейки адрес в каждой строке не нужен
+    full = len(parts) == 4
+    lines = [f"• {item['title'][:40]} - {item['quantity']} шт."
+             + ('' if full else f" ({item['location']})") for item in items]
+    if len(items) >= config.BIN_CONTENTS_LIMIT:
+        lines.append("…")
+    await update.message.reply_text(f"📦 {format_location(parts)}\n\n" + '\n'.join(lines)[:3900])
+
+
+async def stock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /stock <id> <адрес> <количество|+n|-n>"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        await update.message.reply_text("❌ Доступ запрещен.")
+        return
+
+    if len(context.args) != 3:
+        await update.message.reply_text(
+            "❌ Использование: /stock <id> <адрес> <количество>\n"
+            "Например: /stock <id> A-03-2-B 10, +5 или -2 (0 - убрать из ячейки)")
+        return
+
+    note_id, location, amount = context.args
+    try:
+        value = int(amount)
+    except ValueError:
+        await update.message.reply_text("❌ Количество должно быть целым числом")
+        return
+    relative = amount.startswith(('+', '-'))
+
+    try:
+        new_quantity = await run_blocking(update_stock, parse_note_id(note_id), location,
+                                          None if relative else value, value if relative else None)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    if new_quantity is None:
+        await update.message.reply_text("❌ Заметка не найдена.")
+        return
+
+    await update.message.reply_text(f"✅ {format_location(parse_location(location))}: {new_quantity} шт.")
+
+
+async def send_note_message(update: Update, note: dict, edit_message_id: Optional[int] = None):
+    """Отправка заметки пользователю"""
+    text = f"📝 <b>{note['title']}</b>\n\n"
+    if note['text']:
+        text += f"{note['text']}\n\n"
+    text += f"🆔 ID: <code>{note['id']}</code>"
+
+    photos = note['photos']
+
+    if photos:
+        # Отправляем первое фото с текстом
+        photo_file = await open_upload(photos[0])
+        if photo_file is not None:
+            with photo_file:
+                if edit_message_id:
+                    await update.callback_query.edit_message_caption(
+                        caption=text,
+                        parse_mode='HTML'
+                    )
+                else:
+                    await update.message.reply_photo(
+                        photo=photo_file,
+                        caption=text,
+                        parse_mode='HTML'
+                    )
+
+        # Отправляем остальные фото
+        for ref in photos[1:]:
+            photo_file = await open_upload(ref)
+            if photo_file is not None:
+                with photo_file:
+                    await update.message.reply_photo(photo=photo_file)
+    else:
+        if edit_message_id:
+            await update.callback_query.edit_message_text(
+                text=text,
+                parse_mode='HTML'
+            )
+        else:
+            await update.message.reply_text(text, parse_mode='HTML')
+
+    # Отправляем QR-код
+    qr_data = f"qrapp:note:{note['id']}"
+    qr_image = await run_blocking(generate_qr_code, qr_data)
+    await update.message.reply_photo(
+        photo=qr_image,
+        caption=f"📱 QR-код заметки"
+    )
+
+
+async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик callback от inline кнопок"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    query = update.callback_query
+    await query.answer()
+
+    user_id = query.from_user.id
+    if not is_authorized(user_id):
+        await query.edit_message_text("❌ Доступ запрещен.")
+        return
+
+    data = query.data
+
+    if data == "note_new":
+        # Незавершенный черновик заменяется новым, его фото больше не нужны
+        previous = await load_user_state(user_id)
+        if previous is not None:
+            await run_blocking(remove_uploads, previous.get('photos', []))
+        # Инициализируем состояние для новой заметки
+        await save_user_state(user_id, {
+            'mode': 'creating_note',
+            'photos': [],
+            'title': None,
+            'text': None,
+            'waiting_for': None  # 'title', 'text', или None
+        })
+
+        keyboard = [
+            [InlineKeyboardButton("📷 Добавить фото (до 5)", callback_data="note_add_photo")],
+            [InlineKeyboardButton("✏️ Установить заголовок", callback_data="note_set_title")],
+            [InlineKeyboardButton("📄 Установить текст", callback_data="note_set_text")],
+            [InlineKeyboardButton("💾 Сохранить", callback_data="note_save")],
+            [InlineKeyboardButton("❌ Отмена", callback_data="note_cancel")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        text = "📝 Создание новой заметки:\n\n"
+        text += "Фото: 0/5\n"
+        text += "Заголовок: не установлен\n"
+        text += "Текст: не установлен\n\n"
+        text += "Выберите действие:"
+
+        await query.edit_message_text(text, reply_markup=reply_markup)
+
+    elif data == "note_add_photo":
+        state = await load_user_state(user_id)
+        if state is None:
+            await query.edit_message_text("❌ Ошибка: состояние не найдено.")
+            return
+
+        if len(state['photos']) >= 5:
+            await query.answer("❌ Максимум 5 фото!", show_alert=True)
+            return
+
+        await query.edit_message_text(
+            "📷 Отправьте фото (можно несколько, но не более 5 всего)"
+        )
+
+    elif data == "note_set_title":
+        state = await update_user_state(user_id, lambda draft: draft.update(waiting_for='title'))
+        if state is None:
+            await query.edit_message_text("❌ Ошибка: состояние не найдено.")
+            return
+        await query.edit_message_text("✏️ Отправьте заголовок заметки:")
+
+    elif data == "note_set_text":
+        state = await update_user_state(user_id, lambda draft: draft.update(waiting_for='text'))
+        if state is None:
+            await query.edit_message_text("❌ Ошибка: состояние не найдено.")
+            return
+        await query.edit_message_text("📄 Отправьте текст заметки:")
+
+    elif data == "note_save":
+        state = await load_user_state(user_id)
+        if state is None:
+            await query.edit_message_text("❌ Ошибка: состояние не найдено.")
+            return
+
+        if not state.get('title'):
+            await query.answer("❌ Установите заголовок!", show_alert=True)
+            return
+
+        # Сохраняем заметку в БД
+        note_id = await run_blocking(save_note_from_state, user_id, state)
+
+        # Удаляем состояние
+        await drop_user_state(user_id)
+
+        # Отправляем QR-код
+        qr_data = f"qrapp:note:{note_id}"
+        qr_image = await run_blocking(generate_qr_code, qr_data)
+
+        await query.edit_message_text("✅ Заметка сохранена!")
+        await query.message.reply_photo(
+            photo=qr_image,
+            caption=f"📱 QR-код заметки: {state['title']}"
+        )
+
+    elif data == "note_cancel":
+        state = await load_user_state(user_id)
+        await drop_user_state(user_id)
+        if state is not None:
+            await run_blocking(remove_uploads, state.get('photos', []))
+        await query.edit_message_text("❌ Создание заметки отменено.")
+
+    elif data.startswith("note_view_"):
+        note_id = data.replace("note_view_", "")
+        note = await run_blocking(get_note_payload, note_id)
+
+        if not note or note['user_id'] != user_id:
+            await query.edit_message_text("❌ Заметка не найдена.")
+            return
+
+        await send_note_message(update, note, edit_message_id=query.message.message_id)
+
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик обычных сообщений"""
+    user_id = update.effective_user.id
+    if not is_authorized(user_id):
+        return
+
+    # Проверяем, есть ли активное состояние создания заметки
+    state = await load_user_state(user_id)
+    if state is not None:
+
+        if update.message.photo:
+            # Сохраняем фото
+            if len(state['photos']) >= 5:
+                await update.message.reply_text("❌ Максимум 5 фото!")
+                return
+
+            photo = update.message.photo[-1]  # Берем самое большое фото
+            file = await context.bot.get_file(photo.file_id)
+
+            # Генерируем безопасное имя файла (всегда .jpg)
+            file_key = new_upload_key()
+
+            try:
+                # Скачиваем в память, на диск попадает только результат
+                data = bytes(await file.download_as_bytearray())
+
+                # Сжимаем изображение
+                if not await run_blocking(compress_image, io.BytesIO(data), file_key):
+                    # Если сжатие не удалось, сохраняем оригинал
+                    await run_blocking(save_upload, file_key, data, 'original')
+                state = await update_user_state(user_id, lambda draft: _add_draft_photo(draft, file_key))
+            except BaseException:
+                # Сохранение черновика прервано - файл никому не нужен
+                remove_uploads([file_key])
+                raise
+
+            if state is None or file_key not in state['photos']:
+                # Пока фото загружалось, черновик сохранили или отменили,
+                # либо другие фото успели занять все 5 мест
+                await run_blocking(remove_uploads, [file_key])
+                await update.message.reply_text("❌ Максимум 5 фото!" if state else
+                                                "❌ Ошибка: состояние не найдено.")
+                return
+            count = len(state['photos'])
+            await update.message.reply_text(f"✅ Фото добавлено ({count}/5)")
+            return
+
+        elif update.message.text:
+            text = update.message.text
+            field = None
+
+            def apply_text(draft: dict):
+                nonlocal field
+                field = _draft_text_field(draft)
+                draft[field] = text
+                draft['waiting_for'] = None
+
+            if await update_user_state(user_id, apply_text) is None:
+                await update.message.reply_text("❌ Ошибка: состояние не найдено.")
+            elif field == 'title':
+                await update.message.reply_text(f"✅ Заголовок установлен: {text}")
+            else:
+                await update.message.reply_text("✅ Текст установлен")
+            return
+
+    # Если не в режиме создания заметки, просто отвечаем
+    await update.message.reply_text(
+        "👋 Используйте команды:\n"
+        "/start - приветствие\n"
+        "/qr <текст> - создать QR-код\n"
+        "/note - управление заметками\n"
+        "/view <id> - просмотр заметки"
+    )
@@ -0,0 +1,298 @@
+"""Команды flask: импорт и экспорт заметок, webhook, обслуживание хранилища"""
+import contextlib
+import json
+import mimetypes
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+import click
+from flask import Blueprint, current_app
+
+import build_assets
+
+from . import config, ensure_initialized, startup, upload_gc
+from .background import deliver_channel_posts, get_bot, run_telegram_coroutine, send_to_channel_bulk_sync
+from .drafts import purge_expired_user_states
+from .extensions import channel_lease, storage
+from .housekeeping import find_referenced_uploads, migrate_pending_uploads, migrate_uploads
+from .models import rebuild_photo_index
+from .notes import bulk_insert_notes, generate_qr_codes, iter_export_ndjson, iter_export_zip, parse_import_rows
+from .storage import LocalStorage
+
+# Команды регистрируются на верхнем уровне: flask import-notes, а не flask cli import-notes
+bp = Blueprint('cli', __name__, cli_group=None)
+
+
+@bp.cli.command('import-notes')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Формат файла (по умолчанию по расширению)')
+@click.option('--batch-size', default=config.BULK_BATCH_SIZE, show_default=True,
+              help='Количество заметок в одной транзакции')
+@click.option('--qr-dir', type=click.Path(file_okay=False), default=None,
+              help='Каталог для PNG с QR-кодами созданных заметок')
+@click.option('--workers', default=config.QR_WORKERS, show_default=True,
+              help='Число процессов для генерации QR-кодов')
+@click.option('--no-channel', is_flag=True, help='Не отправлять заметки в канал')
+def import_notes_command(path, fmt, batch_size, qr_dir, workers, no_channel):
+    """Массовый импорт заметок из CSV или JSONL файла"""
+    ensure_initialized(current_app)
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    started = time.perf_counter()
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        created, errors = bulk_insert_notes(parse_import_rows(f, fmt), config.ALLOWED_USER_ID, batch_size)
+    elapsed = time.perf_counter() - started
+
+    for error in errors:
+        click.echo(f"Строка {error['row']}: {error['error']}", err=True)
+    rate = len(created) / elapsed if elapsed else 0
+    click.echo(f"Создано заметок: {len(created)} за {elapsed:.2f} с ({rate:.0f}/с)")
+
+    if qr_dir and created:
+        Path(qr_dir).mkdir(parents=True, exist_ok=True)
+        pngs = generate_qr_codes([f"qrapp:note:{note['id']}" for note in created], workers)
+        for note, png in zip(created, pngs):
+            (Path(qr_dir) / f"{note['id']}.png").write_bytes(png)
+        click.echo(f"QR-коды сохранены в {qr_dir}")
+
+    if not no_channel and created:
+        send_to_channel_bulk_sync([note['text'] or note['title'] for note in created])
+        if channel_lease.try_acquire():
+            # Сервер не запущен - отправляем сами до выхода из процесса
+            while run_telegram_coroutine(deliver_channel_posts()).result():
+                pass
+        else:
+            click.echo("Сообщения в канал отправит запущенный сервер")
+
+
+def _last_exported_id(path: str) -> Optional[str]:
+    """id последней полностью записанной заметки в NDJSON-файле.
+
+    Недописанный хвост файла (обрыв посреди строки) обрезается.
+    """
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = b''
+        while size > 0:
+            step = min(64 * 1024, size)
+            size -= step
+            f.seek(size)
+            block = f.read(step) + block
+            lines = block.split(b'\n')
+            # Последний элемент - хвост после последнего перевода строки
+            if len(lines) > 2 or (len(lines) == 2 and size == 0):
+                f.truncate(size + len(block) - len(lines[-1]))
+                return json.loads(lines[-2])['id']
+        f.truncate(0)
+    return None
+
+
+@bp.cli.command('set-webhook')
+@click.argument('url')
+@click.option('--drop-pending', is_flag=True, help='Сбросить накопленные обновления')
+def set_webhook_command(url, drop_pending):
+    """Регистрация webhook в Telegram с секретом WEBHOOK_SECRET
+
+    URL - полный адрес маршрута, например https://example.com/webhook
+    """
+    if not config.WEBHOOK_SECRET:
+        raise click.UsageError('WEBHOOK_SECRET не задан')
+    run_telegram_coroutine(get_bot().set_webhook(
+        url=url,
+        secret_token=config.WEBHOOK_SECRET,
+        max_connections=config.WEBHOOK_MAX_CONCURRENT,
+        allowed_updates=['message', 'callback_query'],
+        drop_pending_updates=drop_pending
+    )).result()
+    click.echo(f"Webhook установлен: {url}")
+
+
+@bp.cli.command('purge-user-states')
+def purge_user_states_command():
+    """Удаление просроченных черновиков бота и их фото"""
+    ensure_initialized(current_app)
+    click.echo(f"Удалено черновиков: {purge_expired_user_states()}")
+
+
+@bp.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Только отчет, без удаления')
+@click.option('--delete', 'hard_delete', is_flag=True, help='Удалять сразу, минуя карантин')
+@click.option('--batch-size', default=config.UPLOAD_GC_BATCH, show_default=True,
+              help='Количество файлов, проверяемых за один запрос к БД')
+@click.option('--min-age', default=config.UPLOAD_GC_MIN_AGE, show_default=True,
+              help='Не трогать файлы моложе стольких секунд')
+@click.option('--reindex', is_flag=True, help='Перестроить индекс фото заметок перед проходом')
+@click.option('--verbose', '-v', is_flag=True, help='Вывести список файлов-сирот')
+def gc_uploads_command(dry_run, hard_delete, batch_size, min_age, reindex, verbose):
+    """Полный проход сборщика мусора по каталогу загрузок"""
+    ensure_initialized(current_app)
+    if reindex:
+        click.echo(f"Проиндексировано фото: {rebuild_photo_index()}")
+    report = upload_gc.run(storage, find_referenced_uploads, batch_size, min_age,
+                           dry_run=dry_run, quarantine=not hard_delete)
+    if verbose or dry_run:
+        for orphan in report['orphans']:
+            click.echo(f"{orphan['key']}\t{orphan['size']}")
+    action = 'найдено' if dry_run else ('удалено' if hard_delete else 'перемещено в карантин')
+    click.echo(f"Проверено файлов: {report['scanned']}, сирот {action}: "
+               f"{len(report['orphans'])} ({report['bytes'] / 1024 / 1024:.1f} МБ)")
+    if not dry_run and not hard_delete:
+        removed = upload_gc.purge_quarantine(storage, config.UPLOAD_GC_QUARANTINE_TTL)
+        click.echo(f"Удалено из карантина: {removed}")
+
+
+@bp.cli.command('migrate-uploads')
+@click.option('--after', default='', help='Продолжить после заметки с этим id')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Количество заметок в одной транзакции')
+def migrate_uploads_command(after, batch_size):
+    """Перенос фото в раскладку uploads/ab/cd/<имя> и запись относительных ключей
+
+    Повторный запуск безопасен: уже перенесенные заметки пропускаются.
+    """
+    ensure_initialized(current_app)
+    if not isinstance(storage, LocalStorage):
+        raise click.UsageError('Миграция выполняется для локального хранилища, '
+                               'затем файлы переносятся командой copy-uploads')
+    total = 0
+    for cursor, count in migrate_uploads(after, batch_size):
+        total += count
+        click.echo(f"Обработано заметок: {total} (курсор {cursor})")
+    click.echo(f"Обновлено черновиков и сообщений в очереди: {migrate_pending_uploads()}")
+
+
+@bp.cli.command('copy-uploads')
+@click.option('--after', default=None, help='Продолжить после файла с этим ключом')
+@click.option('--batch-size', default=500, show_default=True)
+def copy_uploads_command(after, batch_size):
+    """Копирование фото из локального UPLOAD_FOLDER в настроенное хранилище
+
+    Нужно один раз при переходе на STORAGE_BACKEND=s3; уже существующие
+    объекты пропускаются, поэтому команду можно перезапускать.
+    """
+    ensure_initialized(current_app)
+    if isinstance(storage, LocalStorage):
+        raise click.UsageError('Хранилище локальное, копировать некуда')
+    source = LocalStorage(current_app.config['UPLOAD_FOLDER'])
+    copied = 0
+    while True:
+        objects = source.list(after, batch_size)
+        if not objects:
+            break
+        for obj in objects:
+            if not storage.exists(obj.key):
+                with source.open(obj.key) as f:
+                    storage.save(obj.key, f.read(), mimetypes.guess_type(obj.key)[0] or 'image/jpeg')
+                copied += 1
+        after = objects[-1].key
+        click.echo(f"Скопировано: {copied} (курсор {after})")
+
+
+@bp.cli.command('check-storage')
+def check_storage_command():
+    """Проверка настроенного хранилища фото: запись, чтение, ссылка, список, перенос, удаление
+
+    Работает с временными ключами в служебном каталоге .storage-check/ и
+    удаляет их за собой. Для S3 подписанная ссылка проверяется запросом.
+    """
+    import uuid
+
+    import requests
+
+    data = f'check {uuid.uuid4()}'.encode('utf-8')
+    key = f'.storage-check/{uuid.uuid4()}.txt'
+    moved_key = f'.storage-check/moved/{os.path.basename(key)}'
+
+    def step(name, check):
+        try:
+            ok = check()
+        except Exception as e:
+            ok, name = False, f'{name}: {e}'
+        click.echo(f"{'OK  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            raise click.ClickException('Хранилище не прошло проверку')
+
+    def read(k):
+        with storage.open(k) as f:
+            return f.read()
+
+    def check_url():
+        url = storage.url(key)
+        if url is None:
+            return True  # файл отдает само приложение
+        return requests.get(url, timeout=10).content == data
+
+    click.echo(f'Хранилище: {type(storage).__name__}')
+    try:
+        step('save', lambda: storage.save(key, data, 'text/plain') is None)
+        step('exists', lambda: storage.exists(key))
+        step('open', lambda: read(key) == data)
+        step('url', check_url)
+        step('list', lambda: key in [obj.key for obj in storage.list(None, 100, prefix='.storage-check/')])
+        step('move', lambda: storage.move(key, moved_key) is None and not storage.exists(key)
+             and read(moved_key) == data)
+        step('delete', lambda: storage.delete(moved_key) is None and not storage.exists(moved_key))
+    finally:
+        # Уборка не должна заслонять ошибку проверки (например, нет бакета)
+        for k in (key, moved_key):
+            with contextlib.suppress(Exception):
+                storage.delete(k)
+        check_dir = storage.local_path('.storage-check')
+        if check_dir:
+            shutil.rmtree(check_dir, ignore_errors=True)
+
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Сборка минифицированной и предсжатой статики в static/dist"""
+    for source_name, built_name in build_assets.build().items():
+        click.echo(f'{source_name} -> dist/{built_name}')
+
+
+@bp.cli.command('startup-report')
+@click.option('--budget-ms', default=config.IMPORT_TIME_BUDGET_MS, show_default=True,
+              help='Допустимое время импорта app (0 - без проверки)')
+@click.option('--top', default=15, show_default=True, help='Сколько самых дорогих пакетов показать')
+def startup_report_command(budget_ms, top):
+    """Время импорта приложения в чистом процессе и этапы инициализации
+
+    С --budget-ms завершается с ошибкой, если импорт дольше бюджета
+    (для проверки в CI).
+    """
+    profile = startup.import_profile('app', top)
+    click.echo(f"Импорт app: {profile['total_ms']:.0f} мс")
+    for name, own in profile['packages']:
+        click.echo(f"  {own:8.1f} мс  {name}")
+    ensure_initialized(current_app)
+    click.echo(startup.timer.summary())
+    if budget_ms and profile['total_ms'] > budget_ms:
+        raise click.ClickException(f"Импорт дольше бюджета: {profile['total_ms']:.0f} > {budget_ms:g} мс")
+
+
+@bp.cli.command('export-notes')
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'zip']), default='ndjson',
+              show_default=True)
+@click.option('--after', default=None, help='Продолжить экспорт после заметки с этим id')
+@click.option('--resume', is_flag=True,
+              help='Дописать существующий NDJSON-файл, продолжив с последней заметки')
+def export_notes_command(path, fmt, after, resume):
+    """Потоковый экспорт заметок в NDJSON или ZIP"""
+    ensure_initialized(current_app)
+    mode = 'wb'
+    if resume:
+        if fmt != 'ndjson':
+            raise click.UsageError('--resume поддерживается только для ndjson')
+        if os.path.exists(path):
+            after = _last_exported_id(path)
+            mode = 'ab'
+
+    chunks = iter_export_ndjson(after) if fmt == 'ndjson' else iter_export_zip(after)
+    with open(path, mode) as f:
+        for chunk in chunks:
+            f.write(chunk)
+    click.echo(f"Экспорт сохранен в {path}")
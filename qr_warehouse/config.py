@@ -0,0 +1,148 @@
+"""Настройки приложения из переменных окружения (и файла .env)"""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+INSTANCE_DIR = BASE_DIR / 'instance'
+STATIC_DIR = BASE_DIR / 'static'
+TEMPLATES_DIR = BASE_DIR / 'templates'
+
+UPLOAD_FOLDER = str(Path(os.environ.get('UPLOAD_FOLDER', BASE_DIR / "uploads")))
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///qr_warehouse.db')
+SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+CORS_ORIGINS = ["https://mikawo846.github.io"]
+
+BOT_TOKEN = os.environ.get('TOKEN')
+if not BOT_TOKEN:
+    raise ValueError("TOKEN environment variable is not set")
+
+ALLOWED_USER_ID = os.environ.get('USER_ID')
+if not ALLOWED_USER_ID:
+    raise ValueError("USER_ID environment variable is not set")
+
+ALLOWED_USER_ID = int(ALLOWED_USER_ID)
+
+CHANNEL_ID = os.environ.get('CHANNEL_ID')
+if not CHANNEL_ID:
+    raise ValueError("CHANNEL_ID environment variable is not set")
+
+CHANNEL_ID = int(CHANNEL_ID)
+
+# Адрес Bot API (для нагрузочных тестов - локальная заглушка, см. loadtest/)
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+TELEGRAM_FILE_BASE_URL = os.environ.get(
+    'TELEGRAM_FILE_BASE_URL', TELEGRAM_API_BASE_URL.rstrip('/').rsplit('/', 1)[0] + '/file/bot')
+
+# Параметры массового импорта заметок
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+BULK_MAX_NOTES = int(os.environ.get('BULK_MAX_NOTES', 50000))
+QR_WORKERS = int(os.environ.get('QR_WORKERS', os.cpu_count() or 1))
+
+# Webhook Telegram: секрет из заголовка X-Telegram-Bot-Api-Secret-Token,
+# число одновременно обрабатываемых обновлений и размер очереди
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+WEBHOOK_MAX_CONCURRENT = int(os.environ.get('WEBHOOK_MAX_CONCURRENT', 16))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 256))
+
+# ASGI-режим (asgi.py): сколько синхронных Flask-запросов выполняется одновременно.
+# Не больше пула соединений SQLAlchemy (5 + 10 сверх), иначе потоки ждут соединения
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.environ.get('WEBHOOK_ENQUEUE_TIMEOUT', 2))
+
+# Доставка в канал: outbox в БД, отправляет только процесс-лидер
+CHANNEL_OUTBOX_BATCH = int(os.environ.get('CHANNEL_OUTBOX_BATCH', 20))
+CHANNEL_OUTBOX_POLL = float(os.environ.get('CHANNEL_OUTBOX_POLL', 5))
+CHANNEL_MAX_ATTEMPTS = int(os.environ.get('CHANNEL_MAX_ATTEMPTS', 5))
+LEADER_LOCK_FILE = os.environ.get('LEADER_LOCK_FILE', str(INSTANCE_DIR / 'telegram-worker.lock'))
+
+# Черновики заметок в боте: хранилище ('sql' или 'memory'), время жизни
+# и кэш в памяти процесса. Кэш по умолчанию выключен: обновления одного
+# пользователя попадают в разные воркеры, и устаревший черновик из кэша
+# затер бы сохраненный другим воркером; включать только с одним процессом
+USER_STATE_BACKEND = os.environ.get('USER_STATE_BACKEND', 'sql')
+USER_STATE_TTL = float(os.environ.get('USER_STATE_TTL', 24 * 3600))
+USER_STATE_CACHE_TTL = float(os.environ.get('USER_STATE_CACHE_TTL', 0))
+USER_STATE_PURGE_INTERVAL = float(os.environ.get('USER_STATE_PURGE_INTERVAL', 600))
+
+# Токен для служебных эндпоинтов (экспорт и т.п.); без него они отключены
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+OPEN_QR_BATCH_MAX = int(os.environ.get('OPEN_QR_BATCH_MAX', 500))
+
+# Профилирование: доля случайно выбранных запросов и обновлений бота,
+# порог сохранения профиля и интервал снятия стеков. Администратор может
+# запросить профиль заголовком X-Profile: 1 (вместе с Authorization).
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(INSTANCE_DIR / 'profiles'))
+
+# Бюджет времени импорта app в мс (flask startup-report, бенчмарк запуска)
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 1000))
+
+# Журнал медленных SQL-операторов (с планом выполнения) и порог N+1 -
+# число выполнений одного оператора за HTTP-запрос или обновление бота
+SQL_SLOW_MS = float(os.environ.get('SQL_SLOW_MS', 100))
+SQL_EXPLAIN = os.environ.get('SQL_EXPLAIN', '1') == '1'
+SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', 10))
+
+# Кэш сериализованных заметок (TTL в секундах, 0 отключает)
+NOTE_CACHE_SIZE = int(os.environ.get('NOTE_CACHE_SIZE', 1024))
+NOTE_CACHE_TTL = float(os.environ.get('NOTE_CACHE_TTL', 300))
+NOTE_CACHE_NEGATIVE_TTL = float(os.environ.get('NOTE_CACHE_NEGATIVE_TTL', 30))
+
+# Отдача загруженных файлов: '' - сам Flask, 'x-accel' - nginx (X-Accel-Redirect),
+# 'x-sendfile' - Apache/lighttpd (X-Sendfile)
+UPLOAD_OFFLOAD = os.environ.get('UPLOAD_OFFLOAD', '').lower()
+UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+# Имена файлов уникальны и содержимое не меняется, поэтому кэшируем на год
+UPLOAD_MAX_AGE = 365 * 24 * 3600
+
+# Хранилище фото: 'local' (UPLOAD_FOLDER) или 's3' (S3-совместимое, для MinIO
+# задается S3_ENDPOINT_URL); чтение из S3 - редиректом на подписанную ссылку
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local').lower()
+S3_BUCKET = os.environ.get('S3_BUCKET')
+S3_PREFIX = os.environ.get('S3_PREFIX', '')
+S3_REGION = os.environ.get('S3_REGION')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+S3_PUBLIC_ENDPOINT_URL = os.environ.get('S3_PUBLIC_ENDPOINT_URL')
+S3_PRESIGN_TTL = int(os.environ.get('S3_PRESIGN_TTL', 3600))
+
+if STORAGE_BACKEND == 's3' and not S3_BUCKET:
+    raise ValueError("S3_BUCKET environment variable is not set")
+
+# Сборка мусора в хранилище фото: интервал между пачками (0 отключает), размер пачки,
+# минимальный возраст файла, режим ('quarantine' или 'delete') и срок карантина
+UPLOAD_GC_INTERVAL = float(os.environ.get('UPLOAD_GC_INTERVAL', 300))
+UPLOAD_GC_BATCH = int(os.environ.get('UPLOAD_GC_BATCH', 500))
+UPLOAD_GC_MIN_AGE = float(os.environ.get('UPLOAD_GC_MIN_AGE', 3600))
+UPLOAD_GC_MODE = os.environ.get('UPLOAD_GC_MODE', 'quarantine').lower()
+UPLOAD_GC_QUARANTINE_TTL = float(os.environ.get('UPLOAD_GC_QUARANTINE_TTL', 7 * 24 * 3600))
+
+# Журнал сканирований QR: события копятся в буфере процесса (не больше
+# SCAN_BUFFER_SIZE) и записываются пачками по SCAN_FLUSH_BATCH раз в
+# SCAN_FLUSH_INTERVAL секунд; события старше SCAN_RETENTION_DAYS удаляются
+# (0 - хранить всегда) пачками раз в SCAN_PURGE_INTERVAL секунд
+SCAN_BUFFER_SIZE = int(os.environ.get('SCAN_BUFFER_SIZE', 100000))
+SCAN_FLUSH_BATCH = int(os.environ.get('SCAN_FLUSH_BATCH', 5000))
+SCAN_FLUSH_INTERVAL = float(os.environ.get('SCAN_FLUSH_INTERVAL', 1))
+SCAN_RETENTION_DAYS = float(os.environ.get('SCAN_RETENTION_DAYS', 90))
+SCAN_PURGE_INTERVAL = float(os.environ.get('SCAN_PURGE_INTERVAL', 600))
+SCAN_STATS_MAX_HOURS = int(os.environ.get('SCAN_STATS_MAX_HOURS', 24 * 31))
+
+# Максимум строк в ответе «что лежит в ячейке» (/bin, GET /bin/<адрес>)
+BIN_CONTENTS_LIMIT = int(os.environ.get('BIN_CONTENTS_LIMIT', 500))
+
+# Синхронизация офлайн-клиентов: максимум элементов в пачке POST /sync; размер
+# страницы изменений GET /sync (по умолчанию и максимальный) и задержка в секундах,
+# после которой изменение попадает в выгрузку
+SYNC_BATCH_MAX = int(os.environ.get('SYNC_BATCH_MAX', 500))
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 1000))
+SYNC_PAGE_MAX = int(os.environ.get('SYNC_PAGE_MAX', 5000))
+SYNC_CURSOR_LAG = float(os.environ.get('SYNC_CURSOR_LAG', 5))
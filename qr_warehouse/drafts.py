@@ -0,0 +1,21 @@
+"""Черновики заметок, создаваемых через бота"""
+from . import config, metrics
+from .extensions import db
+from .models import UserState
+from .state_store import MemoryStateBackend, SQLStateBackend, UserStateStore
+from .uploads import remove_uploads
+
+user_states = UserStateStore(
+    SQLStateBackend(db, UserState) if config.USER_STATE_BACKEND == 'sql' else MemoryStateBackend(),
+    ttl=config.USER_STATE_TTL,
+    cache_ttl=config.USER_STATE_CACHE_TTL,
+    on_lookup=metrics.cache_recorder('user_state')
+)
+
+
+def purge_expired_user_states() -> int:
+    """Удаление просроченных черновиков вместе с их фото"""
+    expired = user_states.pop_expired()
+    for _, state in expired:
+        remove_uploads(state.get('photos', []))
+    return len(expired)
@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+from typing import Any, Callable, List, Optional
+
+
+class EventBuffer:
+    """Ограниченный буфер событий процесса для пакетной записи в БД.
+
+    append() не берет блокировок (deque.append атомарен) и не обращается к
+    БД, поэтому его можно вызывать прямо из обработчика запроса. Запись
+    выполняет фоновый поток через drain(), забирая события пачками. При
+    переполнении новые события отбрасываются и учитываются в dropped:
+    потеря части событий лучше, чем рост памяти, если БД недоступна.
+    on_full() вызывается, когда в буфере набирается flush_size событий
+    (чтобы разбудить запись, не дожидаясь интервала).
+    """
+
+    def __init__(self, maxsize: int = 100000, flush_size: int = 1000,
+                 on_full: Optional[Callable[[], None]] = None):
+        self.maxsize = maxsize
+        self.flush_size = flush_size
+        self.on_full = on_full
+        self.dropped = 0
+        self._events = deque()
+        self._drain_lock = threading.Lock()
+
+    def append(self, event: Any) -> bool:
+        """Добавление события; False если буфер переполнен и событие отброшено"""
+        if len(self._events) >= self.maxsize:
+            self.dropped += 1
+            return False
+        self._events.append(event)
+        if len(self._events) == self.flush_size and self.on_full is not None:
+            self.on_full()
+        return True
+
+    def drain(self, limit: int) -> List[Any]:
+        """Извлечение до limit самых старых событий"""
+        with self._drain_lock:
+            events = []
+            popleft = self._events.popleft
+            try:
+                for _ in range(min(limit, len(self._events))):
+                    events.append(popleft())
+            except IndexError:
+                pass
+            return events
+
+    def requeue(self, events: List[Any]) -> int:
+        """Возврат событий в начало буфера после неудачной записи
+
+        Возвращает число отброшенных событий, которые уже не поместились.
+        """
+        with self._drain_lock:
+            room = max(self.maxsize - len(self._events), 0)
+            dropped = max(len(events) - room, 0)
+            self.dropped += dropped
+            self._events.extendleft(reversed(events[:room]))
+            return dropped
+
+    def __len__(self):
+        return len(self._events)
@@ -0,0 +1,44 @@
+"""Общие объекты процесса: БД, хранилище фото, кэши, профилировщик
+
+Здесь они только создаются: к приложению БД привязывает create_app()
+(db.init_app), а потоки и соединения появляются при первом использовании
+или в init_worker() после fork, поэтому модуль безопасно импортировать в
+мастере gunicorn.
+"""
+import logging
+
+from flask_sqlalchemy import SQLAlchemy
+
+from . import config, metrics, profiling, sql_monitor
+from .event_buffer import EventBuffer
+from .leader import FileLease
+from .note_cache import TTLCache
+from .storage import LocalStorage, S3Storage
+
+db = SQLAlchemy()
+
+if config.STORAGE_BACKEND == 's3':
+    storage = S3Storage(config.S3_BUCKET, config.S3_PREFIX, endpoint_url=config.S3_ENDPOINT_URL,
+                        region=config.S3_REGION, presign_ttl=config.S3_PRESIGN_TTL,
+                        public_endpoint_url=config.S3_PUBLIC_ENDPOINT_URL)
+else:
+    storage = LocalStorage(config.UPLOAD_FOLDER)
+
+sql_stats = sql_monitor.SQLMonitor(logging.getLogger('qr_warehouse.sql'), config.SQL_SLOW_MS,
+                                   config.SQL_EXPLAIN, config.SQL_REPEAT_THRESHOLD)
+
+profiler = profiling.Profiler(config.PROFILE_DIR, config.PROFILE_INTERVAL, config.PROFILE_SLOW_MS,
+                              config.PROFILE_SAMPLE_RATE, config.PROFILE_KEEP)
+
+note_cache = TTLCache(config.NOTE_CACHE_SIZE, config.NOTE_CACHE_TTL, config.NOTE_CACHE_NEGATIVE_TTL,
+                      on_lookup=metrics.cache_recorder('note'))
+# Отрендеренные фрагменты страницы заметки, ключ - (id, версия)
+note_html_cache = TTLCache(config.NOTE_CACHE_SIZE, config.NOTE_CACHE_TTL,
+                           on_lookup=metrics.cache_recorder('note_html'))
+
+# Доставку в канал ведет ровно один процесс - тот, кто держит блокировку
+channel_lease = FileLease(config.LEADER_LOCK_FILE)
+
+# Журнал сканирований: события копятся здесь и записываются фоновой задачей
+# процесса (background._scan_flush_worker)
+scan_buffer = EventBuffer(config.SCAN_BUFFER_SIZE, config.SCAN_FLUSH_BATCH)
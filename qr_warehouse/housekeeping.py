@@ -0,0 +1,127 @@
+"""Обслуживание хранилища фото: сборка мусора и переход на шардированную раскладку"""
+import json
+import logging
+import os
+import shutil
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from . import config, upload_gc
+from .drafts import user_states
+from .extensions import db, storage
+from .models import ChannelPost, Note, NotePhoto
+from .uploads import remove_files, shard_key, upload_key, upload_path
+
+logger = logging.getLogger(__name__)
+
+
+def find_referenced_uploads(keys: list) -> set:
+    """Ключи из keys, на которые ссылаются черновики или заметки"""
+    # Черновики читаем до индекса: сохранение заметки коммитится раньше
+    # удаления черновика, поэтому фото не проскочит между двумя запросами
+    referenced = {upload_key(ref)
+                  for _, state in user_states.iter_states() for ref in state.get('photos', [])}
+    referenced.update(db.session.execute(
+        select(NotePhoto.filename).where(NotePhoto.filename.in_(keys))
+    ).scalars())
+    return referenced
+
+
+_upload_gc_cursor: Optional[str] = None
+
+
+def collect_upload_garbage() -> dict:
+    """Одна пачка инкрементальной сборки мусора в хранилище фото
+
+    Курсор хранится между вызовами; после полного прохода хранилища
+    очищается просроченный карантин и обход начинается заново.
+    """
+    global _upload_gc_cursor
+    report = upload_gc.run(storage, find_referenced_uploads, config.UPLOAD_GC_BATCH, config.UPLOAD_GC_MIN_AGE,
+                           dry_run=False, quarantine=config.UPLOAD_GC_MODE != 'delete',
+                           after=_upload_gc_cursor, max_batches=1)
+    _upload_gc_cursor = report['cursor']
+    if report['orphans']:
+        logger.info(f"Upload GC: {len(report['orphans'])} orphaned files, {report['bytes']} bytes")
+    if _upload_gc_cursor is None:
+        upload_gc.purge_quarantine(storage, config.UPLOAD_GC_QUARANTINE_TTL)
+    return report
+
+
+def _shard_refs(refs: list, stale: list) -> list:
+    """Перенос файлов в шардированную раскладку, возвращает новые ключи
+
+    Файл сначала появляется по новому ключу (жесткая ссылка или копия), а
+    старые пути складываются в stale и удаляются только после коммита, так
+    что прерванная миграция не теряет фото.
+    """
+    keys = []
+    for ref in refs:
+        key = upload_key(ref)
+        if '/' in key:
+            keys.append(key)
+            continue
+        new_key = shard_key(key)
+        source, target = upload_path(key), upload_path(new_key)
+        if os.path.exists(source):
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copy2(source, target)
+                # Свежий mtime не даст сборщику мусора забрать файл до коммита
+                os.utime(target)
+            stale.append(source)
+        keys.append(new_key)
+    return keys
+
+
+def migrate_uploads(after: str = '', batch_size: int = 500) -> Iterator[tuple]:
+    """Перевод фото заметок в шардированную раскладку с относительными ключами
+
+    Заметки обходятся по курсору, одна транзакция на пачку; выдает
+    (курсор, число заметок в пачке). Уже перенесенные записи не меняются,
+    поэтому прерванную миграцию можно просто запустить снова.
+    """
+    while True:
+        notes = (Note.query
+                 .filter(Note.id > after, Note.photos_json.isnot(None))
+                 .order_by(Note.id)
+                 .limit(batch_size)
+                 .all())
+        if not notes:
+            return
+        stale = []
+        for note in notes:
+            refs = json.loads(note.photos_json)
+            keys = _shard_refs(refs, stale)
+            if keys != refs:
+                note.photos_json = json.dumps(keys)
+        db.session.commit()
+        remove_files(stale)
+        after = notes[-1].id
+        db.session.expunge_all()
+        yield after, len(notes)
+
+
+def migrate_pending_uploads() -> int:
+    """Перевод путей к фото в черновиках бота и недоставленных сообщениях канала"""
+    stale, updated = [], 0
+    for user_id, state in list(user_states.iter_states()):
+        keys = _shard_refs(state.get('photos', []), stale)
+        if keys != state.get('photos', []):
+            state['photos'] = keys
+            user_states.set(user_id, state)
+            updated += 1
+    for post in ChannelPost.query.filter_by(kind='note').all():
+        payload = json.loads(post.payload_json)
+        keys = _shard_refs(payload['photos'], stale)
+        if keys != payload['photos']:
+            payload['photos'] = keys
+            post.payload_json = json.dumps(payload, ensure_ascii=False)
+            updated += 1
+    db.session.commit()
+    remove_files(stale)
+    return updated
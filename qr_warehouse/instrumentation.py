@@ -0,0 +1,65 @@
+"""Учет HTTP-запросов: латентность, SQL-операторы за запрос и выборочное профилирование"""
+import time
+
+from flask import Flask, g, request
+
+from . import metrics
+from .admin import is_admin_request
+from .extensions import profiler, sql_stats
+
+
+def _route() -> str:
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def _observe_request(response):
+    """Латентность и коды ответов по шаблону маршрута (а не по URL)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = _route()
+        metrics.HTTP_REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - started)
+        metrics.HTTP_REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+    return response
+
+
+def _start_sql_scope():
+    g.sql_scope = sql_stats.begin(f'{request.method} {_route()}')
+
+
+def _finish_sql_scope(exc):
+    """Число SQL-операторов за запрос и предупреждение о N+1"""
+    token = g.pop('sql_scope', None)
+    if token is not None:
+        sql_stats.end(token)
+
+
+def _start_profile():
+    forced = request.headers.get('X-Profile') == '1' and is_admin_request()
+    g.profile = profiler.start(f'{request.method} {_route()}', forced=forced)
+
+
+def _finish_profile(response):
+    """Сохраненный профиль указывается в заголовке X-Profile-Id"""
+    profile_id = profiler.stop(g.pop('profile', None))
+    if profile_id:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _discard_profile(exc):
+    # after_request не вызывается при необработанном исключении
+    profiler.stop(g.pop('profile', None))
+
+
+def init_app(app: Flask):
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
+    app.before_request(_start_sql_scope)
+    app.teardown_request(_finish_sql_scope)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_discard_profile)
@@ -0,0 +1,62 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировок между процессами нет, процесс всегда лидер
+    fcntl = None
+
+
+class FileLease:
+    """Лидерство процесса через эксклюзивную блокировку файла (flock).
+
+    Блокировку держит ровно один процесс на хосте; при его завершении ОС
+    снимает ее сама, и следующий try_acquire() в другом процессе успешен.
+    Для нескольких узлов файл должен лежать на общем диске с поддержкой flock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Неблокирующая попытка стать лидером; True если блокировка наша"""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            if fcntl is None:
+                self._fd = -1
+                return True
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            return True
+
+    def release(self):
+        """Снятие блокировки"""
+        with self._lock:
+            if self._fd is None:
+                return
+            if self._fd >= 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+            self._fd = None
+
+    def reset_after_fork(self):
+        """Сброс состояния в дочернем процессе: унаследованный дескриптор не наш"""
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+        self._lock = threading.Lock()
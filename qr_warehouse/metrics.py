@@ -0,0 +1,102 @@
+"""Метрики Prometheus: длительность этапов, HTTP-запросы, Telegram, кэши.
+
+Под gunicorn с несколькими воркерами каждый процесс пишет значения в файлы
+каталога PROMETHEUS_MULTIPROC_DIR (задается в gunicorn.conf.py до импорта
+приложения), а /metrics собирает их со всех процессов.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# Границы от миллисекунд (кэш, БД) до десятков секунд (Telegram с повторами)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    'qr_stage_duration_seconds', 'Длительность этапов обработки',
+    ['stage'], buckets=BUCKETS)
+QUEUE_WAIT_SECONDS = Histogram(
+    'qr_queue_wait_seconds', 'Время ожидания в очереди до начала обработки',
+    ['queue'], buckets=BUCKETS + (120, 300, 600))
+HTTP_REQUEST_SECONDS = Histogram(
+    'qr_http_request_duration_seconds', 'Длительность HTTP-запросов по маршрутам',
+    ['method', 'route'], buckets=BUCKETS)
+HTTP_REQUESTS = Counter(
+    'qr_http_requests_total', 'HTTP-запросы по маршрутам и кодам ответа',
+    ['method', 'route', 'status'])
+TELEGRAM_API_SECONDS = Histogram(
+    'qr_telegram_api_duration_seconds', 'Длительность запросов к Bot API',
+    ['method'], buckets=BUCKETS)
+TELEGRAM_API_ERRORS = Counter(
+    'qr_telegram_api_errors_total', 'Ошибки запросов к Bot API', ['method'])
+CACHE_LOOKUPS = Counter(
+    'qr_cache_lookups_total', 'Обращения к кэшам', ['cache', 'result'])
+UPLOAD_BYTES = Counter(
+    'qr_upload_bytes_total', 'Объем сохраненных фото', ['kind'])
+SQL_STATEMENT_SECONDS = Histogram(
+    'qr_sql_statement_duration_seconds', 'Длительность SQL-операторов', ['operation'], buckets=BUCKETS)
+SQL_SLOW_STATEMENTS = Counter(
+    'qr_sql_slow_statements_total', 'SQL-операторы дольше SQL_SLOW_MS', ['operation'])
+SQL_STATEMENTS_PER_SCOPE = Histogram(
+    'qr_sql_statements_per_request', 'Число SQL-операторов за HTTP-запрос или обновление бота',
+    ['scope'], buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250, 1000))
+SQL_REPEATED = Counter(
+    'qr_sql_repeated_statements_total', 'Запросы с многократным повтором одного оператора (N+1)',
+    ['scope'])
+SCAN_EVENTS = Counter(
+    'qr_scan_events_total', 'События журнала сканирований: recorded, written, dropped', ['result'])
+WEBHOOK_PENDING = Gauge(
+    'qr_webhook_pending_updates', 'Принятые, но не обработанные обновления Telegram',
+    multiprocess_mode='livesum')
+
+
+@contextmanager
+def observe(stage: str):
+    """Замер длительности этапа: with observe('compress_image'): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def cache_recorder(cache: str):
+    """Функция для TTLCache(on_lookup=...), считающая попадания и промахи"""
+    hit, miss = CACHE_LOOKUPS.labels(cache, 'hit'), CACHE_LOOKUPS.labels(cache, 'miss')
+    return lambda found: (hit if found else miss).inc()
+
+
+class SnapshotCollector:
+    """Значения, снимаемые в момент запроса /metrics, а не накапливаемые процессами
+
+    func() возвращает {имя метрики: (описание, значение)}.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def collect(self):
+        for name, (documentation, value) in self.func().items():
+            yield GaugeMetricFamily(name, documentation, value=value)
+
+
+def render(*collectors) -> tuple:
+    """(тело, Content-Type) ответа /metrics
+
+    collectors - дополнительные коллекторы, значения которых снимаются в
+    момент запроса (например, глубина outbox из БД).
+    """
+    extra = CollectorRegistry()
+    for collector in collectors:
+        extra.register(collector)
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(extra), CONTENT_TYPE_LATEST
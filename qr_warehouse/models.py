@@ -0,0 +1,219 @@
+"""Модели БД и события, которые поддерживают индекс фото и кэш заметок"""
+import json
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, update
+
+from . import metrics
+from .extensions import db, note_cache
+from .uploads import photo_keys
+
+
+class Note(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    title = db.Column(db.String(500), nullable=False)
+    text = db.Column(db.Text, nullable=True)
+    photos_json = db.Column(db.Text, nullable=True)  # JSON список путей к фото
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    # Время последнего изменения - курсор выгрузки изменений (GET /sync)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user_id = db.Column(db.Integer, nullable=False)
+
+    # Выгрузка изменений по порядку (updated_at, id)
+    __table_args__ = (db.Index('ix_note_updated_at', 'updated_at', 'id'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'text': self.text,
+            'photos': json.loads(self.photos_json) if self.photos_json else [],
+            'created': self.created.isoformat() if self.created else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class NoteTombstone(db.Model):
+    """Удаленная заметка: клиенты, синхронизирующие изменения, удаляют ее у себя"""
+    note_id = db.Column(db.String(36), primary_key=True)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_note_tombstone_deleted', 'deleted_at', 'note_id'),)
+
+
+class ChannelPost(db.Model):
+    """Исходящее сообщение в канал (outbox), доставляется процессом-лидером"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)  # 'note' или 'digest'
+    payload_json = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UserState(db.Model):
+    """Черновик заметки, создаваемой через бота"""
+    user_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    state_json = db.Column(db.Text, nullable=False)
+    updated = db.Column(db.DateTime, nullable=False, index=True)
+    # Увеличивается при каждой записи: изменение сохраняется, только если версия
+    # не изменилась с момента чтения (см. UserStateStore.update)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+
+class NotePhoto(db.Model):
+    """Индекс фото заметок (ключ файла в uploads/ -> заметка) для сборщика мусора"""
+    filename = db.Column(db.String(255), primary_key=True)
+    note_id = db.Column(db.String(36), nullable=False, index=True)
+
+
+class NoteLocation(db.Model):
+    """Место хранения товара заметки (зона-ряд-полка-ячейка) и количество в нем"""
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.String(36), db.ForeignKey('note.id', ondelete='CASCADE'), nullable=False)
+    zone = db.Column(db.String(16), nullable=False)
+    aisle = db.Column(db.String(16), nullable=False)
+    shelf = db.Column(db.String(16), nullable=False)
+    bin = db.Column(db.String(16), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # «Где лежит товар»: поиск по первому столбцу уникального индекса
+        db.UniqueConstraint('note_id', 'zone', 'aisle', 'shelf', 'bin', name='uq_note_location'),
+        # «Что лежит в ячейке» - и в любом префиксе адреса (зона, ряд, полка)
+        db.Index('ix_note_location_bin', 'zone', 'aisle', 'shelf', 'bin', 'note_id'),
+    )
+
+
+class ScanEvent(db.Model):
+    """Сканирование QR-кода заметки (журнал только на добавление, пишется пачками)"""
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    note_id = db.Column(db.String(36), nullable=False)
+    scanned_at = db.Column(db.DateTime, nullable=False, index=True)
+    device = db.Column(db.String(64), nullable=True)
+    location = db.Column(db.String(128), nullable=True)
+
+    # Последнее место заметки и сканирования заметки за период
+    __table_args__ = (db.Index('ix_scan_event_note_scanned', 'note_id', 'scanned_at'),)
+
+
+@event.listens_for(Note, 'after_insert')
+@event.listens_for(Note, 'after_update')
+def _index_note_photos(mapper, connection, note):
+    """Поддержка NotePhoto в той же транзакции, что и изменение заметки"""
+    if not inspect(note).attrs.photos_json.history.has_changes():
+        return
+    connection.execute(delete(NotePhoto).where(NotePhoto.note_id == note.id))
+    names = photo_keys(note.photos_json)
+    if names:
+        connection.execute(insert(NotePhoto), [{'filename': name, 'note_id': note.id} for name in names])
+
+
+@event.listens_for(Note, 'after_delete')
+def _unindex_note_photos(mapper, connection, note):
+    connection.execute(delete(NotePhoto).where(NotePhoto.note_id == note.id))
+
+
+@event.listens_for(Note, 'after_delete')
+def _record_note_tombstone(mapper, connection, note):
+    """Отметка об удалении в той же транзакции, что и удаление заметки"""
+    connection.execute(delete(NoteTombstone).where(NoteTombstone.note_id == note.id))
+    connection.execute(insert(NoteTombstone).values(note_id=note.id, deleted_at=datetime.utcnow()))
+
+
+def add_note_updated_at() -> bool:
+    """Добавление note.updated_at в БД, созданную до его появления
+
+    db.create_all() не меняет существующие таблицы, поэтому столбец
+    добавляется ALTER TABLE и заполняется временем создания заметки.
+    Возвращает True, если БД пришлось обновить.
+    """
+    columns = {column['name'] for column in inspect(db.engine).get_columns(Note.__tablename__)}
+    if 'updated_at' in columns:
+        return False
+    table = Note.__table__
+    with db.engine.begin() as connection:
+        column_type = table.c.updated_at.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN updated_at {column_type}')
+        # Время - параметром, а не now() БД: в SQLite значения сравниваются как строки,
+        # и формат должен совпадать с записанным SQLAlchemy
+        connection.execute(update(table).values(
+            updated_at=func.coalesce(table.c.created, bindparam('now', datetime.utcnow(), type_=db.DateTime))))
+        for index in table.indexes:
+            if 'updated_at' in index.columns:
+                index.create(connection)
+    return True
+
+
+def add_user_state_version() -> bool:
+    """Добавление user_state.version в БД, созданную до его появления
+
+    Возвращает True, если БД пришлось обновить.
+    """
+    columns = {column['name'] for column in inspect(db.engine).get_columns(UserState.__tablename__)}
+    if 'version' in columns:
+        return False
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(
+            f'ALTER TABLE {UserState.__tablename__} ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    return True
+
+
+def rebuild_photo_index(batch_size: int = 1000) -> int:
+    """Полная перестройка NotePhoto по photos_json всех заметок"""
+    db.session.execute(delete(NotePhoto))
+    indexed, after = 0, ''
+    while True:
+        rows = db.session.execute(
+            select(Note.id, Note.photos_json)
+            .where(Note.id > after, Note.photos_json.isnot(None))
+            .order_by(Note.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        refs = [{'filename': name, 'note_id': note_id}
+                for note_id, photos_json in rows for name in photo_keys(photos_json)]
+        if refs:
+            db.session.execute(insert(NotePhoto).prefix_with('OR IGNORE', dialect='sqlite'), refs)
+        indexed += len(refs)
+        after = rows[-1].id
+    db.session.commit()
+    return indexed
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_notes(session, flush_context):
+    """Запоминаем id измененных заметок до коммита"""
+    changed = session.info.setdefault('changed_note_ids', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Note):
+            changed.add(obj.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_notes(session):
+    """Сброс кэша заметок после успешного коммита"""
+    note_cache.invalidate_many(session.info.pop('changed_note_ids', ()))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_notes(session):
+    session.info.pop('changed_note_ids', None)
+    session.info.pop('commit_started', None)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _start_commit_timer(session):
+    session.info['commit_started'] = time.perf_counter()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _observe_commit(session):
+    """Длительность коммита вместе с flush"""
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        metrics.STAGE_SECONDS.labels('db_commit').observe(time.perf_counter() - started)
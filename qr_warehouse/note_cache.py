@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с временем жизни записей.
+
+    Помимо обычных значений умеет хранить "отрицательные" записи
+    (ключ точно отсутствует в БД) с отдельным, обычно более коротким TTL.
+    Кэш локален для процесса: при нескольких воркерах устаревание между
+    ними ограничено только TTL. on_lookup(found) вызывается при каждом get()
+    (для метрик).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, negative_ttl: float = 0,
+                 on_lookup: Optional[Callable[[bool], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.on_lookup = on_lookup
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Возвращает (найдено ли, значение); для отрицательной записи значение None"""
+        found, value = self._lookup(key)
+        if self.on_lookup is not None:
+            self.on_lookup(found)
+        return found, value
+
+    def _lookup(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any):
+        """Сохранение значения"""
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._store(key, value, self.ttl)
+
+    def set_missing(self, key: Hashable):
+        """Запоминание того, что ключ отсутствует (если включено)"""
+        if self.maxsize <= 0 or self.negative_ttl <= 0:
+            return
+        self._store(key, None, self.negative_ttl)
+
+    def invalidate(self, key: Hashable):
+        """Удаление записи"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]):
+        """Удаление нескольких записей"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
@@ -0,0 +1,355 @@
+"""Заметки: чтение через кэш, массовый импорт, экспорт и QR-коды"""
+import concurrent.futures
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import insert
+
+from . import config
+from .extensions import db, note_cache, note_html_cache, storage
+from .metrics import observe
+from .models import Note, NoteLocation
+from .stock import LOCATION_LEVELS, parse_location
+from .uploads import upload_key
+
+
+@observe('generate_qr')
+def generate_qr_code(data: str) -> io.BytesIO:
+    """Генерация QR-кода в PNG формате"""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    img_io = io.BytesIO()
+    img.save(img_io, 'PNG')
+    img_io.seek(0)
+    return img_io
+
+
+def _qr_png_bytes(data: str) -> bytes:
+    """PNG QR-кода в виде bytes (для пула процессов)"""
+    return generate_qr_code(data).getvalue()
+
+
+def generate_qr_codes(payloads: list, workers: int = config.QR_WORKERS) -> list:
+    """Параллельная генерация QR-кодов, порядок результатов совпадает с payloads"""
+    if workers <= 1 or len(payloads) < 2:
+        return [_qr_png_bytes(data) for data in payloads]
+    chunksize = max(1, len(payloads) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_qr_png_bytes, payloads, chunksize=chunksize))
+
+
+def parse_note_id(qr_data: str) -> str:
+    """Извлечение ID из формата "qrapp:note:<id>" или "note:<id>"
+
+    Если префикса нет, весь текст считается ID.
+    """
+    qr_data = qr_data.strip()
+    if qr_data.startswith('qrapp:note:'):
+        return qr_data[len('qrapp:note:'):]
+    if qr_data.startswith('note:'):
+        return qr_data[len('note:'):]
+    return qr_data
+
+
+def title_from_text(text: str) -> str:
+    """Заголовок заметки из первой строки текста"""
+    title = 'Без названия'
+    if text.strip():
+        first_line = text.strip().split('\n')[0].strip()
+        title = first_line[:500] if first_line else 'Без названия'
+    return title
+
+
+def parse_import_rows(stream: Iterable[str], fmt: str) -> Iterator[dict]:
+    """Разбор строк импорта в формате csv (колонки title,text и необязательные
+    location,quantity) или jsonl"""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {'title': row.get('title') or '', 'text': row.get('text') or '',
+                   'location': row.get('location') or '', 'quantity': row.get('quantity') or ''}
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('Каждая строка JSONL должна быть объектом')
+            yield row
+    else:
+        raise ValueError(f'Неизвестный формат импорта: {fmt}')
+
+
+def bulk_insert_notes(rows: Iterable[dict], user_id: int, batch_size: int = config.BULK_BATCH_SIZE,
+                      keep_ids: bool = False):
+    """Массовая вставка заметок пачками, одна транзакция на пачку.
+
+    Строка может содержать адрес ячейки (location) и количество (quantity) -
+    товар сразу размещается в ячейке. Возвращает (список созданных
+    заметок, список ошибок по строкам). Некорректные строки пропускаются и
+    попадают в список ошибок. С keep_ids id и время создания берутся из
+    строк (заметки, созданные офлайн; id уже проверены вызывающим).
+    """
+    created, errors, batch, placements = [], [], [], []
+
+    def flush():
+        db.session.execute(insert(Note), batch)
+        if placements:
+            db.session.execute(insert(NoteLocation), placements)
+        db.session.commit()
+        note_cache.invalidate_many(row['id'] for row in batch)
+        created.extend(batch)
+        batch.clear()
+        placements.clear()
+
+    for line_no, row in enumerate(rows, start=1):
+        text = str(row.get('text') or '')
+        title = str(row.get('title') or '').strip()[:500]
+        if len(text) > 4096:
+            errors.append({'row': line_no, 'error': 'Текст заметки превышает 4096 символов'})
+            continue
+        # Проверка до подстановки заголовка из текста: title_from_text не бывает пустым
+        if not text.strip() and not title:
+            errors.append({'row': line_no, 'error': 'Пустая заметка'})
+            continue
+        title = title or title_from_text(text)
+        note_id = row['id'] if keep_ids else str(uuid.uuid4())
+        if row.get('location'):
+            try:
+                parts = parse_location(row['location'])
+                quantity = int(row.get('quantity') or 0)
+                if quantity < 0:
+                    raise ValueError('Количество не может быть отрицательным')
+            except (TypeError, ValueError) as e:
+                errors.append({'row': line_no, 'error': str(e)})
+                continue
+            if quantity:
+                placements.append({'note_id': note_id, 'quantity': quantity, 'updated': datetime.utcnow(),
+                                   **dict(zip(LOCATION_LEVELS, parts))})
+        batch.append({
+            'id': note_id,
+            'title': title,
+            'text': text,
+            'photos_json': None,
+            'created': (keep_ids and row.get('created')) or datetime.utcnow(),
+            'user_id': user_id,
+        })
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return created, errors
+
+
+def iter_notes(after: Optional[str] = None, batch_size: int = config.EXPORT_BATCH_SIZE) -> Iterator[Note]:
+    """Обход всех заметок по возрастанию id пачками (keyset-пагинация).
+
+    В памяти одновременно находится не больше одной пачки, а id последней
+    выданной заметки служит курсором для продолжения обхода.
+    """
+    while True:
+        query = Note.query.order_by(Note.id)
+        if after:
+            query = query.filter(Note.id > after)
+        batch = query.limit(batch_size).all()
+        if not batch:
+            return
+        yield from batch
+        after = batch[-1].id
+        db.session.expunge_all()
+
+
+def note_payload(note: Note) -> dict:
+    """Сериализованная заметка вместе с владельцем (для кэша и экспорта)"""
+    payload = note.to_dict()
+    payload['user_id'] = note.user_id
+    return payload
+
+
+def public_note(payload: dict) -> dict:
+    """Заметка для ответа API, без служебных полей"""
+    return {key: value for key, value in payload.items() if key != 'user_id'}
+
+
+def _cache_missing(note_id: str):
+    """Отрицательная запись в кэше - только для id, которые не станут заметкой
+
+    Кэш у каждого процесса свой, а заметку с UUID (id любой заметки) может
+    в любой момент создать другой воркер или прислать устройство из офлайн-
+    очереди - такой промах не кэшируем, иначе этот воркер отвечал бы 404 до
+    истечения NOTE_CACHE_NEGATIVE_TTL. Прочие строки (сторонние QR-коды)
+    заметками не станут.
+    """
+    try:
+        uuid.UUID(note_id)
+    except ValueError:
+        note_cache.set_missing(note_id)
+
+
+def get_note_payload(note_id: str) -> Optional[dict]:
+    """Заметка по id через кэш (read-through), None если не найдена
+
+    Возвращаемый словарь общий для всех читателей и не должен изменяться.
+    """
+    found, payload = note_cache.get(note_id)
+    if found:
+        return payload
+    note = db.session.get(Note, note_id)
+    if note is None:
+        _cache_missing(note_id)
+        return None
+    payload = note_payload(note)
+    note_cache.set(note_id, payload)
+    return payload
+
+
+def note_version(payload: dict) -> str:
+    """Версия заметки - хэш ее содержимого (используется как ETag)"""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+def render_note_body(payload: dict, version: str) -> Markup:
+    """HTML-фрагмент с содержимым заметки, кэшируется по версии"""
+    key = (payload['id'], version)
+    found, body = note_html_cache.get(key)
+    if found:
+        return body
+    created = datetime.fromisoformat(payload['created']) if payload['created'] else None
+    body = Markup(render_template(
+        '_note_body.html',
+        note=payload,
+        photo_keys=[upload_key(ref) for ref in payload['photos']],
+        created=created.strftime('%Y-%m-%d %H:%M') if created else ''
+    ))
+    note_html_cache.set(key, body)
+    return body
+
+
+def get_note_payloads(note_ids: Iterable[str]) -> dict:
+    """Несколько заметок через кэш; промахи загружаются одним IN-запросом"""
+    result, missing = {}, set()
+    for note_id in set(note_ids):
+        found, payload = note_cache.get(note_id)
+        if found:
+            if payload is not None:
+                result[note_id] = payload
+        else:
+            missing.add(note_id)
+    if missing:
+        for note in Note.query.filter(Note.id.in_(missing)).all():
+            payload = note_payload(note)
+            note_cache.set(note.id, payload)
+            result[note.id] = payload
+        for note_id in missing - result.keys():
+            _cache_missing(note_id)
+    return result
+
+
+def iter_export_ndjson(after: Optional[str] = None) -> Iterator[bytes]:
+    """Экспорт заметок в NDJSON, по одной заметке на строку"""
+    for note in iter_notes(after):
+        yield json.dumps(note_payload(note), ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+class _ZipStream(io.RawIOBase):
+    """Несикабельный буфер, из которого ZipFile можно читать частями"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_date_time(moment: Optional[datetime]) -> tuple:
+    """Дата файла в архиве: ZIP хранит только 1980-2107 годы
+
+    Иначе одна заметка с временем 1970 года (его может прислать устройство
+    через /sync) или без времени оборвала бы потоковый экспорт посередине.
+    """
+    date_time = (moment or datetime.utcnow()).timetuple()[:6]
+    return min(max(date_time, (1980, 1, 1, 0, 0, 0)), (2107, 12, 31, 23, 59, 58))
+
+
+def iter_export_zip(after: Optional[str] = None) -> Iterator[bytes]:
+    """Экспорт в ZIP: notes.ndjson и файлы фото в photos/
+
+    Архив пишется потоком: заметки проходят двумя проходами по курсору,
+    в памяти держится только текущая пачка и оглавление архива.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zf:
+        with zf.open('notes.ndjson', 'w', force_zip64=True) as entry:
+            for line in iter_export_ndjson(after):
+                entry.write(line)
+                yield stream.drain()
+
+        for note in iter_notes(after):
+            if not note.photos_json:
+                continue
+            for ref in json.loads(note.photos_json):
+                key = upload_key(ref)
+                try:
+                    photo_file = storage.open(key)
+                except FileNotFoundError:
+                    continue
+                info = zipfile.ZipInfo(f'photos/{os.path.basename(key)}',
+                                       date_time=_zip_date_time(note.created))
+                with photo_file, zf.open(info, 'w', force_zip64=True) as entry:
+                    shutil.copyfileobj(photo_file, entry)
+                yield stream.drain()
+    yield stream.drain()
+
+
+def recent_notes(user_id: int, limit: int = 10) -> list:
+    """Последние заметки пользователя: список (id, title)"""
+    rows = (db.session.query(Note.id, Note.title)
+            .filter_by(user_id=user_id)
+            .order_by(Note.created.desc())
+            .limit(limit)
+            .all())
+    return [tuple(row) for row in rows]
+
+
+def save_note_from_state(user_id: int, state: dict) -> str:
+    """Сохранение черновика заметки из бота, возвращает id"""
+    note = Note(
+        id=str(uuid.uuid4()),
+        title=state['title'],
+        text=state.get('text', ''),
+        photos_json=json.dumps(state['photos']),
+        user_id=user_id
+    )
+    db.session.add(note)
+    db.session.commit()
+    return note.id
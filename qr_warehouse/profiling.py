@@ -0,0 +1,250 @@
+"""Выборочное профилирование запросов Flask и обработчиков бота.
+
+Фоновый поток с интервалом interval снимает стеки (sys._current_frames)
+только тех потоков и корутин, которые сейчас профилируются; когда
+профилировать нечего, поток спит. Профиль сохраняется, если запрос шел
+дольше slow_ms или профилирование запрошено явно, в двух форматах:
+speedscope (https://www.speedscope.app) и collapsed stacks (flamegraph.pl,
+inferno).
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+PROFILE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9]+-[0-9]+$')
+FORMATS = {
+    'speedscope': ('.speedscope.json', 'application/json'),
+    'collapsed': ('.collapsed.txt', 'text/plain'),
+}
+
+
+def _frame_key(code) -> tuple:
+    """(функция, файл, строка начала) - одинаковые функции склеиваются"""
+    return getattr(code, 'co_qualname', code.co_name), code.co_filename, code.co_firstlineno
+
+
+def _thread_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_key(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _coroutine_stack(coroutine) -> list:
+    """Цепочка await приостановленной корутины, от внешней к внутренней"""
+    stack, awaited = [], coroutine
+    while awaited is not None:
+        frame = getattr(awaited, 'cr_frame', None) or getattr(awaited, 'gi_frame', None)
+        if frame is None:
+            break
+        stack.append(_frame_key(frame.f_code))
+        awaited = getattr(awaited, 'cr_await', None) or getattr(awaited, 'gi_yieldfrom', None)
+    if stack and awaited is not None:
+        # Ожидание Future (сеть, run_blocking): время ожидания тоже видно
+        stack.append((f'<await {type(awaited).__name__}>', '', 0))
+    return stack
+
+
+class Capture:
+    """Профиль одного запроса или обновления
+
+    Поток задается thread_id. Для корутины (coroutine) в момент выполнения
+    снимается стек потока цикла событий (thread_id), а пока она ждет -
+    цепочка ее await.
+    """
+
+    def __init__(self, label: str, thread_id: int, coroutine=None, forced: bool = False):
+        self.label = label
+        self.thread_id = thread_id
+        self.coroutine = coroutine
+        self.forced = forced
+        self.samples = Counter()
+        self.started = self.last_sample = time.perf_counter()
+        self.created = datetime.utcnow()
+        self.duration = 0.0
+        self.profile_id: Optional[str] = None
+
+    def sample(self, frames: dict, now: float):
+        weight, self.last_sample = now - self.last_sample, now
+        if self.coroutine is not None and not getattr(self.coroutine, 'cr_running', True):
+            stack = _coroutine_stack(self.coroutine)
+        else:
+            frame = frames.get(self.thread_id)
+            stack = _thread_stack(frame) if frame is not None else []
+        if stack:
+            self.samples[tuple(stack)] += weight
+
+
+class Profiler:
+    """Выборочный профилировщик с сохранением медленных профилей в directory
+
+    sample_rate - доля запросов, которые профилируются без явного запроса;
+    keep - сколько последних профилей хранить.
+    """
+
+    def __init__(self, directory: str, interval: float = 0.005, slow_ms: float = 500,
+                 sample_rate: float = 0.0, keep: int = 200):
+        self.directory = directory
+        self.interval = interval
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._seq = 0
+
+    def should_profile(self, forced: bool = False) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self, label: str, forced: bool = False, coroutine=None) -> Optional[Capture]:
+        """Начало профиля в текущем потоке; None - запрос не выбран"""
+        if not self.should_profile(forced):
+            return None
+        capture = Capture(label, threading.get_ident(), coroutine, forced)
+        with self._lock:
+            self._active.add(capture)
+            self._wake.set()
+            if self._thread is None or not self._thread.is_alive():
+                # После fork (gunicorn) поток сэмплера создается заново
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+        return capture
+
+    def stop(self, capture: Optional[Capture]) -> Optional[str]:
+        """Завершение профиля; возвращает id, если профиль сохранен"""
+        if capture is None:
+            return None
+        with self._lock:
+            self._active.discard(capture)
+        capture.duration = time.perf_counter() - capture.started
+        if not capture.samples or (not capture.forced and capture.duration * 1000 < self.slow_ms):
+            return None
+        return self.save(capture)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                captures = list(self._active)
+                if not captures:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for capture in captures:
+                capture.sample(frames, now)
+            del frames
+            time.sleep(self.interval)
+
+    def save(self, capture: Capture) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._seq += 1
+            profile_id = f'{capture.created:%Y%m%d-%H%M%S}-{os.getpid()}-{self._seq:06d}'
+        base = os.path.join(self.directory, profile_id)
+        with open(base + FORMATS['collapsed'][0], 'w') as f:
+            f.write(to_collapsed(capture.samples))
+        with open(base + FORMATS['speedscope'][0], 'w') as f:
+            json.dump(to_speedscope(capture), f)
+        meta = {
+            'id': profile_id,
+            'label': capture.label,
+            'created': capture.created.isoformat(),
+            'duration_ms': round(capture.duration * 1000, 1),
+            'samples': len(capture.samples),
+            'forced': capture.forced,
+            'pid': os.getpid(),
+        }
+        with open(base + '.meta.json', 'w') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        capture.profile_id = profile_id
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        metas = sorted(name for name in os.listdir(self.directory) if name.endswith('.meta.json'))
+        for name in metas[:max(0, len(metas) - self.keep)]:
+            profile_id = name[:-len('.meta.json')]
+            for suffix in [ext for ext, _ in FORMATS.values()] + ['.meta.json']:
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit: int = 100) -> List[dict]:
+        """Описания сохраненных профилей, новые первыми (со всех воркеров)"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted((name for name in os.listdir(self.directory) if name.endswith('.meta.json')),
+                       reverse=True)
+        profiles = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def path(self, profile_id: str, fmt: str) -> Optional[str]:
+        """Путь к файлу профиля или None для неизвестного id/формата"""
+        if fmt not in FORMATS or not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + FORMATS[fmt][0])
+        return path if os.path.isfile(path) else None
+
+
+def _frame_name(key: tuple) -> str:
+    name, filename, line = key
+    return f'{name} ({os.path.basename(filename)}:{line})' if filename else name
+
+
+def to_collapsed(samples: Counter) -> str:
+    """Строки 'внешняя;...;внутренняя <мкс>' для flamegraph.pl и inferno"""
+    lines = []
+    for stack, weight in samples.most_common():
+        lines.append(';'.join(_frame_name(key).replace(';', ':') for key in stack)
+                     + f' {max(1, round(weight * 1e6))}')
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(capture: Capture) -> dict:
+    """Профиль в формате speedscope (sampled, веса в секундах)"""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, weight in capture.samples.items():
+        sample = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                name, filename, line = key
+                frames.append({'name': name, 'file': filename, 'line': line} if filename else {'name': name})
+            sample.append(index[key])
+        samples.append(sample)
+        weights.append(weight)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': capture.label,
+        'exporter': 'qr-warehouse-profiling',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': capture.label,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
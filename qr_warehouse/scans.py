@@ -0,0 +1,149 @@
+"""Журнал сканирований QR-кодов: буфер процесса, пакетная запись и агрегаты
+
+Обработчик сканирования только добавляет событие в scan_buffer; в БД
+события попадают пачками из фоновой задачи (background._scan_flush_worker),
+поэтому запросы к журналу видят сканирования с задержкой до
+SCAN_FLUSH_INTERVAL секунд.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from . import config, metrics
+from .extensions import db, scan_buffer
+from .models import ScanEvent
+
+HOUR_FORMAT = '%Y-%m-%dT%H:00:00'
+
+_recorded = metrics.SCAN_EVENTS.labels('recorded')
+_dropped = metrics.SCAN_EVENTS.labels('dropped')
+
+
+def _clip(value, length: int) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value[:length] or None
+
+
+def record_scan(note_id: str, device: Optional[str] = None, location: Optional[str] = None,
+                scanned_at: Optional[datetime] = None) -> bool:
+    """Добавление сканирования в буфер; False если буфер переполнен
+
+    scanned_at - время сканирования на устройстве (для накопленных офлайн);
+    по умолчанию текущее.
+    """
+    event = (note_id, scanned_at or datetime.utcnow(), _clip(device, 64), _clip(location, 128))
+    if scan_buffer.append(event):
+        _recorded.inc()
+        return True
+    _dropped.inc()
+    return False
+
+
+def flush_scan_events(limit: int = config.SCAN_FLUSH_BATCH) -> int:
+    """Запись пачки событий из буфера одним INSERT, возвращает число записанных
+
+    При ошибке БД события возвращаются в буфер и будут записаны следующей
+    попыткой.
+    """
+    events = scan_buffer.drain(limit)
+    if not events:
+        return 0
+    try:
+        db.session.execute(insert(ScanEvent), [
+            {'note_id': note_id, 'scanned_at': scanned_at, 'device': device, 'location': location}
+            for note_id, scanned_at, device, location in events
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        dropped = scan_buffer.requeue(events)
+        if dropped:
+            _dropped.inc(dropped)
+        raise
+    metrics.SCAN_EVENTS.labels('written').inc(len(events))
+    return len(events)
+
+
+def flush_all_scan_events() -> int:
+    """Запись всего буфера (при завершении процесса)"""
+    total = 0
+    while True:
+        written = flush_scan_events()
+        total += written
+        if written < config.SCAN_FLUSH_BATCH:
+            return total
+
+
+def purge_old_scan_events(batch_size: int = 10000) -> int:
+    """Удаление пачки событий старше SCAN_RETENTION_DAYS (периодическая задача)"""
+    if config.SCAN_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=config.SCAN_RETENTION_DAYS)
+    ids = db.session.execute(
+        select(ScanEvent.id).where(ScanEvent.scanned_at < cutoff).limit(batch_size)
+    ).scalars().all()
+    if ids:
+        db.session.execute(delete(ScanEvent).where(ScanEvent.id.in_(ids)))
+        db.session.commit()
+    return len(ids)
+
+
+def last_seen(note_ids: Iterable[str]) -> dict:
+    """Последнее сканирование с указанным местом для каждой заметки
+
+    Возвращает {note_id: {'location', 'device', 'scanned_at'}}; заметок без
+    таких сканирований в словаре нет. Один запрос по индексу
+    (note_id, scanned_at) независимо от числа заметок.
+    """
+    note_ids = list(dict.fromkeys(note_ids))
+    if not note_ids:
+        return {}
+    latest = (select(ScanEvent.note_id, func.max(ScanEvent.scanned_at).label('scanned_at'))
+              .where(ScanEvent.note_id.in_(note_ids), ScanEvent.location.isnot(None))
+              .group_by(ScanEvent.note_id)
+              .subquery())
+    rows = db.session.execute(
+        select(ScanEvent.id, ScanEvent.note_id, ScanEvent.scanned_at, ScanEvent.device, ScanEvent.location)
+        .join(latest, (ScanEvent.note_id == latest.c.note_id) & (ScanEvent.scanned_at == latest.c.scanned_at))
+        .where(ScanEvent.location.isnot(None))
+        .order_by(ScanEvent.id)
+    ).all()
+    # При совпадении времени побеждает событие, записанное последним
+    return {row.note_id: {
+        'location': row.location,
+        'device': row.device,
+        'scanned_at': row.scanned_at.isoformat(),
+    } for row in rows}
+
+
+def _hour_bucket(column):
+    """Выражение «начало часа» для GROUP BY в диалекте текущей БД"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return func.strftime(HOUR_FORMAT, column)
+    if dialect in ('mysql', 'mariadb'):
+        return func.date_format(column, HOUR_FORMAT)
+    return func.date_trunc('hour', column)
+
+
+def scans_per_hour(hours: int, note_id: Optional[str] = None) -> list:
+    """Число сканирований по часам (UTC) за последние hours часов, включая текущий
+
+    Часы без сканирований включаются с нулем: [{'hour': ..., 'scans': n}, ...].
+    """
+    first_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+    bucket = _hour_bucket(ScanEvent.scanned_at).label('hour')
+    query = (select(bucket, func.count())
+             .where(ScanEvent.scanned_at >= first_hour)
+             .group_by(bucket))
+    if note_id is not None:
+        query = query.where(ScanEvent.note_id == note_id)
+    counts = {}
+    for hour, count in db.session.execute(query):
+        key = hour.strftime(HOUR_FORMAT) if isinstance(hour, datetime) else str(hour)
+        counts[key] = count
+    return [{'hour': key, 'scans': counts.get(key, 0)}
+            for key in ((first_hour + timedelta(hours=i)).strftime(HOUR_FORMAT) for i in range(hours))]
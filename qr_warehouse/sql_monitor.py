@@ -0,0 +1,153 @@
+"""Замер SQL-операторов на уровне движка SQLAlchemy.
+
+Каждый оператор попадает в гистограмму длительности по типу (SELECT,
+INSERT, ...). Операторы дольше slow_ms пишутся в журнал вместе с планом
+выполнения (EXPLAIN QUERY PLAN для SQLite, EXPLAIN для остальных СУБД).
+Внутри области (HTTP-запрос, обновление бота) считается, сколько раз
+выполнялся каждый оператор: многократный повтор одного и того же SELECT -
+признак N+1.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from . import metrics
+
+OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK'}
+EXPLAINABLE = {'SELECT', 'UPDATE', 'DELETE', 'WITH'}
+
+_scope: ContextVar[Optional['Scope']] = ContextVar('sql_scope', default=None)
+
+
+def operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return word if word in OPERATIONS else 'OTHER'
+
+
+class Scope:
+    """Операторы одного HTTP-запроса или обновления бота"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.counts = Counter()
+        self.elapsed = 0.0
+
+    def record(self, statement: str, elapsed: float):
+        self.counts[statement] += 1
+        self.elapsed += elapsed
+
+
+class SQLMonitor:
+    """Обработчики событий движка и учет по областям
+
+    repeat_threshold - сколько выполнений одного оператора за область
+    считается N+1; план одного и того же оператора в журнал пишется не
+    чаще раза в explain_interval секунд.
+    """
+
+    def __init__(self, logger, slow_ms: float = 100, explain: bool = True, repeat_threshold: int = 10,
+                 explain_interval: float = 300):
+        self.logger = logger
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.repeat_threshold = repeat_threshold
+        self.explain_interval = explain_interval
+        self._explained = {}
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('sql_started', []).append(time.perf_counter())
+
+    def _on_error(self, context):
+        started = context.connection.info.get('sql_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('sql_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        op = operation(statement)
+        metrics.SQL_STATEMENT_SECONDS.labels(op).observe(elapsed)
+        scope = _scope.get()
+        if scope is not None:
+            scope.record(statement, elapsed)
+        if elapsed * 1000 >= self.slow_ms:
+            metrics.SQL_SLOW_STATEMENTS.labels(op).inc()
+            plan = None
+            if self.explain and op in EXPLAINABLE and not executemany and self._should_explain(statement):
+                plan = self.query_plan(conn, statement, parameters)
+            where = f' [{scope.label}]' if scope is not None else ''
+            message = f'Slow SQL {elapsed * 1000:.1f} ms{where}: {" ".join(statement.split())}'
+            if plan:
+                message += '\n  plan: ' + '\n        '.join(plan)
+            self.logger.warning(message)
+
+    def _should_explain(self, statement: str) -> bool:
+        now = time.monotonic()
+        if now - self._explained.get(statement, float('-inf')) < self.explain_interval:
+            return False
+        if len(self._explained) > 1000:
+            self._explained.clear()
+        self._explained[statement] = now
+        return True
+
+    @staticmethod
+    def query_plan(conn, statement: str, parameters) -> list:
+        """План выполнения оператора (строки), минуя события SQLAlchemy"""
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            cursor.close()
+        if conn.dialect.name == 'sqlite':
+            # (id, parent, notused, detail)
+            return [row[-1] for row in rows]
+        return [str(row[0]) for row in rows]
+
+    def begin(self, label: str):
+        """Начало области; возвращает токен для end()"""
+        return _scope.set(Scope(label))
+
+    def end(self, token):
+        scope = _scope.get()
+        try:
+            _scope.reset(token)
+        except ValueError:  # токен из другого контекста
+            _scope.set(None)
+        if scope is not None:
+            self.finish(scope)
+
+    @contextmanager
+    def scope(self, label: str):
+        token = self.begin(label)
+        try:
+            yield
+        finally:
+            self.end(token)
+
+    def finish(self, scope: Scope):
+        total = sum(scope.counts.values())
+        if not total:
+            return
+        metrics.SQL_STATEMENTS_PER_SCOPE.labels(scope.label).observe(total)
+        repeated = [(count, statement) for statement, count in scope.counts.items()
+                    if count >= self.repeat_threshold and operation(statement) in EXPLAINABLE]
+        if repeated:
+            metrics.SQL_REPEATED.labels(scope.label).inc()
+            for count, statement in sorted(repeated, reverse=True):
+                self.logger.warning(f'Possible N+1 in {scope.label}: {count}x '
+                                    f'{" ".join(statement.split())[:300]}')
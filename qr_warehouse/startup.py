@@ -0,0 +1,80 @@
+"""Замер времени запуска: импорт приложения и этапы отложенной инициализации.
+
+Таймер запускается при импорте этого модуля (первым в qr_warehouse/__init__.py), этапы
+отмечаются по мере готовности. import_profile() замеряет импорт в чистом
+процессе (python -X importtime) - так видно, какие модули дороже всего.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+class StartupTimer:
+    """Длительность этапов запуска в миллисекундах, по порядку"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self, name: str):
+        """Этап, закончившийся сейчас (начался в конце предыдущего)"""
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """Этап, выполняемый позже (при первом обращении), замеряется отдельно"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def report(self) -> dict:
+        return dict(self.phases)
+
+    def summary(self) -> str:
+        return 'Startup: ' + ', '.join(f'{name} {ms:g} ms' for name, ms in self.phases.items())
+
+
+timer = StartupTimer()
+
+
+def import_profile(module: str = 'app', top: int = 15, env: Optional[dict] = None) -> dict:
+    """Импорт module в отдельном процессе с -X importtime
+
+    Возвращает {'total_ms', 'packages': [(пакет, мс)]} - самые дорогие
+    пакеты верхнего уровня среди всего, что импортирует module (время
+    модулей пакета суммируется, вложенность не важна).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env={**os.environ, **(env or {})},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+    # Строки идут в порядке завершения импорта: все, что импортировал
+    # module, стоит перед его строкой глубины 0 (после предыдущей такой строки)
+    total, packages, pending = 0.0, Counter(), Counter()
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        if len(indent) > 1:
+            pending[name.split('.')[0]] += int(own) / 1000
+        elif name == module:
+            total, packages = int(cumulative) / 1000, pending
+        else:
+            pending = Counter()
+    return {'total_ms': round(total, 1),
+            'packages': [(name, round(ms, 1)) for name, ms in packages.most_common(top)]}
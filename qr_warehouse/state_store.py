@@ -0,0 +1,204 @@
+"""Черновики бота: хранилища состояний и UserStateStore поверх них.
+
+У каждого состояния есть версия. update() сохраняет изменение только если
+версия не поменялась с момента чтения (иначе перечитывает и повторяет),
+поэтому одновременные обработчики одного пользователя - в разных потоках
+или процессах - не затирают изменения друг друга.
+"""
+import copy
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .note_cache import TTLCache
+
+# Сколько раз update() повторяет чтение-изменение-запись при конфликте версий
+UPDATE_ATTEMPTS = 10
+
+
+class MemoryStateBackend:
+    """Хранение состояний в памяти процесса (один воркер, тесты)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id: int) -> Optional[Tuple[dict, datetime, int]]:
+        with self._lock:
+            return self._data.get(user_id)
+
+    def save(self, user_id: int, state: dict, updated: datetime, version: Optional[int] = None) -> bool:
+        with self._lock:
+            current = self._data.get(user_id, (None, None, 0))[2]
+            if version is not None and version != current:
+                return False
+            self._data[user_id] = (state, updated, current + 1)
+            return True
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def iter_states(self) -> Iterator[Tuple[int, dict]]:
+        with self._lock:
+            items = [(user_id, state) for user_id, (state, _, _) in self._data.items()]
+        return iter(items)
+
+    def pop_expired(self, cutoff: datetime) -> List[Tuple[int, dict]]:
+        with self._lock:
+            expired = [(user_id, state) for user_id, (state, updated, _) in self._data.items()
+                       if updated < cutoff]
+            for user_id, _ in expired:
+                del self._data[user_id]
+        return expired
+
+
+class SQLStateBackend:
+    """Хранение состояний в таблице БД (общее для всех воркеров и узлов)
+
+    model - модель с полями user_id (PK), state_json, updated и version.
+    Методы вызываются в контексте Flask-приложения.
+    """
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def load(self, user_id: int) -> Optional[Tuple[dict, datetime, int]]:
+        # Запросом к таблице, а не session.get(): объект из identity map сессии
+        # мог устареть, а версия должна быть той, что сейчас в БД
+        table = self.model.__table__
+        row = self.db.session.execute(
+            select(table.c.state_json, table.c.updated, table.c.version).where(table.c.user_id == user_id)
+        ).first()
+        if row is None:
+            return None
+        return json.loads(row.state_json), row.updated, row.version
+
+    def save(self, user_id: int, state: dict, updated: datetime, version: Optional[int] = None) -> bool:
+        """Запись состояния; version - ожидаемая версия (0 - записи еще нет, None - любая)
+
+        Возвращает False, если запись успели изменить (версия другая).
+        """
+        table = self.model.__table__
+        values = {'state_json': json.dumps(state, ensure_ascii=False), 'updated': updated}
+        if version != 0:
+            query = update(table).where(table.c.user_id == user_id)
+            if version is not None:
+                query = query.where(table.c.version == version)
+            if self.db.session.execute(query.values(version=table.c.version + 1, **values)).rowcount:
+                self.db.session.commit()
+                return True
+            if version is not None:
+                self.db.session.rollback()
+                return False
+        try:
+            self.db.session.execute(insert(table).values(user_id=user_id, version=1, **values))
+            self.db.session.commit()
+        except IntegrityError:
+            # Запись одновременно создал другой обработчик
+            self.db.session.rollback()
+            return False if version is not None else self.save(user_id, state, updated)
+        return True
+
+    def delete(self, user_id: int):
+        self.model.query.filter_by(user_id=user_id).delete()
+        self.db.session.commit()
+
+    def iter_states(self) -> Iterator[Tuple[int, dict]]:
+        for row in self.model.query.yield_per(100):
+            yield row.user_id, json.loads(row.state_json)
+
+    def pop_expired(self, cutoff: datetime) -> List[Tuple[int, dict]]:
+        rows = self.model.query.filter(self.model.updated < cutoff).all()
+        expired = [(row.user_id, json.loads(row.state_json)) for row in rows]
+        for row in rows:
+            self.db.session.delete(row)
+        self.db.session.commit()
+        return expired
+
+
+class UserStateStore:
+    """Черновики бота по пользователям с TTL и LRU-кэшем перед хранилищем
+
+    Кэш локален для процесса, поэтому при нескольких воркерах его TTL
+    (cache_ttl) ограничивает, насколько устаревшим может быть прочитанное
+    состояние; 0 отключает кэш. get() возвращает копию только для чтения:
+    изменения сохраняются через update() (set() записывает целиком,
+    не глядя на версию).
+    """
+
+    def __init__(self, backend, ttl: float, cache_size: int = 1024, cache_ttl: float = 0,
+                 on_lookup=None):
+        self.backend = backend
+        self.ttl = ttl
+        self._cache = TTLCache(cache_size, cache_ttl, negative_ttl=cache_ttl, on_lookup=on_lookup)
+
+    def cached(self, user_id: int) -> Tuple[bool, Optional[dict]]:
+        """Чтение только из кэша: (найдено ли, состояние или None)"""
+        found, state = self._cache.get(user_id)
+        return found, copy.deepcopy(state)
+
+    def get(self, user_id: int, use_cache: bool = True) -> Optional[dict]:
+        """Черновик пользователя; use_cache=False - кэш уже проверен через cached()"""
+        if use_cache:
+            found, state = self.cached(user_id)
+            if found:
+                return state
+        entry = self._load(user_id)
+        if entry is None:
+            self._cache.set_missing(user_id)
+            return None
+        self._cache.set(user_id, entry[0])
+        return copy.deepcopy(entry[0])
+
+    def set(self, user_id: int, state: dict):
+        self.backend.save(user_id, state, datetime.utcnow())
+        self._cache.set(user_id, copy.deepcopy(state))
+
+    def update(self, user_id: int, mutate: Callable[[dict], None]) -> Optional[dict]:
+        """Изменение черновика: mutate(state) меняет его на месте
+
+        Состояние читается из хранилища (не из кэша) и записывается, только
+        если его версия за это время не изменилась; иначе mutate вызывается
+        заново для свежего состояния. Возвращает сохраненное состояние или
+        None, если черновика нет.
+        """
+        for _ in range(UPDATE_ATTEMPTS):
+            entry = self._load(user_id)
+            if entry is None:
+                self._cache.set_missing(user_id)
+                return None
+            state, version = copy.deepcopy(entry[0]), entry[2]
+            mutate(state)
+            if self.backend.save(user_id, state, datetime.utcnow(), version):
+                self._cache.set(user_id, copy.deepcopy(state))
+                return copy.deepcopy(state)
+        raise RuntimeError(f'Черновик пользователя {user_id} меняется слишком часто')
+
+    def delete(self, user_id: int):
+        self.backend.delete(user_id)
+        self._cache.set_missing(user_id)
+
+    def iter_states(self) -> Iterator[Tuple[int, dict]]:
+        """Все сохраненные черновики, включая еще не удаленные просроченные"""
+        return self.backend.iter_states()
+
+    def pop_expired(self) -> List[Tuple[int, dict]]:
+        """Удаление просроченных черновиков, возвращает [(user_id, state)]"""
+        expired = self.backend.pop_expired(self._cutoff())
+        self._cache.invalidate_many(user_id for user_id, _ in expired)
+        return expired
+
+    def _load(self, user_id: int) -> Optional[Tuple[dict, datetime, int]]:
+        entry = self.backend.load(user_id)
+        if entry is not None and entry[1] < self._cutoff():
+            return None
+        return entry
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
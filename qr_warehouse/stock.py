@@ -0,0 +1,133 @@
+"""Места хранения и остатки: адреса ячеек зона-ряд-полка-ячейка и количество товара
+
+Адрес ячейки записывается через дефис (``A-03-2-B``); допускаются также
+``/``, ``.`` и пробел. Для запросов «что лежит» можно указать префикс адреса
+(``A`` - вся зона, ``A-03`` - ряд). Оба вида запросов - поиск по индексу
+таблицы note_location, без просмотра текста заметок.
+"""
+import re
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import config
+from .extensions import db
+from .models import Note, NoteLocation
+
+LOCATION_LEVELS = ('zone', 'aisle', 'shelf', 'bin')
+
+_LOCATION_SEPARATORS = re.compile(r'[-/.\s]+')
+
+
+def parse_location(code: str, partial: bool = False) -> tuple:
+    """Адрес ячейки в кортеж частей: 'a-03-2-b' -> ('A', '03', '2', 'B')
+
+    С partial допускается префикс адреса (от одной до четырех частей).
+    Некорректный адрес - ValueError.
+    """
+    parts = tuple(part.upper() for part in _LOCATION_SEPARATORS.split(str(code or '').strip()) if part)
+    if not parts or len(parts) > len(LOCATION_LEVELS) or (not partial and len(parts) < len(LOCATION_LEVELS)):
+        raise ValueError(f'Адрес ячейки должен иметь вид зона-ряд-полка-ячейка, например A-03-2-B: {code}')
+    if any(len(part) > 16 for part in parts):
+        raise ValueError(f'Часть адреса ячейки длиннее 16 символов: {code}')
+    return parts
+
+
+def format_location(parts) -> str:
+    return '-'.join(parts)
+
+
+def _location_filter(parts: tuple) -> list:
+    return [getattr(NoteLocation, level) == value for level, value in zip(LOCATION_LEVELS, parts)]
+
+
+def _placement_dict(placement: NoteLocation) -> dict:
+    parts = tuple(getattr(placement, level) for level in LOCATION_LEVELS)
+    return {
+        'location': format_location(parts),
+        **dict(zip(LOCATION_LEVELS, parts)),
+        'quantity': placement.quantity,
+        'updated': placement.updated.isoformat() if placement.updated else None,
+    }
+
+
+def note_locations(note_id: str) -> list:
+    """Где лежит товар: ячейки заметки с количеством, по порядку адресов"""
+    placements = db.session.execute(
+        select(NoteLocation)
+        .where(NoteLocation.note_id == note_id)
+        .order_by(NoteLocation.zone, NoteLocation.aisle, NoteLocation.shelf, NoteLocation.bin)
+    ).scalars()
+    return [_placement_dict(placement) for placement in placements]
+
+
+def bin_contents(parts: tuple, limit: int = config.BIN_CONTENTS_LIMIT) -> list:
+    """Что лежит в ячейке (или во всех ячейках префикса адреса): заметки с количеством"""
+    rows = db.session.execute(
+        select(NoteLocation, Note.title)
+        .join(Note, Note.id == NoteLocation.note_id)
+        .where(*_location_filter(parts))
+        .order_by(NoteLocation.zone, NoteLocation.aisle, NoteLocation.shelf, NoteLocation.bin,
+                  NoteLocation.note_id)
+        .limit(limit)
+    ).all()
+    return [{'note_id': placement.note_id, 'title': title, **_placement_dict(placement)}
+            for placement, title in rows]
+
+
+def update_stock(note_id: str, location: str, quantity: Optional[int] = None,
+                 delta: Optional[int] = None) -> Optional[int]:
+    """Установка (quantity) или изменение (delta) количества товара в ячейке
+
+    Возвращает новое количество или None, если заметки нет. Нулевое
+    количество убирает товар из ячейки; уход в минус - ValueError.
+
+    Количество меняется одним UPDATE (``quantity = quantity + delta`` с
+    проверкой на минус в WHERE), а не чтением и записью: SELECT FOR UPDATE
+    в SQLite ничего не блокирует, и одновременные изменения терялись бы.
+    """
+    parts = parse_location(location)
+    if (quantity is None) == (delta is None):
+        raise ValueError('Нужно указать либо количество, либо изменение')
+    if quantity is not None and quantity < 0:
+        raise ValueError('Количество не может быть отрицательным')
+    if db.session.get(Note, note_id) is None:
+        return None
+
+    match = [NoteLocation.note_id == note_id, *_location_filter(parts)]
+    # Повтор на случай, если ту же ячейку одновременно создал другой запрос
+    for attempt in range(2):
+        if quantity is not None:
+            new_value, condition = quantity, []
+        else:
+            new_value, condition = NoteLocation.quantity + delta, [NoteLocation.quantity + delta >= 0]
+        updated = db.session.execute(
+            update(NoteLocation)
+            .where(*match, *condition)
+            .values(quantity=new_value, updated=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        # После UPDATE строка заблокирована до конца транзакции
+        current = db.session.execute(select(NoteLocation.quantity).where(*match)).scalar_one_or_none()
+        if updated:
+            new_quantity = current
+            if not new_quantity:
+                db.session.execute(delete(NoteLocation).where(*match).execution_options(synchronize_session=False))
+        elif current is not None or (delta is not None and delta < 0):
+            # Строка есть, но изменение увело бы количество в минус (или товара в ячейке нет)
+            db.session.rollback()
+            raise ValueError(f'В ячейке {format_location(parts)} только {current or 0} шт.')
+        else:
+            new_quantity = quantity if quantity is not None else delta
+            if new_quantity:
+                db.session.add(NoteLocation(note_id=note_id, quantity=new_quantity,
+                                            **dict(zip(LOCATION_LEVELS, parts))))
+        try:
+            db.session.commit()
+            return new_quantity
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
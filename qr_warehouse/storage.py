@@ -0,0 +1,195 @@
+"""Хранилища загруженных фото: локальный диск и S3-совместимое (AWS S3, MinIO).
+
+Файлы адресуются ключами - путями через '/' (например ab/cd/<имя>.jpg).
+"""
+import importlib.util
+import io
+import os
+import shutil
+from collections import namedtuple
+from typing import BinaryIO, Iterator, List, Optional
+
+# Описание файла в хранилище; mtime - unix-время последнего изменения
+StoredObject = namedtuple('StoredObject', ['key', 'size', 'mtime'])
+
+
+def is_hidden_key(key: str) -> bool:
+    """Служебный ключ (часть пути с точки, например .quarantine/...) - не для раздачи"""
+    return any(part.startswith('.') for part in key.split('/'))
+
+
+class LocalStorage:
+    """Файлы в каталоге на локальном диске"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Путь к файлу на диске (только для локального хранилища)"""
+        return os.path.join(self.root, key)
+
+    def save(self, key: str, data: bytes, content_type: str = 'application/octet-stream'):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.local_path(key), 'rb')
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.local_path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, key: str, new_key: str):
+        target = self.local_path(new_key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(self.local_path(key), target)
+        # Как у S3 (copy_object): mtime - время переноса, а не исходного файла
+        os.utime(target)
+
+    def url(self, key: str) -> Optional[str]:
+        """Внешняя ссылка на файл; None - файл отдает само приложение"""
+        return None
+
+    def list(self, after: Optional[str], limit: int, prefix: str = '') -> List[StoredObject]:
+        """До limit файлов с ключами после after в порядке сортировки
+
+        Каталоги читаются по одному, поэтому память ограничена размером
+        пачки и одного каталога. Скрытые файлы и каталоги (.quarantine)
+        попадают в список только если явно указаны в prefix.
+        """
+        start = tuple(part for part in prefix.split('/') if part)
+        if not os.path.isdir(os.path.join(self.root, *start)):
+            return []
+        after_parts = tuple(after.split('/')) if after else None
+        objects = []
+        for parts in self._walk(start, after_parts):
+            stat = os.stat(os.path.join(self.root, *parts))
+            objects.append(StoredObject('/'.join(parts), stat.st_size, stat.st_mtime))
+            if len(objects) >= limit:
+                break
+        return objects
+
+    def _walk(self, prefix: tuple, after: Optional[tuple]) -> Iterator[tuple]:
+        with os.scandir(os.path.join(self.root, *prefix)) as entries:
+            children = sorted((entry.name, entry.is_dir(follow_symlinks=False)) for entry in entries
+                              if not entry.name.startswith('.'))
+        for name, is_dir in children:
+            parts = prefix + (name,)
+            if is_dir:
+                # Поддеревья целиком до курсора пропускаем
+                if after is None or parts >= after[:len(parts)]:
+                    yield from self._walk(parts, after)
+            elif after is None or parts > after:
+                yield parts
+
+
+class S3Storage:
+    """Файлы в бакете S3-совместимого хранилища
+
+    endpoint_url задает сервер, отличный от AWS (MinIO и т.п.). Учетные
+    данные берутся boto3 из окружения (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY).
+    Чтение для браузера идет по подписанным ссылкам со сроком presign_ttl.
+    """
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, presign_ttl: int = 3600, public_endpoint_url: Optional[str] = None):
+        if importlib.util.find_spec('boto3') is None:
+            raise RuntimeError('Для STORAGE_BACKEND=s3 установите пакет boto3')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.presign_ttl = presign_ttl
+        self._client_args = {'endpoint_url': endpoint_url, 'region_name': region}
+        self._public_endpoint_url = public_endpoint_url
+        self._client = self._presign = None
+
+    @property
+    def client(self):
+        """Клиент создается при первом обращении (после fork - свой в каждом воркере)
+
+        boto3 импортируется здесь же: его импорт заметно удлиняет запуск.
+        """
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3', **self._client_args)
+        return self._client
+
+    @property
+    def _presign_client(self):
+        # Ссылки для браузера могут требовать другого адреса, чем сервер (MinIO за прокси)
+        if self._public_endpoint_url is None:
+            return self.client
+        if self._presign is None:
+            import boto3
+            self._presign = boto3.client('s3', **{**self._client_args,
+                                                        'endpoint_url': self._public_endpoint_url})
+        return self._presign
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    def save(self, key: str, data: bytes, content_type: str = 'application/octet-stream'):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data,
+                               ContentType=content_type)
+
+    def open(self, key: str) -> BinaryIO:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                raise FileNotFoundError(key) from e
+            raise
+        return io.BytesIO(response['Body'].read())
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def move(self, key: str, new_key: str):
+        self.client.copy_object(Bucket=self.bucket, Key=self.prefix + new_key,
+                                CopySource={'Bucket': self.bucket, 'Key': self.prefix + key})
+        self.delete(key)
+
+    def url(self, key: str) -> Optional[str]:
+        return self._presign_client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self.prefix + key},
+            ExpiresIn=self.presign_ttl)
+
+    def list(self, after: Optional[str], limit: int, prefix: str = '') -> List[StoredObject]:
+        """До limit объектов с ключами после after (порядок ключей S3)"""
+        objects = []
+        start_after = self.prefix + after if after else ''
+        while len(objects) < limit:
+            page = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self.prefix + prefix,
+                                               StartAfter=start_after, MaxKeys=limit)
+            contents = page.get('Contents', [])
+            for item in contents:
+                key = item['Key'][len(self.prefix):]
+                if not prefix and any(part.startswith('.') for part in key.split('/')):
+                    continue
+                objects.append(StoredObject(key, item['Size'], item['LastModified'].timestamp()))
+                if len(objects) >= limit:
+                    break
+            if not page.get('IsTruncated') or not contents:
+                break
+            start_after = contents[-1]['Key']
+        return objects
@@ -0,0 +1,191 @@
+"""Синхронизация офлайн-клиентов: прием накопленных на устройстве заметок и сканирований
+
+Веб-интерфейс без сети складывает заметки и сканирования в IndexedDB и
+отправляет их одним запросом POST /sync, когда сеть появляется. Заметки
+приходят с id, сгенерированным на устройстве, поэтому повторная отправка
+той же пачки (ответ потерялся при обрыве) не создает дубликатов.
+
+В обратную сторону клиент держит локальную копию каталога через GET /sync:
+первый запрос без курсора выгружает все заметки постранично, следующие -
+только измененные и удаленные после курсора из предыдущего ответа.
+"""
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import exists, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from . import config
+from .extensions import db
+from .models import Note, NoteTombstone
+from .notes import bulk_insert_notes, get_note_payloads, parse_note_id, public_note
+from .scans import record_scan
+
+
+def parse_client_time(value) -> Optional[datetime]:
+    """Время с устройства (мс с начала эпохи или ISO 8601) в naive UTC
+
+    Некорректное значение - None; время из будущего (часы устройства
+    спешат) заменяется текущим.
+    """
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            moment = datetime.utcfromtimestamp(value / 1000)
+        elif isinstance(value, str) and value:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if moment.tzinfo is not None:
+                moment = datetime.utcfromtimestamp(moment.timestamp())
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    return min(moment, datetime.utcnow())
+
+
+def is_client_note_id(value) -> bool:
+    """id заметки с устройства должен быть UUID, как у созданных на сервере"""
+    try:
+        return isinstance(value, str) and str(uuid.UUID(value)) == value.lower()
+    except ValueError:
+        return False
+
+
+def existing_note_ids(note_ids: list) -> set:
+    return set(db.session.execute(select(Note.id).where(Note.id.in_(note_ids))).scalars())
+
+
+def ingest_notes(items: list, user_id: int) -> dict:
+    """Создание заметок из очереди устройства; уже созданные пропускаются
+
+    Повтор id в одной пачке не ошибка: берется последний вариант заметки.
+    Возвращает {'created': [...], 'existing': [...], 'errors': [...]} и
+    список созданных заметок для отправки в канал.
+    """
+    errors, by_id = [], {}
+    for item in items:
+        note_id = item.get('id') if isinstance(item, dict) else None
+        if not is_client_note_id(note_id):
+            errors.append({'id': note_id, 'error': 'Некорректный id заметки'})
+            continue
+        by_id.pop(note_id.lower(), None)
+        by_id[note_id.lower()] = {'id': note_id.lower(), 'text': str(item.get('text') or ''),
+                                  'created': parse_client_time(item.get('created'))}
+    rows = list(by_id.values())
+
+    # Тот же id может вставить параллельный запрос (повтор пачки после обрыва)
+    # между проверкой и вставкой. Тогда проверка повторяется один раз, и такие
+    # заметки попадают в existing - устройство и так считает их отправленными
+    for attempt in range(2):
+        existing = existing_note_ids([row['id'] for row in rows]) if rows else set()
+        pending = [row for row in rows if row['id'] not in existing]
+        try:
+            created, row_errors = bulk_insert_notes(pending, user_id, keep_ids=True) if pending else ([], [])
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+    rows = pending
+    errors.extend({'id': rows[error['row'] - 1]['id'], 'error': error['error']} for error in row_errors)
+    return {
+        'created': [note['id'] for note in created],
+        'existing': sorted(existing),
+        'errors': errors,
+    }, created
+
+
+def ingest_scans(items: list, device: Optional[str]) -> dict:
+    """Запись сканирований с устройства в журнал (с временем сканирования на устройстве)
+
+    Коды без заметки не записываются и возвращаются в not_found; найденные
+    заметки возвращаются целиком, чтобы устройство обновило свой кэш.
+    """
+    scans = []
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get('data'), str):
+            scans.append((item['data'], parse_note_id(item['data']), item))
+    notes = get_note_payloads(note_id for _, note_id, _ in scans)
+
+    accepted, not_found = 0, []
+    for data, note_id, item in scans:
+        if note_id not in notes:
+            not_found.append(data)
+            continue
+        record_scan(note_id, item.get('device') or device, item.get('location'),
+                    parse_client_time(item.get('scanned_at')))
+        accepted += 1
+    return {
+        'accepted': accepted,
+        'not_found': not_found,
+        'invalid': len(items) - len(scans),
+        'notes': {note_id: public_note(note) for note_id, note in notes.items()},
+    }
+
+
+def encode_cursor(position: dict) -> str:
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> dict:
+    """Курсор из ответа GET /sync в позиции {'notes': [время, id], 'deleted': [время, id]}
+
+    Пустой курсор - выгрузка с начала; испорченный - ValueError.
+    """
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+        return {key: (datetime.fromisoformat(position[key][0]), str(position[key][1]))
+                for key in ('notes', 'deleted') if position.get(key)}
+    except (binascii.Error, ValueError, TypeError, KeyError, IndexError, AttributeError):
+        raise ValueError('Некорректный курсор синхронизации')
+
+
+def _after(columns, position):
+    return [tuple_(*columns) > position] if position else []
+
+
+def changes_since(cursor: Optional[str], limit: int = config.SYNC_PAGE_SIZE) -> dict:
+    """Страница изменений каталога после курсора: измененные и удаленные заметки
+
+    Заметки и отметки об удалении выбираются по индексам (updated_at, id) и
+    (deleted_at, note_id) после своих позиций курсора. Изменения моложе
+    SYNC_CURSOR_LAG секунд не выдаются: транзакция, которая начала запись
+    раньше, но еще не закоммитилась, не окажется позади выданного курсора.
+    """
+    position = decode_cursor(cursor)
+    horizon = datetime.utcnow() - timedelta(seconds=config.SYNC_CURSOR_LAG)
+
+    notes = db.session.execute(
+        select(Note)
+        .where(*_after((Note.updated_at, Note.id), position.get('notes')), Note.updated_at <= horizon)
+        .order_by(Note.updated_at, Note.id)
+        .limit(limit)
+    ).scalars().all()
+    # Заметку могли удалить и затем создать снова с тем же id (повторная отправка
+    # с устройства) - такая отметка об удалении уже неактуальна
+    deleted = db.session.execute(
+        select(NoteTombstone.note_id, NoteTombstone.deleted_at)
+        .where(*_after((NoteTombstone.deleted_at, NoteTombstone.note_id), position.get('deleted')),
+               NoteTombstone.deleted_at <= horizon,
+               ~exists().where(Note.id == NoteTombstone.note_id))
+        .order_by(NoteTombstone.deleted_at, NoteTombstone.note_id)
+        .limit(limit)
+    ).all()
+
+    if notes:
+        position['notes'] = (notes[-1].updated_at, notes[-1].id)
+    if deleted:
+        position['deleted'] = (deleted[-1].deleted_at, deleted[-1].note_id)
+    return {
+        'notes': [public_note(note.to_dict()) for note in notes],
+        'deleted': [row.note_id for row in deleted],
+        'cursor': encode_cursor({key: [moment.isoformat(), note_id] for key, (moment, note_id) in position.items()}),
+        'has_more': len(notes) == limit or len(deleted) == limit,
+    }
@@ -0,0 +1,109 @@
+"""Части бота, которым нужен python-telegram-bot.
+
+Модуль импортируется только при первом обращении к боту (webhook, доставка
+в канал), поэтому процесс, который обслуживает только HTTP-запросы, не
+тратит время запуска и память на telegram и httpx.
+"""
+import asyncio
+import time
+import weakref
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from telegram.request import HTTPXRequest
+
+from . import metrics
+from .metrics import observe
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с замером каждого вызова Bot API (sendPhoto, answerCallbackQuery, ...)"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            metrics.TELEGRAM_API_ERRORS.labels(api_method).inc()
+            raise
+        finally:
+            metrics.TELEGRAM_API_SECONDS.labels(api_method).observe(time.perf_counter() - started)
+
+
+def update_label(update) -> str:
+    """Название обновления для профилей: команда, callback или сообщение"""
+    if getattr(update, 'callback_query', None) is not None:
+        return 'telegram callback ' + '_'.join((update.callback_query.data or '').split('_')[:2])
+    message = getattr(update, 'message', None)
+    if message is not None and message.text and message.text.startswith('/'):
+        return 'telegram ' + message.text.split(maxsplit=1)[0].split('@', 1)[0]
+    if message is not None and message.photo:
+        return 'telegram photo'
+    return 'telegram message'
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных пользователей
+
+    Обновления одного пользователя обрабатываются по порядку, чтобы шаги
+    создания заметки (фото, заголовок, сохранение) не перемешивались.
+    ``pending`` - принятые, но еще не обработанные обновления (Application
+    сразу забирает их из update_queue в задачи, поэтому очередь сама по
+    себе не ограничивает нагрузку). Каждое обновление профилируется
+    (profiler) и учитывается в статистике SQL (sql_stats) как отдельная
+    область.
+    """
+
+    def __init__(self, max_concurrent_updates: int, profiler, sql_stats):
+        super().__init__(max_concurrent_updates)
+        self.profiler = profiler
+        self.sql_stats = sql_stats
+        self.active = 0
+        self.pending = 0
+        self._user_locks = weakref.WeakValueDictionary()
+        self._received = {}
+
+    def track(self, update: Update):
+        """Учет принятого обновления (для pending и времени ожидания)"""
+        self.pending += 1
+        self._received[update.update_id] = time.perf_counter()
+        metrics.WEBHOOK_PENDING.set(self.pending)
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, 'effective_user', None)
+        lock = None
+        if user is not None:
+            lock = self._user_locks.get(user.id)
+            if lock is None:
+                lock = self._user_locks[user.id] = asyncio.Lock()
+        received = self._received.pop(getattr(update, 'update_id', None), None)
+        label = update_label(update)
+        self.active += 1
+        try:
+            if lock is None:
+                await self._run(coroutine, received, label)
+            else:
+                async with lock:
+                    await self._run(coroutine, received, label)
+        finally:
+            self.active -= 1
+            self.pending = max(0, self.pending - 1)
+            metrics.WEBHOOK_PENDING.set(self.pending)
+
+    async def _run(self, coroutine, received: Optional[float], label: str = 'telegram'):
+        if received is not None:
+            metrics.QUEUE_WAIT_SECONDS.labels('webhook_update').observe(time.perf_counter() - received)
+        capture = self.profiler.start(label, coroutine=coroutine)
+        try:
+            with observe('update_handler'), self.sql_stats.scope(label):
+                await coroutine
+        finally:
+            self.profiler.stop(capture)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
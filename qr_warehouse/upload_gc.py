@@ -0,0 +1,92 @@
+"""Сборка мусора в хранилище загрузок: файлы, на которые не ссылается ни одна
+заметка и ни один черновик.
+
+Хранилище (см. storage.py) обходится пачками в порядке сортировки ключей;
+между пачками хранится только курсор (последний ключ), поэтому память не
+зависит от числа файлов.
+
+Сироты переносятся в .quarantine/<unix-время переноса>/<ключ>: срок
+карантина отсчитывается от переноса, а не от mtime исходного файла (иначе
+давний сирота удалялся бы тем же проходом, что перенес его в карантин).
+"""
+import time
+from typing import Callable, Iterable, List, Optional, Set
+
+from .storage import StoredObject
+
+QUARANTINE_DIR = '.quarantine'
+
+
+def collect_batch(storage, objects: Iterable[StoredObject], referenced: Set[str], min_age: float,
+                  dry_run: bool = True, quarantine: bool = True) -> dict:
+    """Обработка одной пачки: сироты удаляются или переносятся в карантин
+
+    Файлы моложе min_age секунд не трогаем - они могут быть еще не
+    привязаны к черновику или заметке.
+    """
+    now = time.time()
+    orphans, freed = [], 0
+    for obj in objects:
+        if obj.key in referenced or now - obj.mtime < min_age:
+            continue
+        orphans.append({'key': obj.key, 'size': obj.size})
+        freed += obj.size
+        if dry_run:
+            continue
+        if quarantine:
+            storage.move(obj.key, quarantine_key(obj.key, now))
+        else:
+            storage.delete(obj.key)
+    return {'orphans': orphans, 'bytes': freed}
+
+
+def quarantine_key(key: str, moved_at: float) -> str:
+    """Ключ файла в карантине; время переноса - первая часть пути"""
+    return f'{QUARANTINE_DIR}/{int(moved_at)}/{key}'
+
+
+def quarantined_at(obj: StoredObject) -> float:
+    """Время переноса в карантин; для файлов без метки в ключе - их mtime"""
+    stamp = obj.key.split('/')[1]
+    # Метка - unix-время (10 цифр); каталоги шардов (ab/) короче
+    return float(stamp) if stamp.isdigit() and len(stamp) >= 9 else obj.mtime
+
+
+def purge_quarantine(storage, max_age: float, batch_size: int = 500) -> int:
+    """Окончательное удаление файлов, пролежавших в карантине дольше max_age"""
+    removed, after, now = 0, None, time.time()
+    while True:
+        objects = storage.list(after, batch_size, prefix=f'{QUARANTINE_DIR}/')
+        if not objects:
+            return removed
+        for obj in objects:
+            if now - quarantined_at(obj) > max_age:
+                storage.delete(obj.key)
+                removed += 1
+        after = objects[-1].key
+
+
+def run(storage, find_referenced: Callable[[List[str]], Set[str]], batch_size: int,
+        min_age: float, dry_run: bool = True, quarantine: bool = True,
+        after: Optional[str] = None, max_batches: Optional[int] = None) -> dict:
+    """Обход хранилища пачками начиная с курсора after
+
+    find_referenced(keys) возвращает подмножество ключей, на которые есть
+    ссылки. В отчете cursor - курсор для следующего запуска (None, если
+    хранилище пройдено до конца).
+    """
+    report = {'scanned': 0, 'orphans': [], 'bytes': 0, 'cursor': after}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        objects = storage.list(report['cursor'], batch_size)
+        if not objects:
+            report['cursor'] = None
+            break
+        keys = [obj.key for obj in objects]
+        result = collect_batch(storage, objects, find_referenced(keys), min_age, dry_run, quarantine)
+        report['scanned'] += len(objects)
+        report['orphans'].extend(result['orphans'])
+        report['bytes'] += result['bytes']
+        report['cursor'] = keys[-1]
+        batches += 1
+    return report
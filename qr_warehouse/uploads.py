@@ -0,0 +1,119 @@
+"""Ключи загруженных фото и запись в хранилище"""
+import hashlib
+import io
+import json
+import logging
+import os
+import uuid
+from typing import Iterable, Optional
+
+from werkzeug.utils import secure_filename
+
+from . import config, metrics
+from .extensions import storage
+from .metrics import observe
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(filename: str) -> str:
+    """Ключ файла в uploads/: два уровня каталогов по хэшу имени (ab/cd/<имя>)"""
+    digest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+    return f'{digest[:2]}/{digest[2:4]}/{filename}'
+
+
+def upload_key(ref: str) -> str:
+    """Ключ загрузки (путь относительно uploads/) по значению из photos_json
+
+    Старые записи хранят абсолютный путь к файлу в плоском uploads/,
+    для них ключ - имя файла.
+    """
+    return os.path.basename(ref) if os.path.isabs(ref) else ref
+
+
+def upload_path(ref: str) -> str:
+    """Путь к файлу в локальном UPLOAD_FOLDER по ключу или старому абсолютному пути"""
+    return os.path.join(config.UPLOAD_FOLDER, upload_key(ref))
+
+
+def new_upload_key(suffix: str = '.jpg') -> str:
+    """Новый уникальный ключ загрузки в шардированной раскладке"""
+    return shard_key(secure_filename(f'{uuid.uuid4()}{suffix}'))
+
+
+def photo_keys(photos_json: Optional[str]) -> list:
+    """Ключи загрузок из photos_json заметки"""
+    return [upload_key(ref) for ref in json.loads(photos_json)] if photos_json else []
+
+
+def remove_files(paths: Iterable[str]):
+    """Удаление файлов, отсутствующие пропускаются"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error removing {path}: {e}")
+
+
+def remove_uploads(refs: Iterable[str]):
+    """Удаление фото из хранилища, отсутствующие пропускаются"""
+    for ref in refs:
+        try:
+            storage.delete(upload_key(ref))
+        except Exception as e:
+            logger.error(f"Error removing upload {ref}: {e}")
+
+
+def save_upload(key: str, data: bytes, kind: str, content_type: str = 'image/jpeg'):
+    """Запись фото в хранилище с учетом в метриках (kind: 'compressed' или 'original')"""
+    with observe('storage_save'):
+        storage.save(key, data, content_type)
+    metrics.UPLOAD_BYTES.labels(kind).inc(len(data))
+
+
+@observe('compress_image')
+def compress_image(file_source, target_key):
+    """Сжатие изображения до max 1600x1600, качество 80% JPEG, с записью в хранилище"""
+    from PIL import Image
+
+    try:
+        if hasattr(file_source, 'read'):  # Flask FileStorage или файловый объект
+            img = Image.open(file_source)
+        elif isinstance(file_source, str):  # Путь к файлу
+            img = Image.open(file_source)
+        else:
+            return False
+
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        width, height = img.size
+
+        max_size = 1600
+        if width > max_size or height > max_size:
+            if width > height:
+                new_width = max_size
+                new_height = int(height * (max_size / width))
+            else:
+                new_height = max_size
+                new_width = int(width * (max_size / height))
+
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+        # Сохраняем как JPEG с качеством 80%
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=80, optimize=True)
+        save_upload(target_key, buffer.getvalue(), 'compressed')
+
+        return True
+    except Exception as e:
+        logger.error(f"Error compressing image: {e}")
+        return False
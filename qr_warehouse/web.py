@@ -0,0 +1,627 @@
+"""Маршруты веб-интерфейса и API: заметки, QR-коды, файлы, webhook, статус"""
+import csv
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import traceback
+import uuid
+import zipfile
+from datetime import datetime
+
+from flask import (Blueprint, Response, current_app, jsonify, redirect, render_template, request, send_file,
+                   url_for)
+from sqlalchemy import func
+from sqlalchemy.exc import DataError
+from werkzeug.security import safe_join
+
+import build_assets
+
+from . import config, metrics, startup
+from .admin import is_admin_request
+from .background import run_telegram_coroutine, send_to_channel_bulk_sync, send_to_channel_sync
+from .bot import check_webhook_secret, enqueue_update, ensure_telegram_application, webhook_stats, webhook_status
+from .extensions import db, note_cache, scan_buffer, storage
+from .models import ChannelPost, Note
+from .notes import (bulk_insert_notes, generate_qr_code, generate_qr_codes, get_note_payload, get_note_payloads,
+                    note_version, parse_import_rows, parse_note_id, public_note, render_note_body,
+                    title_from_text)
+from .scans import last_seen, record_scan, scans_per_hour
+from .stock import bin_contents, format_location, note_locations, parse_location, update_stock
+from .storage import is_hidden_key
+from .sync import changes_since, ingest_notes, ingest_scans, is_client_note_id
+from .uploads import compress_image, new_upload_key, save_upload, shard_key
+
+bp = Blueprint('web', __name__)
+
+# Манифест собранной статики (python build_assets.py); без него отдаем исходники
+ASSET_MANIFEST = build_assets.load_manifest()
+
+# Файлы, которые service worker загружает заранее для работы без сети
+OFFLINE_ASSETS = ['css/style.css', 'js/main.js', 'js/offline.js']
+
+
+@bp.app_template_global()
+def asset_url(filename: str) -> str:
+    """URL статического файла: собранная версия с хэшем, если она есть"""
+    built = ASSET_MANIFEST.get(filename)
+    if built:
+        return url_for('web.built_asset', filename=built)
+    return url_for('static', filename=filename)
+
+
+@bp.route('/')
+def index():
+    """Главная страница с формой создания заметок"""
+    return render_template('index.html')
+
+
+def outbox_snapshot() -> dict:
+    """Глубина outbox канала и возраст самого старого сообщения"""
+    depth, oldest = db.session.query(func.count(ChannelPost.id), func.min(ChannelPost.created)).one()
+    age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+    return {
+        'qr_channel_outbox_depth': ('Недоставленные сообщения в канал', depth),
+        'qr_channel_outbox_oldest_seconds': ('Возраст самого старого сообщения в outbox', age),
+    }
+
+
+@bp.route('/sw.js')
+def service_worker():
+    """Service worker офлайн-режима
+
+    Отдается из корня, чтобы управлять всем сайтом. Перед кодом
+    подставляются адреса статики для предзагрузки (с хэшами из манифеста)
+    и версия кэша: после новой сборки файл меняется, и браузер обновляет
+    service worker.
+    """
+    precache = ['/'] + [asset_url(name) for name in OFFLINE_ASSETS]
+    version = hashlib.sha256(json.dumps(precache).encode('utf-8')).hexdigest()[:12]
+    with open(os.path.join(current_app.static_folder, 'js', 'sw.js'), encoding='utf-8') as f:
+        source = f.read()
+    header = (f"const CACHE_VERSION = {json.dumps(version)};\n"
+              f"const PRECACHE_URLS = {json.dumps(precache)};\n"
+              f"const OFFLINE_SCRIPT = {json.dumps(asset_url('js/offline.js'))};\n")
+    response = Response(header + source, mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Метрики в формате Prometheus (со всех воркеров gunicorn)"""
+    body, content_type = metrics.render(metrics.SnapshotCollector(outbox_snapshot))
+    return Response(body, content_type=content_type)
+
+
+@bp.route('/status')
+def status():
+    """Возвращает JSON со статусом сервиса"""
+    try:
+        note_count = Note.query.count()
+        return jsonify({
+            'status': 'ok',
+            'service': 'QR Warehouse Notes',
+            'notes_count': note_count,
+            'webhook': webhook_status(),
+            'startup_ms': startup.timer.report(),
+            'note_cache': {
+                'size': len(note_cache),
+                'hits': note_cache.hits,
+                'misses': note_cache.misses
+            },
+            'scan_buffer': {
+                'size': len(scan_buffer),
+                'dropped': scan_buffer.dropped
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/create_note', methods=['POST'])
+def create_note():
+    """Создание заметки через веб-интерфейс
+
+    Необязательное поле ``id`` (UUID) задает id заметки на устройстве -
+    так офлайн-клиент повторяет отправку без дубликатов: заметка с уже
+    существующим id не создается повторно.
+    """
+    try:
+        text = request.form.get('text', '')
+        photos = request.files.getlist('photos')
+        client_id = request.form.get('id')
+        if client_id is not None:
+            if not is_client_note_id(client_id):
+                return jsonify({'error': 'Некорректный id заметки'}), 400
+            client_id = client_id.lower()
+            if db.session.get(Note, client_id) is not None:
+                return jsonify({
+                    'message': 'Заметка уже создана',
+                    'note_id': client_id,
+                    'qr_url': f'http://192.168.1.178:5000/qr?data=qrapp:note:{client_id}'
+                })
+
+        # Валидация
+        if len(text) > 4096:
+            return jsonify({'error': 'Текст заметки превышает 4096 символов'}), 400
+
+        if not text.strip() and not photos:
+            return jsonify({'error': 'Необходимо указать текст или добавить фото'}), 400
+
+        if len(photos) > 5:
+            return jsonify({'error': 'Максимум 5 фотографий'}), 400
+
+        # Получаем title из первой строки текста
+        title = title_from_text(text)
+
+        # Сохраняем фото со сжатием
+        photo_paths = []
+        for photo in photos:
+            if photo.filename:
+                # Всегда сохраняем как .jpg
+                file_key = new_upload_key()
+
+                # Сжимаем изображение
+                if compress_image(photo, file_key):
+                    photo_paths.append(file_key)
+                else:
+                    # Если сжатие не удалось, пробуем сохранить оригинал
+                    try:
+                        photo.seek(0)
+                        save_upload(file_key, photo.read(), 'original', photo.mimetype or 'image/jpeg')
+                        photo_paths.append(file_key)
+                    except Exception as e:
+                        current_app.logger.error(f"Error saving image: {e}")
+                        continue
+
+        # Создаем заметку
+        note = Note(
+            id=client_id or str(uuid.uuid4()),
+            title=title,
+            text=text,
+            photos_json=json.dumps(photo_paths) if photo_paths else None,
+            user_id=config.ALLOWED_USER_ID
+        )
+
+        db.session.add(note)
+        db.session.commit()
+
+        # Отправляем в Telegram канал
+        send_to_channel_sync(text, photo_paths)
+
+        # Генерируем QR-код с форматом "qrapp:note:<id>"
+        qr_data = f"qrapp:note:{note.id}"
+
+        return jsonify({
+            'message': 'Заметка создана успешно',
+            'note_id': note.id,
+            'qr_url': f'http://192.168.1.178:5000/qr?data={qr_data}'
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Error creating note: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Ошибка при создании заметки: {str(e)}'}), 500
+
+
+@bp.route('/bulk_create_notes', methods=['POST'])
+def bulk_create_notes():
+    """Массовое создание заметок (импорт из JSON, JSONL или CSV)
+
+    Тело запроса: JSON-массив объектов {title, text, location, quantity}
+    (адрес ячейки и количество необязательны), либо файл в поле
+    ``file`` (multipart), либо сырое тело с Content-Type text/csv или
+    application/x-ndjson. С параметром ``?labels=zip`` в ответ отдается
+    ZIP-архив с QR-кодами созданных заметок. Требует
+    ``Authorization: Bearer <ADMIN_TOKEN>``.
+    """
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        if request.is_json:
+            data = request.get_json()
+            rows = data.get('notes') if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                return jsonify({'error': 'Ожидается список заметок'}), 400
+            bad = next((index for index, row in enumerate(rows) if not isinstance(row, dict)), None)
+            if bad is not None:
+                return jsonify({'error': f'Элемент {bad} списка заметок должен быть объектом'}), 400
+        else:
+            upload = request.files.get('file')
+            if upload:
+                fmt = 'csv' if upload.filename.lower().endswith('.csv') else 'jsonl'
+                stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig')
+            else:
+                fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+                stream = io.StringIO(request.get_data(as_text=True))
+            rows = list(parse_import_rows(stream, fmt))
+
+        if not rows:
+            return jsonify({'error': 'Нет заметок для импорта'}), 400
+        if len(rows) > config.BULK_MAX_NOTES:
+            return jsonify({'error': f'Максимум {config.BULK_MAX_NOTES} заметок за запрос'}), 400
+
+        created, errors = bulk_insert_notes(rows, config.ALLOWED_USER_ID)
+
+        send_to_channel_bulk_sync([note['text'] or note['title'] for note in created])
+
+        if request.args.get('labels') == 'zip':
+            pngs = generate_qr_codes([f"qrapp:note:{note['id']}" for note in created])
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+                for note, png in zip(created, pngs):
+                    zf.writestr(f"{note['id']}.png", png)
+            archive.seek(0)
+            return send_file(archive, mimetype='application/zip', as_attachment=True,
+                             download_name='qr_labels.zip')
+
+        return jsonify({
+            'message': 'Импорт завершен',
+            'created': len(created),
+            'note_ids': [note['id'] for note in created],
+            'errors': errors
+        })
+
+    except (ValueError, csv.Error) as e:
+        return jsonify({'error': f'Ошибка разбора данных: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in bulk note creation: {e}")
+        return jsonify({'error': f'Ошибка при импорте заметок: {str(e)}'}), 500
+
+
+@bp.route('/open_qr', methods=['POST'])
+def open_qr():
+    """Открытие заметки по QR-коду
+
+    Необязательные поля ``device`` и ``location`` (где отсканирован код)
+    попадают в журнал сканирований.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid JSON'}), 400
+
+        qr_data = data.get('data', '')
+        if not qr_data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        note_id = parse_note_id(qr_data)
+        note = get_note_payload(note_id)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        record_scan(note_id, data.get('device'), data.get('location'))
+        return jsonify(public_note(note)), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/open_qr_batch', methods=['POST'])
+def open_qr_batch():
+    """Открытие пачки заметок по нескольким отсканированным QR-кодам
+
+    Тело: {"data": ["qrapp:note:<id>", ...], "device": ..., "location": ...}.
+    Все заметки загружаются одним запросом с IN, ответ - словарь
+    результатов по исходным строкам. Найденные заметки попадают в журнал
+    сканирований с общими device и location.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Invalid JSON'}), 400
+
+        payloads = data.get('data')
+        if not isinstance(payloads, list) or not payloads:
+            return jsonify({'error': 'No data provided'}), 400
+        if len(payloads) > config.OPEN_QR_BATCH_MAX:
+            return jsonify({'error': f'Максимум {config.OPEN_QR_BATCH_MAX} кодов за запрос'}), 400
+        if not all(isinstance(payload, str) for payload in payloads):
+            return jsonify({'error': 'Each scanned payload must be a string'}), 400
+
+        ids = {payload: parse_note_id(payload) for payload in payloads}
+        by_id = {note_id: public_note(note)
+                 for note_id, note in get_note_payloads(ids.values()).items()}
+
+        for note_id in by_id:
+            record_scan(note_id, data.get('device'), data.get('location'))
+
+        results = {payload: by_id.get(note_id) for payload, note_id in ids.items()}
+        return jsonify({
+            'results': results,
+            'not_found': [payload for payload, note in results.items() if note is None]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/sync', methods=['POST'])
+def sync_offline_queue():
+    """Прием очереди офлайн-клиента одним запросом
+
+    Тело: {"device": ..., "notes": [{"id": <uuid>, "text": ..., "created": ...}],
+    "scans": [{"data": "qrapp:note:<id>", "location": ..., "scanned_at": ...}]}.
+    Время - мс с начала эпохи или ISO 8601. Заметки создаются раньше
+    сканирований, поэтому сканирование заметки, созданной офлайн, в той же
+    пачке найдет ее.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid JSON'}), 400
+    notes, scans = data.get('notes') or [], data.get('scans') or []
+    if not isinstance(notes, list) or not isinstance(scans, list):
+        return jsonify({'error': 'Fields "notes" and "scans" must be lists'}), 400
+    if len(notes) + len(scans) > config.SYNC_BATCH_MAX:
+        return jsonify({'error': f'Максимум {config.SYNC_BATCH_MAX} элементов за запрос'}), 400
+
+    # Текст ошибки БД (SQL и параметры) клиенту не отдаем. Значение, которое БД не
+    # принимает (DataError), - 422: клиент отбросит пачку, повтор не поможет. Прочие
+    # ошибки (БД недоступна, конфликт id, оставшийся после повтора в ingest_notes) -
+    # 500: клиент сохранит очередь и повторит позже
+    try:
+        notes_result, created = ingest_notes(notes, config.ALLOWED_USER_ID)
+    except DataError as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Rejected offline notes batch: {e}")
+        return jsonify({'error': 'Пачка заметок не принята: некорректные данные'}), 422
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error syncing offline notes: {e}")
+        return jsonify({'error': 'Ошибка при сохранении заметок'}), 500
+    if created:
+        send_to_channel_bulk_sync([note['text'] or note['title'] for note in created])
+
+    device = data.get('device') if isinstance(data.get('device'), str) else None
+    return jsonify({'notes': notes_result, 'scans': ingest_scans(scans, device)}), 200
+
+
+@bp.route('/sync', methods=['GET'])
+def sync_changes():
+    """Изменения каталога для локальной копии на устройстве, постранично
+
+    Параметры: ``since`` - курсор из предыдущего ответа (без него выгружаются
+    все заметки), ``limit`` - размер страницы. Ответ: {"notes": [...],
+    "deleted": [<id>, ...], "cursor": ..., "has_more": ...}; пока has_more,
+    следующая страница запрашивается сразу с новым курсором.
+    """
+    limit = request.args.get('limit', config.SYNC_PAGE_SIZE, type=int)
+    if not 1 <= limit <= config.SYNC_PAGE_MAX:
+        return jsonify({'error': f'Parameter "limit" must be between 1 and {config.SYNC_PAGE_MAX}'}), 400
+    try:
+        return jsonify(changes_since(request.args.get('since'), limit)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/scans/last_seen')
+def scans_last_seen():
+    """Последнее известное место заметок по журналу сканирований
+
+    Параметр ``note_id`` повторяется для каждой заметки (или передается
+    ``data`` - содержимое QR-кода). Заметки, которые еще не сканировали с
+    указанием места, возвращаются с null.
+    """
+    note_ids = request.args.getlist('note_id') + [parse_note_id(data) for data in request.args.getlist('data')]
+    if not note_ids:
+        return jsonify({'error': 'Parameter "note_id" is required'}), 400
+    if len(note_ids) > config.OPEN_QR_BATCH_MAX:
+        return jsonify({'error': f'Максимум {config.OPEN_QR_BATCH_MAX} заметок за запрос'}), 400
+
+    seen = last_seen(note_ids)
+    return jsonify({'results': {note_id: seen.get(note_id) for note_id in note_ids}}), 200
+
+
+@bp.route('/scans/per_hour')
+def scans_per_hour_stats():
+    """Число сканирований по часам (UTC)
+
+    Параметры: ``hours`` - период в часах (по умолчанию 24); ``note_id`` -
+    только сканирования одной заметки.
+    """
+    hours = request.args.get('hours', 24, type=int)
+    if not 1 <= hours <= config.SCAN_STATS_MAX_HOURS:
+        return jsonify({'error': f'Parameter "hours" must be between 1 and {config.SCAN_STATS_MAX_HOURS}'}), 400
+
+    buckets = scans_per_hour(hours, request.args.get('note_id') or None)
+    return jsonify({'hours': buckets, 'total': sum(bucket['scans'] for bucket in buckets)}), 200
+
+
+@bp.route('/bin/<location>')
+def view_bin(location):
+    """Что лежит в ячейке; адрес можно сократить до зоны, ряда или полки (A-03)"""
+    try:
+        parts = parse_location(location, partial=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    items = bin_contents(parts)
+    return jsonify({
+        'location': format_location(parts),
+        'items': items,
+        'total_quantity': sum(item['quantity'] for item in items),
+        'truncated': len(items) >= config.BIN_CONTENTS_LIMIT
+    }), 200
+
+
+@bp.route('/note/<note_id>/locations')
+def get_note_locations(note_id):
+    """Где лежит товар заметки: ячейки и количество в каждой"""
+    if not get_note_payload(note_id):
+        return jsonify({'error': 'Note not found'}), 404
+
+    locations = note_locations(note_id)
+    return jsonify({
+        'note_id': note_id,
+        'locations': locations,
+        'total_quantity': sum(location['quantity'] for location in locations)
+    }), 200
+
+
+@bp.route('/note/<note_id>/locations', methods=['POST'])
+def set_note_location(note_id):
+    """Размещение товара в ячейке
+
+    Тело: {"location": "A-03-2-B", "quantity": 10} - установить количество
+    или {"location": ..., "delta": -2} - изменить его. Нулевое количество
+    убирает товар из ячейки.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid JSON'}), 400
+    quantity, delta = data.get('quantity'), data.get('delta')
+    if any(value is not None and (isinstance(value, bool) or not isinstance(value, int))
+           for value in (quantity, delta)):
+        return jsonify({'error': 'Quantity and delta must be integers'}), 400
+
+    try:
+        new_quantity = update_stock(note_id, data.get('location'), quantity, delta)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if new_quantity is None:
+        return jsonify({'error': 'Note not found'}), 404
+
+    return jsonify({
+        'note_id': note_id,
+        'location': format_location(parse_location(data['location'])),
+        'quantity': new_quantity
+    }), 200
+
+
+@bp.route('/note/<note_id>')
+def view_note_page(note_id):
+    """Страница заметки для просмотра в браузере"""
+    note = get_note_payload(note_id)
+    if not note:
+        return jsonify({'error': 'Note not found'}), 404
+
+    version = note_version(note)
+    if request.if_none_match.contains(version):
+        return Response(status=304, headers={'ETag': f'"{version}"'})
+
+    body = render_note_body(note, version)
+    response = Response(render_template('note.html', title=note['title'], body=body),
+                        mimetype='text/html')
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@bp.route('/webhook', methods=['POST'])
+def telegram_webhook():
+    """Прием обновлений Telegram Bot API
+
+    Секрет передается Telegram в заголовке X-Telegram-Bot-Api-Secret-Token
+    (задается при setWebhook). При заполненной очереди отвечаем 429, и
+    Telegram доставит обновление повторно.
+    """
+    if not check_webhook_secret(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        webhook_stats['invalid'] += 1
+        return jsonify({'error': 'Invalid JSON'}), 400
+
+    try:
+        ensure_telegram_application()
+        accepted = run_telegram_coroutine(enqueue_update(payload)).result(config.WEBHOOK_ENQUEUE_TIMEOUT)
+    except Exception as e:
+        current_app.logger.error(f"Error processing update: {e}")
+        return jsonify({'error': str(e)}), 503
+
+    if not accepted:
+        return jsonify({'error': 'Too Many Requests'}), 429, {'Retry-After': '1'}
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/qr')
+def qr_generator():
+    """Генерация QR-кода в памяти"""
+    data = request.args.get('data', '')
+    if not data:
+        return jsonify({'error': 'Parameter "data" is required'}), 400
+
+    qr_image = generate_qr_code(data)
+    qr_image.seek(0)  # Возвращаемся в начало BytesIO
+    return send_file(qr_image, mimetype='image/png', as_attachment=False, download_name=f'qr_{data[:10]}.png')
+
+
+@bp.route('/uploads/<path:key>')
+def uploaded_file(key):
+    """Раздача загруженных файлов по ключу (ab/cd/<имя>)
+
+    ETag - ключ (имена уникальны), поддерживаются условные запросы и
+    Range. В режиме UPLOAD_OFFLOAD отдача файла передается прокси.
+    Старые ссылки вида /uploads/<имя> находят файл и после миграции.
+    Для внешнего хранилища (S3) - редирект на подписанную ссылку, байты
+    фото через воркеры не проходят. Служебные ключи (карантин сборщика
+    мусора .quarantine/) не отдаются.
+    """
+    if is_hidden_key(key):
+        return jsonify({'error': 'File not found'}), 404
+    presigned_url = storage.url(key)
+    if presigned_url is not None:
+        response = redirect(presigned_url)
+        # Кэшировать редирект можно, пока ссылка заведомо действительна
+        response.headers['Cache-Control'] = f'private, max-age={config.S3_PRESIGN_TTL // 2}'
+        return response
+
+    file_path = safe_join(current_app.config['UPLOAD_FOLDER'], key)
+    if '/' not in key and (file_path is None or not os.path.isfile(file_path)):
+        key = shard_key(key)
+        file_path = safe_join(current_app.config['UPLOAD_FOLDER'], key)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+
+    if config.UPLOAD_OFFLOAD == 'x-accel':
+        response = Response(mimetype=mimetypes.guess_type(key)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = config.UPLOAD_ACCEL_PREFIX.rstrip('/') + '/' + key
+        response.set_etag(key)
+    else:
+        response = send_file(file_path, conditional=True, etag=key, max_age=config.UPLOAD_MAX_AGE)
+
+    response.headers['Cache-Control'] = f'public, max-age={config.UPLOAD_MAX_AGE}, immutable'
+    return response
+
+
+@bp.route('/assets/<path:filename>')
+def built_asset(filename):
+    """Раздача собранной статики с выбором предсжатого варианта по Accept-Encoding"""
+    file_path = safe_join(str(build_assets.DIST_DIR), filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.isfile(file_path + suffix):
+            encoding, file_path = candidate, file_path + suffix
+            break
+
+    response = send_file(file_path, mimetype=mimetype, conditional=True, max_age=config.UPLOAD_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={config.UPLOAD_MAX_AGE}, immutable'
+    return response
+
+
+# Обработчики ошибок HTTP
+@bp.app_errorhandler(404)
+def handle_404(e):
+    """Обработчик ошибки 404 - возвращает JSON"""
+    return jsonify({'error': 'Not Found', 'status_code': 404}), 404
+
+
+@bp.app_errorhandler(405)
+def handle_405(e):
+    """Обработчик ошибки 405 - возвращает JSON"""
+    return jsonify({'error': 'Method Not Allowed', 'status_code': 405}), 405
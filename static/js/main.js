@@ -3,6 +3,12 @@ const API_BASE = 'http://192.168.1.178:5000'; // адрес твоего Flask-
 
 let html5QrCode = null;
 
+// Без сети заметки и сканирования копятся в IndexedDB (offline.js) и
+// отправляются пачкой, когда сеть появится
+const offline = window.QROffline || null;
+const SYNC_RETRY_INTERVAL = 30000;
+let deviceId = null;  // id устройства для журнала сканирований
+
 // Инициализация при загрузке страницы
 document.addEventListener('DOMContentLoaded', function() {
     initializeApp();
@@ -13,6 +19,71 @@ function initializeApp() {
     initializeCharCounter();
     initializeFilePreview();
     initializeSmoothScroll();
+    initializeScanLocation();
+    initializeOffline();
+    handleConnectivity();
+}
+
+// Service worker: кэш страниц и статики, фоновая отправка очереди
+function initializeOffline() {
+    if (!offline) {
+        return;
+    }
+    offline.getDeviceId()
+        .then(id => { deviceId = id; })
+        .catch(err => console.error('Device id error', err));
+    if (!('serviceWorker' in navigator)) {
+        return;
+    }
+    navigator.serviceWorker.register(`/sw.js?api=${encodeURIComponent(API_BASE)}`)
+        .catch(err => console.error('Service worker registration failed', err));
+}
+
+// Просим браузер отправить очередь, когда появится сеть (даже если вкладку закроют)
+async function requestBackgroundSync() {
+    if (!('serviceWorker' in navigator) || !('SyncManager' in window)) {
+        return;
+    }
+    try {
+        const registration = await navigator.serviceWorker.ready;
+        await registration.sync.register(offline.SYNC_TAG);
+    } catch (err) {
+        console.error('Background sync registration failed', err);
+    }
+}
+
+// Отправка очереди со страницы; ошибки сети не показываем - повторим позже
+async function syncOfflineQueue() {
+    if (!offline || !navigator.onLine) {
+        return;
+    }
+    try {
+        const synced = await offline.syncNow(API_BASE);
+        if (synced) {
+            showNotice(`Отправлено из очереди: ${synced}`);
+        }
+    } catch (err) {
+        console.warn('Offline queue sync failed', err);
+    }
+}
+
+// Сетевая ошибка fetch (нет связи), в отличие от ответа сервера с ошибкой
+function isNetworkError(error) {
+    return error instanceof TypeError || !navigator.onLine;
+}
+
+// Ячейка, в которой идет сканирование, запоминается между сканированиями
+function initializeScanLocation() {
+    const input = document.getElementById('scan-location');
+    if (input) {
+        input.value = localStorage.getItem('qr-scan-location') || '';
+        input.addEventListener('change', () => localStorage.setItem('qr-scan-location', input.value.trim()));
+    }
+}
+
+function currentScanLocation() {
+    const input = document.getElementById('scan-location');
+    return input && input.value.trim() ? input.value.trim() : null;
 }
 
 // Обработчики формы
@@ -125,6 +196,11 @@ async function handleFormSubmit(e) {
     submitBtn.innerHTML = ' Создание...';
     submitBtn.disabled = true;
 
+    if (offline && !navigator.onLine) {
+        await queueNoteOffline(text, files, submitBtn, originalText);
+        return;
+    }
+
     try {
         const response = await fetch(`${API_BASE}/create_note`, {
             method: 'POST',
@@ -136,10 +212,7 @@ async function handleFormSubmit(e) {
             showQRResult(data.qr_url, data.note_id);
 
             // Очищаем форму
-            document.getElementById('note-form').reset();
-            document.getElementById('preview-images').innerHTML = '';
-            document.getElementById('char-count').textContent = '0 / 4096';
-            document.getElementById('char-count').classList.remove('warning');
+            resetNoteForm();
 
             // Прокручиваем к результату
             setTimeout(() => {
@@ -153,6 +226,10 @@ async function handleFormSubmit(e) {
         }
     } catch (error) {
         console.error('Form submission error:', error);
+        if (offline && isNetworkError(error)) {
+            await queueNoteOffline(text, files, submitBtn, originalText);
+            return;
+        }
         showError('Ошибка сети: ' + error.message);
     } finally {
         // Восстанавливаем кнопку
@@ -161,6 +238,29 @@ async function handleFormSubmit(e) {
     }
 }
 
+// Сохранение заметки на устройстве до появления сети
+async function queueNoteOffline(text, files, submitBtn, originalText) {
+    try {
+        const noteId = await offline.queueNote(text, files);
+        resetNoteForm();
+        showNotice(`Нет сети: заметка сохранена на устройстве и будет отправлена автоматически (ID ${noteId})`);
+        requestBackgroundSync();
+    } catch (error) {
+        console.error('Offline queue error:', error);
+        showError('Не удалось сохранить заметку на устройстве: ' + error.message);
+    } finally {
+        submitBtn.innerHTML = originalText;
+        submitBtn.disabled = false;
+    }
+}
+
+function resetNoteForm() {
+    document.getElementById('note-form').reset();
+    document.getElementById('preview-images').innerHTML = '';
+    document.getElementById('char-count').textContent = '0 / 4096';
+    document.getElementById('char-count').classList.remove('warning');
+}
+
 // Прокрутка к форме
 function scrollToForm() {
     document.getElementById('create-form').scrollIntoView({
@@ -223,33 +323,64 @@ function onScanSuccess(decodedText, decodedResult) {
         navigator.vibrate(200);
     }
 
+    const location = currentScanLocation();
+    if (offline && !navigator.onLine) {
+        openNoteOffline(decodedText, location);
+        return;
+    }
+
     // Отправляем запрос на открытие заметки
     fetch(`${API_BASE}/open_qr`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ data: decodedText })
+        body: JSON.stringify({ data: decodedText, device: deviceId, location })
     })
         .then(response => {
             if (response.ok) {
-                return response.text(); // /open_qr возвращает HTML
+                return response.json(); // /open_qr возвращает JSON заметки
             } else {
                 return response.json().then(err => Promise.reject(err));
             }
         })
-        .then(html => {
+        .then(note => {
+            if (offline) {
+                offline.cacheNote(note).catch(err => console.error('Note cache error', err));
+            }
             closeQRScanner();
 
-            // Открываем в новом окне для лучшего UX
-            const newWindow = window.open('', '_blank');
-            newWindow.document.write(html);
-            newWindow.document.close();
+            // Открываем страницу заметки в новом окне для лучшего UX
+            window.open(`${API_BASE}/note/${encodeURIComponent(note.id)}`, '_blank');
         })
         .catch(error => {
+            if (offline && isNetworkError(error)) {
+                openNoteOffline(decodedText, location);
+                return;
+            }
             console.error('QR scan error:', error);
             showScannerError(error.error || 'Не удалось загрузить заметку');
         });
 }
 
+// Без сети: сканирование в очередь, заметка - из кэша устройства, если ее уже открывали
+async function openNoteOffline(decodedText, location) {
+    try {
+        await offline.queueScan(decodedText, location);
+        requestBackgroundSync();
+        const note = await offline.getCachedNote(offline.parseNoteId(decodedText));
+        if (note) {
+            showScannerSuccess(
+                `<b>${escapeHtml(note.title)}</b><br>${escapeHtml(note.text || '').replace(/\n/g, '<br>')}` +
+                '<br><small>Нет сети: заметка из кэша устройства, сканирование будет отправлено позже</small>'
+            );
+        } else {
+            showScannerError('Нет сети, а заметки нет в кэше устройства. Сканирование сохранено и будет отправлено позже');
+        }
+    } catch (error) {
+        console.error('Offline scan error:', error);
+        showScannerError('Нет сети: не удалось сохранить сканирование на устройстве');
+    }
+}
+
 function onScanFailure(error) {
     // Игнорируем ошибки сканирования для лучшего UX
     // console.error('QR scan failure:', error);
@@ -283,3 +414,103 @@ function showQRResult(qrUrl, noteId) {
         };
     }
 }
+
+// Ошибки
+function showError(message) {
+    const errorDiv = document.getElementById('error-message');
+    errorDiv.textContent = message;
+    errorDiv.classList.remove('notice');
+    errorDiv.style.display = 'block';
+
+    errorDiv.scrollIntoView({
+        behavior: 'smooth',
+        block: 'center'
+    });
+
+    setTimeout(() => {
+        errorDiv.style.display = 'none';
+    }, 6000);
+}
+
+function showScannerSuccess(message) {
+    const resultDiv = document.getElementById('scanner-result');
+    resultDiv.className = 'scanner-result success';
+    resultDiv.innerHTML = `<i class="fas fa-check-circle"></i> ${message}`;
+    resultDiv.style.display = 'block';
+}
+
+function showScannerError(message) {
+    const resultDiv = document.getElementById('scanner-result');
+    resultDiv.className = 'scanner-result error';
+    resultDiv.innerHTML = `<i class="fas fa-exclamation-circle"></i> ${message}`;
+    resultDiv.style.display = 'block';
+}
+
+// Уведомление (зеленое) в том же блоке, что и ошибки
+function showNotice(message) {
+    const noticeDiv = document.getElementById('error-message');
+    noticeDiv.textContent = message;
+    noticeDiv.classList.add('notice');
+    noticeDiv.style.display = 'block';
+
+    setTimeout(() => {
+        noticeDiv.style.display = 'none';
+        noticeDiv.classList.remove('notice');
+    }, 6000);
+}
+
+// Индикатор онлайн/офлайн и размер очереди; при появлении сети - отправка очереди
+function handleConnectivity() {
+    const statusIndicator = document.createElement('div');
+    statusIndicator.id = 'connectivity-status';
+    statusIndicator.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        padding: 10px 15px;
+        border-radius: 20px;
+        font-size: 0.9rem;
+        font-weight: 600;
+        z-index: 1001;
+        transition: all 0.3s ease;
+    `;
+
+    document.body.appendChild(statusIndicator);
+
+    async function updateStatus() {
+        const pending = offline ? await offline.pendingCount().catch(() => 0) : 0;
+        const queued = pending ? ` · в очереди: ${pending}` : '';
+        if (navigator.onLine) {
+            statusIndicator.textContent = `🟢 Онлайн${queued}`;
+            statusIndicator.style.background = '#d4edda';
+            statusIndicator.style.color = '#155724';
+        } else {
+            statusIndicator.textContent = `🔴 Офлайн${queued}`;
+            statusIndicator.style.background = '#f8d7da';
+            statusIndicator.style.color = '#721c24';
+        }
+    }
+
+    window.addEventListener('online', () => {
+        updateStatus();
+        syncOfflineQueue();
+    });
+    window.addEventListener('offline', updateStatus);
+    if (offline) {
+        offline.onChange(updateStatus);
+        // navigator.onLine бывает true и без связи с сервером (Wi-Fi без маршрута),
+        // поэтому непустую очередь периодически пробуем отправить
+        setInterval(syncOfflineQueue, SYNC_RETRY_INTERVAL);
+        syncOfflineQueue();
+    }
+    updateStatus();
+}
+
+// Экранирование HTML
+function escapeHtml(str) {
+    return String(str)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
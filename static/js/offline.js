@@ -0,0 +1,282 @@
+// QR Warehouse Notes - офлайн-режим: кэш заметок и очередь в IndexedDB, пакетная синхронизация
+// Подключается и страницей, и service worker (importScripts), поэтому не обращается к DOM.
+(function (global) {
+    'use strict';
+
+    const DB_NAME = 'qr-warehouse';
+    const DB_VERSION = 1;
+    const NOTE_CACHE_LIMIT = 500;   // сколько последних открытых заметок хранить
+    const SYNC_BATCH = 200;         // элементов очереди в одном запросе /sync
+    const LOCK_NAME = 'qr-warehouse-sync';
+
+    let dbPromise = null;
+
+    function requestToPromise(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function transactionDone(tx) {
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = () => resolve();
+            tx.onabort = tx.onerror = () => reject(tx.error);
+        });
+    }
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    // Открытые заметки: id -> заметка и время помещения в кэш
+                    const notes = db.createObjectStore('notes', { keyPath: 'id' });
+                    notes.createIndex('cachedAt', 'cachedAt');
+                    // Очередь на отправку: сканирования и заметки, созданные без сети
+                    db.createObjectStore('queue', { keyPath: 'key', autoIncrement: true });
+                    // Служебные значения (id устройства)
+                    db.createObjectStore('meta');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => {
+                    dbPromise = null;
+                    reject(request.error);
+                };
+            });
+        }
+        return dbPromise;
+    }
+
+    async function store(name, mode) {
+        const db = await openDb();
+        const tx = db.transaction(name, mode);
+        return { tx, store: tx.objectStore(name) };
+    }
+
+    function newId() {
+        if (global.crypto && global.crypto.randomUUID) {
+            return global.crypto.randomUUID();
+        }
+        // Без безопасного контекста randomUUID нет - собираем UUID v4 вручную
+        const bytes = global.crypto.getRandomValues(new Uint8Array(16));
+        bytes[6] = (bytes[6] & 0x0f) | 0x40;
+        bytes[8] = (bytes[8] & 0x3f) | 0x80;
+        const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+    }
+
+    function parseNoteId(qrData) {
+        const data = String(qrData || '').trim();
+        if (data.startsWith('qrapp:note:')) return data.slice('qrapp:note:'.length);
+        if (data.startsWith('note:')) return data.slice('note:'.length);
+        return data;
+    }
+
+    // Постоянный id устройства - поле device в журнале сканирований
+    async function getDeviceId() {
+        const { tx, store: meta } = await store('meta', 'readwrite');
+        let deviceId = await requestToPromise(meta.get('deviceId'));
+        if (!deviceId) {
+            deviceId = `web-${newId().slice(0, 8)}`;
+            meta.put(deviceId, 'deviceId');
+        }
+        await transactionDone(tx);
+        return deviceId;
+    }
+
+    // === Кэш заметок ===
+
+    async function cacheNotes(notes) {
+        if (!notes.length) return;
+        const { tx, store: cache } = await store('notes', 'readwrite');
+        const now = Date.now();
+        notes.forEach(note => cache.put(Object.assign({}, note, { cachedAt: now })));
+
+        // Вытесняем самые давние записи сверх лимита
+        const count = await requestToPromise(cache.count());
+        let excess = count - NOTE_CACHE_LIMIT;
+        if (excess > 0) {
+            const cursorRequest = cache.index('cachedAt').openCursor();
+            cursorRequest.onsuccess = () => {
+                const cursor = cursorRequest.result;
+                if (cursor && excess > 0) {
+                    cursor.delete();
+                    excess--;
+                    cursor.continue();
+                }
+            };
+        }
+        await transactionDone(tx);
+    }
+
+    function cacheNote(note) {
+        return cacheNotes([note]);
+    }
+
+    async function getCachedNote(noteId) {
+        const { store: cache } = await store('notes', 'readonly');
+        return requestToPromise(cache.get(noteId));
+    }
+
+    // === Очередь ===
+
+    async function enqueue(item) {
+        const { tx, store: queue } = await store('queue', 'readwrite');
+        queue.add(item);
+        await transactionDone(tx);
+        notifyChange();
+    }
+
+    function queueScan(qrData, location) {
+        return enqueue({
+            type: 'scan',
+            data: String(qrData),
+            location: location || null,
+            scannedAt: Date.now(),
+        });
+    }
+
+    // photos - File/Blob; IndexedDB хранит их как есть
+    async function queueNote(text, photos) {
+        const id = newId();
+        await enqueue({
+            type: 'note',
+            id,
+            text: text || '',
+            photos: Array.from(photos || []).slice(0, 5),
+            created: Date.now(),
+        });
+        return id;
+    }
+
+    async function readQueue(limit) {
+        const { store: queue } = await store('queue', 'readonly');
+        return requestToPromise(queue.getAll(null, limit));
+    }
+
+    async function removeFromQueue(keys) {
+        if (!keys.length) return;
+        const { tx, store: queue } = await store('queue', 'readwrite');
+        keys.forEach(key => queue.delete(key));
+        await transactionDone(tx);
+        notifyChange();
+    }
+
+    async function pendingCount() {
+        const { store: queue } = await store('queue', 'readonly');
+        return requestToPromise(queue.count());
+    }
+
+    // Подписчики на изменение очереди (индикатор на странице)
+    const listeners = [];
+
+    function onChange(listener) {
+        listeners.push(listener);
+    }
+
+    function notifyChange() {
+        listeners.forEach(listener => {
+            try {
+                listener();
+            } catch (error) {
+                console.error('Offline queue listener error:', error);
+            }
+        });
+    }
+
+    // === Синхронизация ===
+
+    class SyncError extends Error {}
+
+    // Ошибка сети или сервера (5xx) - очередь остается до следующей попытки;
+    // 4xx - данные не будут приняты и при повторе, элементы удаляются
+    async function checkResponse(response, keys) {
+        if (response.ok) return response.json();
+        if (response.status >= 400 && response.status < 500) {
+            const body = await response.text();
+            console.error('Sync rejected:', response.status, body);
+            await removeFromQueue(keys);
+            return null;
+        }
+        throw new SyncError(`Сервер ответил ${response.status}`);
+    }
+
+    // Заметки с фото - по одной через /create_note (multipart), с id из очереди,
+    // поэтому повторная отправка после обрыва не создает дубликат
+    async function syncPhotoNote(apiBase, item) {
+        const formData = new FormData();
+        formData.append('id', item.id);
+        formData.append('text', item.text);
+        item.photos.forEach((photo, index) => formData.append('photos', photo, photo.name || `photo-${index}.jpg`));
+        const response = await fetch(`${apiBase}/create_note`, { method: 'POST', body: formData });
+        await checkResponse(response, [item.key]);
+        if (response.ok) await removeFromQueue([item.key]);
+    }
+
+    async function syncBatch(apiBase, items) {
+        const keys = items.map(item => item.key);
+        const response = await fetch(`${apiBase}/sync`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                device: await getDeviceId(),
+                notes: items.filter(item => item.type === 'note')
+                    .map(item => ({ id: item.id, text: item.text, created: item.created })),
+                scans: items.filter(item => item.type === 'scan')
+                    .map(item => ({ data: item.data, location: item.location, scanned_at: item.scannedAt })),
+            }),
+        });
+        const result = await checkResponse(response, keys);
+        if (!result) return;
+        await removeFromQueue(keys);
+        // Сервер возвращает заметки по отсканированным кодам - обновляем кэш
+        await cacheNotes(Object.values(result.scans.notes || {}));
+    }
+
+    function withLock(task) {
+        // Страница и service worker не должны отправлять одну очередь одновременно
+        if (global.navigator && global.navigator.locks) {
+            return global.navigator.locks.request(LOCK_NAME, task);
+        }
+        return task();
+    }
+
+    // Отправка всей очереди пачками; возвращает число отправленных элементов
+    function syncNow(apiBase) {
+        return withLock(async () => {
+            let synced = 0;
+            for (;;) {
+                const items = await readQueue(SYNC_BATCH);
+                if (!items.length) break;
+                // Сначала заметки с фото: сканирования в той же пачке могут на них ссылаться
+                const photoNotes = items.filter(item => item.type === 'note' && item.photos.length);
+                for (const item of photoNotes) {
+                    await syncPhotoNote(apiBase, item);
+                }
+                const batch = items.filter(item => !photoNotes.includes(item));
+                if (batch.length) {
+                    await syncBatch(apiBase, batch);
+                }
+                synced += items.length;
+            }
+            return synced;
+        });
+    }
+
+    global.QROffline = {
+        SYNC_TAG: 'qr-sync',
+        SyncError,
+        parseNoteId,
+        getDeviceId,
+        cacheNote,
+        cacheNotes,
+        getCachedNote,
+        queueScan,
+        queueNote,
+        pendingCount,
+        onChange,
+        syncNow,
+    };
+})(self);
@@ -0,0 +1,124 @@
+// QR Warehouse Notes - service worker офлайн-режима
+// Отдается маршрутом /sw.js: перед этим кодом сервер подставляет CACHE_VERSION,
+// PRECACHE_URLS (главная страница и собранная статика) и OFFLINE_SCRIPT.
+
+importScripts(OFFLINE_SCRIPT);
+
+const SHELL_CACHE = `qr-shell-${CACHE_VERSION}`;
+const PAGES_CACHE = 'qr-pages';
+const MEDIA_CACHE = 'qr-media';
+const PAGES_LIMIT = 200;
+const MEDIA_LIMIT = 300;
+
+// Внешние библиотеки главной страницы: без сканера офлайн-режим бесполезен
+const CDN_URLS = [
+    'https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+];
+
+// Адрес API передается при регистрации: /sw.js?api=<API_BASE>
+const API_BASE = new URL(self.location).searchParams.get('api') || self.location.origin;
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(SHELL_CACHE);
+        await cache.addAll(PRECACHE_URLS);
+        // Недоступный CDN не должен срывать установку
+        await Promise.allSettled(CDN_URLS.map(url => cache.add(new Request(url, { mode: 'no-cors' }))));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name.startsWith('qr-shell-') && name !== SHELL_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+async function trimCache(name, limit) {
+    const cache = await caches.open(name);
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(keys.length - limit, 0)).map(key => cache.delete(key)));
+}
+
+// Страницы: сначала сеть (заметка могла измениться), без сети - копия из кэша
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            const cache = await caches.open(PAGES_CACHE);
+            await cache.put(request, response.clone());
+            trimCache(PAGES_CACHE, PAGES_LIMIT);
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request);
+        if (cached) return cached;
+        // Незнакомая страница без сети - главная, с которой можно сканировать
+        const shell = await caches.match('/');
+        if (shell) return shell;
+        throw error;
+    }
+}
+
+// Неизменяемые файлы (статика с хэшем, фото, QR-коды): сначала кэш
+async function cacheFirst(request, cacheName, limit) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok || response.type === 'opaque') {
+        const cache = await caches.open(cacheName);
+        await cache.put(request, response.clone());
+        if (limit) trimCache(cacheName, limit);
+    }
+    return response;
+}
+
+// Статика без хэша и CDN: отдаем из кэша и обновляем в фоне
+async function staleWhileRevalidate(request, cacheName) {
+    const cached = await caches.match(request);
+    const update = fetch(request).then(async response => {
+        if (response.ok || response.type === 'opaque') {
+            const cache = await caches.open(cacheName);
+            await cache.put(request, response.clone());
+        }
+        return response;
+    });
+    if (cached) {
+        update.catch(() => {});
+        return cached;
+    }
+    return update;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;  // API-запросы идут в сеть как есть
+
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin || url.origin === new URL(API_BASE).origin;
+
+    if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    } else if (sameOrigin && url.pathname.startsWith('/assets/')) {
+        event.respondWith(cacheFirst(request, SHELL_CACHE));
+    } else if (sameOrigin && (url.pathname.startsWith('/uploads/') || url.pathname === '/qr')) {
+        event.respondWith(cacheFirst(request, MEDIA_CACHE, MEDIA_LIMIT));
+    } else if (sameOrigin && url.pathname.startsWith('/static/')) {
+        event.respondWith(staleWhileRevalidate(request, SHELL_CACHE));
+    } else if (CDN_URLS.some(cdn => request.url.startsWith(new URL(cdn).origin))) {
+        event.respondWith(staleWhileRevalidate(request, SHELL_CACHE));
+    }
+});
+
+// Background Sync: браузер будит service worker, когда появляется сеть,
+// даже если страница уже закрыта. Ошибка - сигнал браузеру повторить позже.
+self.addEventListener('sync', event => {
+    if (event.tag === QROffline.SYNC_TAG) {
+        event.waitUntil(QROffline.syncNow(API_BASE));
+    }
+});
@@ -0,0 +1,52 @@
+"""Общее окружение тестов: временные БД и каталог загрузок.
+
+Как и в бенчмарках, переменные окружения задаются до импорта qr_warehouse
+(настройки читаются при импорте), а приложение создается в фикстурах.
+"""
+import os
+import tempfile
+
+import pytest
+
+_WORKDIR = tempfile.mkdtemp(prefix='qr-tests-')
+
+os.environ.update({
+    'TOKEN': '123456:TESTS',
+    'USER_ID': '1',
+    'CHANNEL_ID': '-1001',
+    'DATABASE_URL': f"sqlite:///{os.path.join(_WORKDIR, 'tests.db')}",
+    'UPLOAD_FOLDER': os.path.join(_WORKDIR, 'uploads'),
+    'STORAGE_BACKEND': 'local',
+    'USER_STATE_BACKEND': 'sql',
+    'LEADER_LOCK_FILE': os.path.join(_WORKDIR, 'leader.lock'),
+    'UPLOAD_GC_INTERVAL': '0',
+    'SCAN_FLUSH_INTERVAL': '3600',
+    'SYNC_CURSOR_LAG': '0',
+})
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+from qr_warehouse.leader import FileLease  # noqa: E402
+
+# Лидером остается сам процесс тестов: приложение не доставляет сообщения
+# в канал и не запускает периодических задач
+_lease = FileLease(os.environ['LEADER_LOCK_FILE'])
+_lease.try_acquire()
+
+
+@pytest.fixture(scope='session')
+def app():
+    from qr_warehouse import create_app, ensure_initialized
+    app = create_app()
+    ensure_initialized(app)
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
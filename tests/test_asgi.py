@@ -0,0 +1,55 @@
+"""ASGI-режим: синхронные Flask-запросы выполняются параллельно"""
+import asyncio
+import threading
+import time
+
+import asgi
+
+
+def _http_scope(path: str) -> dict:
+    return {'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'query_string': b'',
+            'http_version': '1.1', 'scheme': 'http', 'headers': [], 'server': ('testserver', 80)}
+
+
+async def _request(application, path: str):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(_http_scope(path), receive, send)
+    status = next(m['status'] for m in messages if m['type'] == 'http.response.start')
+    body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+    return status, body
+
+
+def test_slow_requests_overlap():
+    threads = set()
+
+    def slow_wsgi(environ, start_response):
+        threads.add(threading.get_ident())
+        time.sleep(0.3)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    application = asgi._PooledWsgiToAsgi(slow_wsgi)
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_request(application, '/') for _ in range(4)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+    assert results == [(200, b'ok')] * 4
+    # По очереди было бы 1.2 с
+    assert elapsed < 0.9
+    assert len(threads) == 4
+
+
+def test_flask_route_through_asgi():
+    status, body = asyncio.run(_request(asgi.app, '/status'))
+    assert status == 200
+    assert b'"status"' in body
@@ -0,0 +1,34 @@
+"""Кэш заметок: промах по UUID не скрывает заметку, созданную другим процессом"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from qr_warehouse.extensions import db, note_cache
+from qr_warehouse.models import Note
+from qr_warehouse.notes import get_note_payload, get_note_payloads
+
+
+def _insert_elsewhere(note_id: str):
+    # Отдельное соединение, мимо сессии: кэш этого процесса ничего не узнает
+    with db.engine.begin() as connection:
+        connection.execute(insert(Note.__table__).values(
+            id=note_id, title='Из другого воркера', text='', user_id=1,
+            created=datetime.utcnow(), updated_at=datetime.utcnow()))
+
+
+def test_missing_uuid_is_not_cached(app_context):
+    note_id, other_id = str(uuid.uuid4()), str(uuid.uuid4())
+    assert get_note_payload(note_id) is None
+    assert get_note_payloads([other_id]) == {}
+
+    _insert_elsewhere(note_id)
+    _insert_elsewhere(other_id)
+
+    assert get_note_payload(note_id)['title'] == 'Из другого воркера'
+    assert other_id in get_note_payloads([other_id])
+
+
+def test_missing_foreign_code_is_cached(app_context):
+    assert get_note_payload('https://example.com/not-a-note') is None
+    assert note_cache.get('https://example.com/not-a-note') == (True, None)
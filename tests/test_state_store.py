@@ -0,0 +1,75 @@
+"""Черновики бота: изменения с проверкой версии не теряются"""
+import threading
+from datetime import datetime
+
+import pytest
+
+from qr_warehouse.models import UserState
+from qr_warehouse.state_store import MemoryStateBackend, SQLStateBackend, UserStateStore
+
+
+@pytest.fixture(params=['sql', 'memory'])
+def make_store(request, app_context):
+    from qr_warehouse.extensions import db
+
+    def make():
+        backend = SQLStateBackend(db, UserState) if request.param == 'sql' else shared
+        return UserStateStore(backend, ttl=3600)
+
+    shared = MemoryStateBackend()
+    yield make
+    UserState.query.delete()
+    db.session.commit()
+
+
+def test_interleaved_updates_keep_both_changes(make_store):
+    # Два воркера со своими UserStateStore и одной таблицей
+    first, second = make_store(), make_store()
+    first.set(42, {'photos': [], 'title': None, 'text': None})
+    second_done = threading.Event()
+    calls = []
+
+    def set_title(state):
+        calls.append(dict(state))
+        if len(calls) == 1:
+            # Пока первый изменяет прочитанное, второй успевает записать свое
+            second.update(42, lambda draft: draft.update(text='текст'))
+            second_done.set()
+        state['title'] = 'заголовок'
+
+    saved = first.update(42, set_title)
+
+    assert second_done.is_set()
+    assert len(calls) == 2 and calls[1]['text'] == 'текст'
+    assert saved == {'photos': [], 'title': 'заголовок', 'text': 'текст'}
+    assert make_store().get(42) == saved
+
+
+def test_stale_version_is_rejected(make_store):
+    store = make_store()
+    store.set(7, {'photos': []})
+    version = store.backend.load(7)[2]
+    assert store.backend.save(7, {'photos': ['a.jpg']}, datetime.utcnow(), version)
+    assert not store.backend.save(7, {'photos': ['b.jpg']}, datetime.utcnow(), version)
+    assert store.get(7) == {'photos': ['a.jpg']}
+
+
+def test_update_missing_draft(make_store):
+    assert make_store().update(99, lambda draft: draft.update(title='x')) is None
+    assert make_store().get(99) is None
+
+
+def test_concurrent_photo_appends(app, make_store):
+    # Настоящие потоки: каждое из 8 добавлений должно сохраниться
+    make_store().set(5, {'photos': []})
+
+    def add(index):
+        with app.app_context():
+            make_store().update(5, lambda draft: draft['photos'].append(f'{index}.jpg'))
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(make_store().get(5)['photos']) == sorted(f'{i}.jpg' for i in range(8))
@@ -0,0 +1,37 @@
+"""POST /sync: конфликт id с параллельным запросом не отклоняет пачку"""
+import uuid
+
+from qr_warehouse import sync
+from qr_warehouse.extensions import db
+from qr_warehouse.models import Note
+
+
+def test_concurrent_insert_counts_as_existing(app, client, monkeypatch):
+    raced, fresh = str(uuid.uuid4()), str(uuid.uuid4())
+    calls = []
+    check = sync.existing_note_ids
+
+    def existing_note_ids(note_ids):
+        calls.append(list(note_ids))
+        if len(calls) == 1:
+            # Параллельный запрос вставляет заметку сразу после нашей проверки
+            client.post('/sync', json={'notes': [{'id': raced, 'text': 'с другого устройства'}]})
+            return set()
+        return check(note_ids)
+
+    monkeypatch.setattr(sync, 'existing_note_ids', existing_note_ids)
+    response = client.post('/sync', json={'notes': [{'id': raced, 'text': 'первая'},
+                                                     {'id': fresh, 'text': 'вторая'}]})
+
+    assert response.status_code == 200
+    assert response.json['notes'] == {'created': [fresh], 'existing': [raced], 'errors': []}
+    with app.app_context():
+        assert db.session.get(Note, raced).text == 'с другого устройства'
+        assert db.session.get(Note, fresh).text == 'вторая'
+
+
+def test_repeated_batch_is_idempotent(client):
+    note_id = str(uuid.uuid4())
+    batch = {'notes': [{'id': note_id, 'text': 'заметка'}]}
+    assert client.post('/sync', json=batch).json['notes']['created'] == [note_id]
+    assert client.post('/sync', json=batch).json['notes']['existing'] == [note_id]
@@ -0,0 +1,86 @@
+"""Сборщик мусора в хранилище фото: карантин отсчитывается от переноса"""
+import os
+import time
+
+import pytest
+
+from qr_warehouse import upload_gc
+from qr_warehouse.storage import LocalStorage, S3Storage
+
+DAY = 24 * 3600
+WEEK = 7 * DAY
+
+
+def _nothing_referenced(keys):
+    return set()
+
+
+def _collect_and_purge(storage):
+    # Как housekeeping.collect_upload_garbage и flask gc-uploads: карантин
+    # очищается сразу после прохода
+    report = upload_gc.run(storage, _nothing_referenced, 100, min_age=DAY, dry_run=False)
+    return report, upload_gc.purge_quarantine(storage, WEEK)
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    return LocalStorage(str(tmp_path / 'uploads'))
+
+
+@pytest.fixture
+def s3_storage():
+    pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    with moto.mock_aws():
+        storage = S3Storage('uploads', region='us-east-1')
+        storage.client.create_bucket(Bucket='uploads')
+        yield storage
+
+
+def test_old_orphan_survives_first_pass(local_storage):
+    local_storage.save('ab/cd/old.jpg', b'photo')
+    month_ago = time.time() - 30 * DAY
+    os.utime(local_storage.local_path('ab/cd/old.jpg'), (month_ago, month_ago))
+
+    report, removed = _collect_and_purge(local_storage)
+
+    assert [orphan['key'] for orphan in report['orphans']] == ['ab/cd/old.jpg']
+    assert removed == 0
+    quarantined = local_storage.list(None, 10, prefix='.quarantine/')
+    assert [obj.key.split('/', 2)[2] for obj in quarantined] == ['ab/cd/old.jpg']
+
+
+def test_quarantine_expires_after_ttl(local_storage):
+    moved_at = time.time() - WEEK - 60
+    local_storage.save(upload_gc.quarantine_key('ab/cd/old.jpg', moved_at), b'photo')
+    local_storage.save(upload_gc.quarantine_key('ab/cd/new.jpg', time.time()), b'photo')
+
+    assert upload_gc.purge_quarantine(local_storage, WEEK) == 1
+    remaining = local_storage.list(None, 10, prefix='.quarantine/')
+    assert [obj.key.rsplit('/', 1)[1] for obj in remaining] == ['new.jpg']
+
+
+def test_legacy_quarantine_uses_mtime(local_storage):
+    # Файлы, перенесенные до появления метки времени в ключе
+    local_storage.save('.quarantine/ab/cd/legacy.jpg', b'photo')
+    month_ago = time.time() - 30 * DAY
+    os.utime(local_storage.local_path('.quarantine/ab/cd/legacy.jpg'), (month_ago, month_ago))
+
+    assert upload_gc.purge_quarantine(local_storage, WEEK) == 1
+
+
+def test_local_move_updates_mtime(local_storage):
+    local_storage.save('ab/cd/old.jpg', b'photo')
+    os.utime(local_storage.local_path('ab/cd/old.jpg'), (0, 0))
+    local_storage.move('ab/cd/old.jpg', 'ef/old.jpg')
+    assert time.time() - local_storage.list(None, 1)[0].mtime < 60
+
+
+def test_old_orphan_survives_first_pass_s3(s3_storage):
+    s3_storage.save('ab/cd/old.jpg', b'photo')
+    # В S3 нельзя задать LastModified; файл считается старым за счет min_age=0
+    report = upload_gc.run(s3_storage, _nothing_referenced, 100, min_age=0, dry_run=False)
+
+    assert len(report['orphans']) == 1
+    assert upload_gc.purge_quarantine(s3_storage, WEEK) == 0
+    assert len(s3_storage.list(None, 10, prefix='.quarantine/')) == 1